@@ -1,17 +1,35 @@
 # app.py — Clean, optimized, production-ready with Celery tasks for mail & CSV export
 import os
+import re
+import shutil
+import json
+import base64
+import hashlib
+import importlib.util
+import queue
+import threading
+import time as time_module
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, time
 import pytz
 import csv
+import smtplib
+import sqlite3
+import io
+import zlib
+import contextlib
+import contextvars
 from dotenv import load_dotenv
 
 # Load environment variables once
 load_dotenv()
 
-from flask import Flask, request, jsonify, send_file
+import click
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, send_from_directory, has_request_context, has_app_context, g
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSQLAlchemySession
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_caching import Cache
 from flask_mail import Mail, Message
@@ -19,18 +37,24 @@ from flask_jwt_extended import (
     JWTManager, create_access_token, jwt_required,
     get_jwt_identity, get_jwt
 )
-from celery import Celery
+from celery import Celery, chord, group
 from celery.schedules import crontab
-from sqlalchemy import or_, func
+import redis
+import numpy as np
+from sqlalchemy import or_, func, update, insert, delete, event, bindparam, tuple_
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, joinedload, validates
+from sqlalchemy.sql import Select, TextClause
 
 # -----------------------
 # Basic configuration
 # -----------------------
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+EXPORT_DIR = os.getenv('EXPORT_DIR', os.path.join(BASE_DIR, "exports"))
 IST = pytz.timezone("Asia/Kolkata")
 
 app = Flask(__name__)
-CORS(app, supports_credentials=True, expose_headers=["Content-Disposition"])
+CORS(app, supports_credentials=True, expose_headers=["Content-Disposition", "X-Total-Count"])
 
 # Flask config (from env)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'change_me_secret_key')
@@ -42,6 +66,33 @@ DB_FILENAME = os.getenv('DB_FILENAME', 'app.db')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///' + os.path.join(BASE_DIR, DB_FILENAME))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# SQLite engine profile: 'wal' applies SQLITE_PRAGMAS to every new connection and takes the write lock
+# up front in @write_transaction views and tasks (see begin_sqlite_transaction); 'stock' keeps SQLite's defaults
+SQLITE_PROFILE = os.getenv('SQLITE_PROFILE', 'wal')
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 15000)),
+    'cache_size': -int(os.getenv('SQLITE_CACHE_KB', 65536)),  # negative means KiB, per connection
+    'mmap_size': int(os.getenv('SQLITE_MMAP_MB', 256)) * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+if SQLITE_PROFILE == 'wal' and ':memory:' not in app.config['SQLALCHEMY_DATABASE_URI']:
+    # one connection per Flask thread / Celery worker thread without waiting on the pool
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+    }
+
+# Read replica: views and tasks marked @read_only query DATABASE_REPLICA_URL while it is at most
+# REPLICA_MAX_LAG_SECONDS behind the primary (see replica_is_fresh); everything else uses the primary
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 5))
+REPLICA_CHECK_SECONDS = float(os.getenv('REPLICA_CHECK_SECONDS', 1))
+if DATABASE_REPLICA_URL:
+    app.config['SQLALCHEMY_BINDS'] = {'replica': DATABASE_REPLICA_URL}
+
 # Redis / Celery
 app.config['broker_url'] = os.getenv('broker_url', 'redis://localhost:6379/0')
 app.config['result_backend'] = os.getenv('result_backend', app.config['broker_url'])
@@ -60,12 +111,29 @@ MAIL_RECIVER = app.config['MAIL_DEFAULT_SENDER']
 
 # Caching (optional Redis)
 cache = Cache(config={
-    'CACHE_TYPE': 'RedisCache',
+    'CACHE_TYPE': os.getenv('CACHE_TYPE', 'RedisCache'),
     'CACHE_REDIS_URL': os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
 })
 cache.init_app(app)
 
-db = SQLAlchemy(app)
+_read_only = contextvars.ContextVar('read_only', default=False)
+
+class RoutingSession(FlaskSQLAlchemySession):
+    """Sends SELECTs made inside @read_only code to the replica while it is fresh enough.
+
+    Everything else (flushes, ORM bulk inserts, DML, DDL) goes to the primary.
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        reading = isinstance(clause, Select) or (
+            isinstance(clause, TextClause) and clause.text.lstrip()[:6].upper() == 'SELECT')
+        if (bind is None and DATABASE_REPLICA_URL and not self._flushing
+                and reading and in_read_only() and replica_is_fresh()):
+            g.read_source = 'replica'
+            return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+
 mail = Mail(app)
 jwt = JWTManager(app)
 
@@ -101,7 +169,17 @@ def make_celery(app):
             "task": "tasks.send_monthly_report",
             "schedule": crontab(day_of_month=1, hour=6, minute=0),  # 6 AM IST
         },
+        "deliver_mail": {
+            "task": "tasks.deliver_mail",
+            "schedule": 30.0,
+        },
+        "open_occupancy": {
+            "task": "tasks.record_open_occupancy",
+            "schedule": crontab(minute=0),  # top of every hour
+        },
     }
+    # run with a dedicated worker: celery -A app.celery worker -Q mail -c 1
+    celery.conf.task_routes = {"tasks.deliver_mail": {"queue": "mail"}}
 
     return celery
 
@@ -135,16 +213,45 @@ class ParkingLot(db.Model):
     pin_code = db.Column(db.String(10))
     number_of_spots = db.Column(db.Integer, default=0)
     is_deleted = db.Column(db.Boolean, default=False)
+    # denormalized spot counters, maintained in the same transaction as every spot change
+    available_spots = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    reserved_spots = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     spots = db.relationship('ParkingSpot', backref='lot', cascade='all, delete-orphan', lazy=True)
 
 class ParkingSpot(db.Model):
     __tablename__ = 'parking_spot'
+    __table_args__ = (
+        # free-spot lookups and per-status counts within a lot
+        db.Index('ix_parking_spot_lot_status', 'lot_id', 'status'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), nullable=False)
     status = db.Column(db.String(20), nullable=False, default='A')  # 'A' available, 'R' reserved
+    label = db.Column(db.String(30), nullable=True)  # e.g. 'L1-R2-07' when the lot has a layout
+
+ACTIVE_STATUSES = ('Reserved', 'Occupied')
+ACTIVE_RESERVATION_SQL = "status IN ('Reserved', 'Occupied')"
 
 class Reservation(db.Model):
     __tablename__ = 'reservation'
+    __table_args__ = (
+        # covering index for per-lot interval scans (occupancy analytics)
+        db.Index('ix_reservation_lot_start_end', 'lot_id', 'start_time', 'end_time'),
+        # per-user history pages, newest first
+        db.Index('ix_reservation_user_id', 'user_id', 'id'),
+        # CSV exports stream a user's rows in start_time order without a sort
+        db.Index('ix_reservation_user_start', 'user_id', 'start_time'),
+        # date-range planning for admin bulk exports
+        db.Index('ix_reservation_start_time', 'start_time'),
+        # partial indexes over the small active slice: a user's current bookings and each
+        # spot's current holder; queries must use active_reservation() to match the WHERE
+        db.Index('ix_reservation_active_user', 'user_id',
+                 sqlite_where=db.text(ACTIVE_RESERVATION_SQL), postgresql_where=db.text(ACTIVE_RESERVATION_SQL)),
+        db.Index('ix_reservation_active_spot', 'spot_id', 'id',
+                 sqlite_where=db.text(ACTIVE_RESERVATION_SQL), postgresql_where=db.text(ACTIVE_RESERVATION_SQL)),
+        # change feed keyset on PostgreSQL (SQLite orders by change_seq alone)
+        db.Index('ix_reservation_change_xid_seq', 'change_xid', 'change_seq').ddl_if(dialect='postgresql'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), nullable=True)
@@ -154,11 +261,155 @@ class Reservation(db.Model):
     status = db.Column(db.String(20), nullable=False)  # 'Reserved' / 'Released' / 'Occupied'
     total_cost = db.Column(db.Float)
     vehicle_number = db.Column(db.String(30), nullable=True)
+    # normalized plate ('tn 07-ab 4946' -> 'TN07AB4946') and its reverse, for prefix / trailing-digit lookups
+    vehicle_plate = db.Column(db.String(30), nullable=True, index=True)
+    vehicle_plate_rev = db.Column(db.String(30), nullable=True, index=True)
+    # change tracking for the incremental feed, stamped on every ORM write (see stamp_reservation_changes)
+    change_seq = db.Column(db.BigInteger, nullable=True, index=True)
+    change_xid = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')  # writing transaction (PostgreSQL)
+    updated_at = db.Column(db.DateTime, nullable=True)
 
     user = db.relationship('User', backref='reservations')
     lot = db.relationship('ParkingLot', backref='reservations')
     spot = db.relationship('ParkingSpot', backref='reservations')
 
+    @validates('vehicle_number')
+    def _normalize_plate(self, key, value):
+        self.vehicle_plate = normalize_plate(value) or None
+        self.vehicle_plate_rev = self.vehicle_plate[::-1] if self.vehicle_plate else None
+        return value
+
+def normalize_plate(value):
+    return "".join(c for c in (value or "") if c.isalnum()).upper()
+
+def active_reservation(negate=False):
+    """status IN ('Reserved', 'Occupied') with the values inlined rather than bound.
+
+    SQLite only uses a partial index when the query repeats its WHERE terms literally, so
+    filters on the active slice go through here to reach the ix_reservation_active_* indexes.
+    """
+    values = [db.literal(status, literal_execute=True) for status in ACTIVE_STATUSES]
+    return Reservation.status.notin_(values) if negate else Reservation.status.in_(values)
+
+class LotHourlyRollup(db.Model):
+    """Per lot and IST hour: completed sessions (by end time) and the peak number of reserved spots."""
+    __tablename__ = 'lot_hourly_rollup'
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), primary_key=True)
+    hour_start = db.Column(db.DateTime, primary_key=True)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    parked_minutes = db.Column(db.Float, nullable=False, default=0.0)
+    peak_occupancy = db.Column(db.Integer, nullable=False, default=0)
+
+class LotDailyRollup(db.Model):
+    """Per lot and IST day: same measures as the hourly rollup plus the session-duration histogram."""
+    __tablename__ = 'lot_daily_rollup'
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    parked_minutes = db.Column(db.Float, nullable=False, default=0.0)
+    peak_occupancy = db.Column(db.Integer, nullable=False, default=0)
+    # session counts per DURATION_BUCKETS entry
+    sessions_0_1h = db.Column(db.Integer, nullable=False, default=0)
+    sessions_1_3h = db.Column(db.Integer, nullable=False, default=0)
+    sessions_3_6h = db.Column(db.Integer, nullable=False, default=0)
+    sessions_6_9h = db.Column(db.Integer, nullable=False, default=0)
+    sessions_9h_plus = db.Column(db.Integer, nullable=False, default=0)
+
+class UserStats(db.Model):
+    """Running totals per user, maintained at allocate / terminate time."""
+    __tablename__ = 'user_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_reservations = db.Column(db.Integer, nullable=False, default=0)
+    reserved_count = db.Column(db.Integer, nullable=False, default=0)
+    released_count = db.Column(db.Integer, nullable=False, default=0)
+    total_cost = db.Column(db.Float, nullable=False, default=0.0)
+    total_hours = db.Column(db.Float, nullable=False, default=0.0)
+
+class ChangeSequence(db.Model):
+    """Named monotonic counters, bumped inside the writing transaction so values follow commit order.
+
+    Only used on SQLite, where writers are serialized anyway; PostgreSQL uses RESERVATION_CHANGE_SEQUENCE.
+    """
+    __tablename__ = 'change_sequence'
+    name = db.Column(db.String(40), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+# created by create_all on PostgreSQL only; other dialects skip sequences
+RESERVATION_CHANGE_SEQUENCE = db.Sequence('reservation_change_seq', metadata=db.metadata)
+
+class ExportJob(db.Model):
+    """Admin bulk export of reservations whose start_time falls in [range_start, range_end)."""
+    __tablename__ = 'export_job'
+    id = db.Column(db.Integer, primary_key=True)
+    requested_by = db.Column(db.String(120), nullable=True)
+    range_start = db.Column(db.DateTime, nullable=False)
+    range_end = db.Column(db.DateTime, nullable=False)
+    partition_by = db.Column(db.String(10), nullable=False)  # 'month' or 'id'
+    formats = db.Column(db.String(50), nullable=False, default='csv.gz')  # comma-separated
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending / running / done / failed / expired
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(IST))
+    finished_at = db.Column(db.DateTime, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+    partitions = db.relationship('ExportPartition', backref='job', order_by='ExportPartition.seq')
+
+class ExportPartition(db.Model):
+    """One file set of an export job: reservation ids in [id_lo, id_hi] with start_time in [start_lo, start_hi)."""
+    __tablename__ = 'export_partition'
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('export_job.id'), nullable=False, index=True)
+    seq = db.Column(db.Integer, nullable=False)
+    label = db.Column(db.String(40), nullable=False)
+    id_lo = db.Column(db.Integer, nullable=False)
+    id_hi = db.Column(db.Integer, nullable=False)
+    start_lo = db.Column(db.DateTime, nullable=False)
+    start_hi = db.Column(db.DateTime, nullable=False)
+    expected_rows = db.Column(db.Integer, nullable=False, default=0)
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    files = db.Column(db.Text, nullable=True)  # JSON list of {name, bytes, sha256}
+    error = db.Column(db.Text, nullable=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class MailOutbox(db.Model):
+    """An email queued by a producer; only the delivery worker talks to SMTP."""
+    __tablename__ = 'mail_outbox'
+    __table_args__ = (db.Index('ix_mail_outbox_status_next', 'status', 'next_attempt_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(40), nullable=False, default='mail')
+    recipients = db.Column(db.Text, nullable=False)  # JSON list
+    subject = db.Column(db.String(200), nullable=False)
+    html = db.Column(db.Text, nullable=True)
+    attachment_name = db.Column(db.String(200), nullable=True)
+    attachment_type = db.Column(db.String(100), nullable=True)
+    attachment = db.Column(db.LargeBinary, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending / sending / sent / failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+
+class SchemaVersion(db.Model):
+    """Applied schema versions; the database is at the highest one."""
+    __tablename__ = 'schema_version'
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), nullable=True)
+    applied_at = db.Column(db.DateTime, default=lambda: datetime.now(IST))
+
+class UserWeeklyStats(db.Model):
+    """Per user and IST week (starting Monday): reservations started that week, their cost and hours."""
+    __tablename__ = 'user_weekly_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    week_start = db.Column(db.Date, primary_key=True)
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    total_cost = db.Column(db.Float, nullable=False, default=0.0)
+    total_hours = db.Column(db.Float, nullable=False, default=0.0)
+
 # -----------------------
 # Helper utilities
 # -----------------------
@@ -185,12 +436,296 @@ def safe_filename(s: str) -> str:
     """Create a filesystem-safe filename part."""
     return "".join(c if c.isalnum() or c in ("-", "_") else "_" for c in s)
 
+# -----------------------
+# SQLite connection profile
+# -----------------------
+_writing = contextvars.ContextVar('writing', default=False)
+
+@event.listens_for(Engine, 'connect')
+def apply_sqlite_profile(dbapi_connection, connection_record):
+    if SQLITE_PROFILE != 'wal' or not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    # let begin_sqlite_transaction() issue BEGIN instead of the driver
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+@event.listens_for(Engine, 'begin')
+def begin_sqlite_transaction(conn):
+    """The first transaction on the primary inside writing() / @write_transaction code starts with
+    BEGIN IMMEDIATE, so it queues on busy_timeout for the write lock.
+
+    A deferred transaction that reads first and then writes cannot wait: if another writer
+    committed in between, SQLite fails it at once with "database is locked". Reads after the
+    commit (reloading expired attributes, post-commit hooks) start plain transactions again.
+    """
+    if SQLITE_PROFILE != 'wal' or conn.dialect.name != 'sqlite':
+        return
+    writing = _writing.get() and has_app_context() and conn.engine is db.engine
+    if writing:
+        _writing.set(False)
+    conn.exec_driver_sql("BEGIN IMMEDIATE" if writing else "BEGIN")
+
+@contextlib.contextmanager
+def writing():
+    """The next transaction on the primary that begins inside this block takes the write lock up front."""
+    token = _writing.set(True)
+    try:
+        yield
+    finally:
+        _writing.reset(token)
+
+def write_transaction(fn):
+    """Mark a view or task that reads and then writes, so it takes the SQLite write lock up front.
+
+    Keep slow work that needs no database (password hashing, SMTP) ahead of the first query.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with writing():
+            return fn(*args, **kwargs)
+    return wrapper
+
+# -----------------------
+# Read replica routing
+# -----------------------
+# The replica's snapshot time as of the last probe; it only moves forward, so comparing it with the
+# clock on every query keeps the staleness bound strict between probes.
+_replica_health = {'checked_at': None, 'as_of': None}
+_replica_lock = threading.Lock()
+
+def read_only(fn):
+    """Mark a view or task as safe to serve from the read replica (subject to the staleness bound)."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if has_request_context():
+            g.read_only = True  # still set while a streamed response body is generated
+        token = _read_only.set(True)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _read_only.reset(token)
+    return wrapper
+
+def in_read_only():
+    return _read_only.get() or (has_request_context() and g.get('read_only', False))
+
+def replica_snapshot_time():
+    """Epoch seconds of the newest primary state visible on the replica, or None if it cannot be read."""
+    engine = db.engines['replica']
+    try:
+        with engine.connect() as conn:
+            if engine.dialect.name == 'postgresql':
+                lag = conn.execute(db.text(
+                    "SELECT CASE WHEN pg_is_in_recovery() "
+                    "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+                    "ELSE 0 END"
+                )).scalar()
+                return time_module.time() - float(lag)
+            # SQLite copies made by `flask sync-replica` carry the time their snapshot was taken
+            return conn.execute(db.text("SELECT synced_at FROM replica_sync WHERE id = 1")).scalar()
+    except Exception:
+        app.logger.warning("Replica health probe failed; reading from the primary", exc_info=True)
+        return None
+
+def replica_is_fresh():
+    """Whether the replica is at most REPLICA_MAX_LAG_SECONDS behind; probed once per REPLICA_CHECK_SECONDS."""
+    now = time_module.monotonic()
+    with _replica_lock:
+        due = _replica_health['checked_at'] is None or now - _replica_health['checked_at'] >= REPLICA_CHECK_SECONDS
+        if due:
+            _replica_health['checked_at'] = now
+    if due:
+        _replica_health['as_of'] = replica_snapshot_time()
+    as_of = _replica_health['as_of']
+    return as_of is not None and time_module.time() - as_of <= REPLICA_MAX_LAG_SECONDS
+
+@app.after_request
+def add_read_source_header(response):
+    if DATABASE_REPLICA_URL and g.get('read_only'):
+        response.headers['X-Read-Source'] = g.get('read_source', 'primary')
+    return response
+
+def copy_sqlite_replica(primary_path, replica_path):
+    """Copy the primary into the replica file in one backup step and stamp when the copy started."""
+    started = time_module.time()
+    src, dst = sqlite3.connect(primary_path), sqlite3.connect(replica_path)
+    try:
+        src.backup(dst)
+        dst.execute("CREATE TABLE IF NOT EXISTS replica_sync "
+                    "(id INTEGER PRIMARY KEY CHECK (id = 1), synced_at REAL NOT NULL)")
+        dst.execute("INSERT OR REPLACE INTO replica_sync (id, synced_at) VALUES (1, ?)", (started,))
+        dst.commit()
+    finally:
+        src.close()
+        dst.close()
+    return time_module.time() - started
+
+@app.cli.command('sync-replica')
+@click.option('--interval', type=float, default=2.0, show_default=True, help='Seconds between copies.')
+@click.option('--once', is_flag=True, help='Copy once and exit.')
+def sync_replica_command(interval, once):
+    """Keep a SQLite replica file in step with the primary (a local stand-in for streaming replication)."""
+    if not DATABASE_REPLICA_URL:
+        raise click.ClickException("DATABASE_REPLICA_URL is not set.")
+    primary, replica = make_url(app.config['SQLALCHEMY_DATABASE_URI']), make_url(DATABASE_REPLICA_URL)
+    if primary.get_backend_name() != 'sqlite' or replica.get_backend_name() != 'sqlite':
+        raise click.ClickException("sync-replica only copies SQLite files; use real replication for other databases.")
+    while True:
+        seconds = copy_sqlite_replica(primary.database, replica.database)
+        click.echo(f"Copied {primary.database} -> {replica.database} in {seconds * 1000:.0f} ms.")
+        if once:
+            return
+        time_module.sleep(interval)
+
 # -----------------------
 # Initialization: create DB and admin from env (no hard-coded password)
 # -----------------------
-@app.before_request
-def create_db_and_admin():
+# Runs from `flask init-db` (a release step), never on the request path and, unless AUTO_INIT_DB=True,
+# never at import: every gunicorn worker and Celery process would otherwise race to migrate.
+#
+# Tables, columns and indexes follow the models: version 1 syncs them (sync_schema() is idempotent and
+# also re-runs under `flask init-db`). Numbered steps after it are kept for what that sync cannot do
+# (sequences, seeded rows, data rewrites). Version 2 (hot-path indexes) was dropped: the baseline sync
+# already created those indexes, so it only re-ran ANALYZE, which the baseline now does itself.
+SCHEMA_MIGRATIONS = []
+
+def schema_migration(version, description):
+    """Register an upgrade step; each runs once, in version order, and is recorded in schema_version."""
+    def register(fn):
+        SCHEMA_MIGRATIONS.append((version, description, fn))
+        SCHEMA_MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+def add_missing_columns():
+    """Add model columns that an older database file does not have yet (create_all never alters tables)."""
+    inspector = db.inspect(db.engine)
+    added = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=db.engine.dialect)}"
+            if column.server_default is not None:
+                ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+            db.session.execute(db.text(ddl))
+            added.append(f"{table.name}.{column.name}")
+    if added:
+        db.session.commit()
+        app.logger.info("Added missing columns: %s", ", ".join(added))
+    return added
+
+def backfill_change_seq():
+    """Give rows written before change tracking existed a position in the feed (id order)."""
+    db.session.execute(
+        update(Reservation).where(Reservation.change_seq.is_(None))
+        .values(change_seq=Reservation.id, updated_at=func.coalesce(Reservation.end_time, Reservation.start_time))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+def create_missing_indexes():
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def backfill_vehicle_plates(batch_size=5000):
+    """Fill vehicle_plate / vehicle_plate_rev for rows written before those columns existed."""
+    table = Reservation.__table__
+    last_id = total = 0
+    while True:
+        rows = db.session.query(Reservation.id, Reservation.vehicle_number).filter(
+            Reservation.id > last_id,
+            Reservation.vehicle_plate.is_(None),
+            Reservation.vehicle_number.isnot(None)
+        ).order_by(Reservation.id).limit(batch_size).all()
+        if not rows:
+            return total
+        params = []
+        for row in rows:
+            plate = normalize_plate(row.vehicle_number)
+            if plate:
+                params.append({'rid': row.id, 'plate': plate, 'rev': plate[::-1]})
+        if params:
+            db.session.execute(
+                update(table).where(table.c.id == bindparam('rid'))
+                .values(vehicle_plate=bindparam('plate'), vehicle_plate_rev=bindparam('rev')),
+                params)
+        db.session.commit()
+        last_id = rows[-1].id
+        total += len(params)
+
+def current_schema_version():
+    """Highest applied version; 0 for an empty database or one created before versions were tracked."""
+    if not db.inspect(db.engine).has_table(SchemaVersion.__tablename__):
+        return 0
+    return db.session.query(func.max(SchemaVersion.version)).scalar() or 0
+
+def sync_schema():
+    """Create missing tables, columns and indexes and run the backfills they need (safe to re-run)."""
     db.create_all()
+    added = set(add_missing_columns())
+    create_missing_indexes()
+    if {'parking_lot.available_spots', 'parking_lot.reserved_spots'} & added:
+        recompute_lot_counters()
+        db.session.commit()
+    if 'reservation.vehicle_plate' in added:
+        backfill_vehicle_plates()
+    if 'reservation.change_seq' in added:
+        backfill_change_seq()
+    if not db.session.query(LotDailyRollup.lot_id).first() and \
+            db.session.query(Reservation.id).filter_by(status='Released').first():
+        backfill_rollups()
+    if not db.session.query(UserStats.user_id).first() and db.session.query(Reservation.id).first():
+        backfill_user_stats()
+    ensure_search_index()
+    db.session.commit()
+
+@schema_migration(1, 'baseline')
+def _migrate_baseline():
+    """Sync the schema with the models, then refresh planner statistics for any indexes it added."""
+    sync_schema()
+    if db.engine.dialect.name in ('sqlite', 'postgresql'):
+        db.session.execute(db.text("ANALYZE"))
+    db.session.commit()
+
+@schema_migration(3, 'change feed sequence')
+def _migrate_change_sequence():
+    """change_xid plus a real sequence on PostgreSQL; on SQLite the counter row is seeded here, not on first write."""
+    add_missing_columns()
+    create_missing_indexes()
+    last = db.session.query(func.coalesce(func.max(Reservation.change_seq), 0)).scalar()
+    if db.engine.dialect.name == 'postgresql':
+        RESERVATION_CHANGE_SEQUENCE.create(db.engine, checkfirst=True)
+        if last:
+            db.session.execute(db.select(func.setval(RESERVATION_CHANGE_SEQUENCE.name, last)))
+    elif not db.session.get(ChangeSequence, RESERVATION_CHANGES):
+        db.session.add(ChangeSequence(name=RESERVATION_CHANGES, value=last))
+    db.session.commit()
+
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+def upgrade_schema(from_version=0, force=False):
+    """Apply the migrations newer than from_version, recording each one as it commits.
+
+    With force the idempotent sync_schema() also runs on an up-to-date database.
+    """
+    if force and from_version >= 1:
+        sync_schema()
+    for version, description, migrate in SCHEMA_MIGRATIONS:
+        if version > from_version:
+            migrate()
+            db.session.add(SchemaVersion(version=version, description=description))
+            db.session.commit()
+            app.logger.info("Applied schema migration %d (%s)", version, description)
+
+def ensure_admin():
     admin_username = os.getenv('ADMIN_USERNAME')
     admin_password = os.getenv('ADMIN_PASSWORD')
 
@@ -211,24 +746,596 @@ def create_db_and_admin():
         db.session.commit()
         app.logger.info("Admin user created from .env")
 
+SCHEMA_UPGRADE_LOCK_KEY = 0x7061726b  # pg_advisory_lock key ('park')
+
+@contextlib.contextmanager
+def schema_upgrade_lock():
+    """Let one process at a time upgrade the schema; the others wait, then find it up to date.
+
+    PostgreSQL uses a session advisory lock. SQLite holds a write transaction on a side file next to
+    the database, because the migrations commit as they go. Both locks go away with a crashed process.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(db.select(func.pg_advisory_lock(SCHEMA_UPGRADE_LOCK_KEY)))
+            try:
+                yield
+            finally:
+                conn.execute(db.select(func.pg_advisory_unlock(SCHEMA_UPGRADE_LOCK_KEY)))
+    elif db.engine.dialect.name == 'sqlite' and db.engine.url.database not in (None, '', ':memory:'):
+        lock = sqlite3.connect(db.engine.url.database + '.upgrade-lock', timeout=600, isolation_level=None)
+        try:
+            lock.execute("BEGIN IMMEDIATE")
+            yield
+        finally:
+            lock.close()
+    else:
+        yield
+
+def bootstrap_database(force=False):
+    """Upgrade the schema if it is behind (or always, with force) and make sure the admin exists.
+
+    The version is read under schema_upgrade_lock(), so processes that start together migrate once.
+    Returns the version the database was at before.
+    """
+    with schema_upgrade_lock():
+        db.session.commit()  # read the version in a transaction that started after the lock
+        version = current_schema_version()
+        if force or version < SCHEMA_VERSION:
+            upgrade_schema(version, force)
+        ensure_admin()
+        db.session.commit()
+    return version
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create or upgrade the schema, rerun pending backfills and create the admin from .env."""
+    before = bootstrap_database(force=True)
+    click.echo(f"Schema at version {SCHEMA_VERSION} (was {before}).")
+
 # -----------------------
-# Sync util
+# Lot availability counters (parking_lot.available_spots / reserved_spots)
 # -----------------------
-def update_spot_status_from_reservation(reservation: Reservation):
-    spot = db.session.get(ParkingSpot, reservation.spot_id)
-    if not spot:
-        return
-    if reservation.status == "Reserved":
-        spot.status = "R"
-    elif reservation.status in ["Released", "Cancelled"]:
-        spot.status = "A"
+def shift_lot_counters(lot_id, available=0, reserved=0):
+    """Adjust a lot's counters in SQL so concurrent spot changes never overwrite each other.
+
+    Returns the lot's new reserved_spots.
+    """
+    return db.session.execute(
+        update(ParkingLot)
+        .where(ParkingLot.id == lot_id)
+        .values(available_spots=ParkingLot.available_spots + available,
+                reserved_spots=ParkingLot.reserved_spots + reserved)
+        .returning(ParkingLot.reserved_spots)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+def recompute_lot_counters(lot_id=None):
+    """Recompute counters from parking_spot rows (all lots, or one). Caller commits."""
+    def spot_count(status):
+        return (
+            db.select(func.count(ParkingSpot.id))
+            .where(ParkingSpot.lot_id == ParkingLot.id, ParkingSpot.status == status)
+            .scalar_subquery()
+        )
+    stmt = update(ParkingLot).values(available_spots=spot_count('A'), reserved_spots=spot_count('R'))
+    if lot_id is not None:
+        stmt = stmt.where(ParkingLot.id == lot_id)
+    return db.session.execute(stmt.execution_options(synchronize_session=False)).rowcount
+
+@app.cli.command('repair-lot-counters')
+def repair_lot_counters():
+    """Recompute available/reserved counters of every lot from parking_spot."""
+    add_missing_columns()
+    count = recompute_lot_counters()
     db.session.commit()
+    click.echo(f"Recomputed spot counters for {count} parking lots.")
+
+# -----------------------
+# Reservation change tracking (change_seq / updated_at for the incremental feed)
+# -----------------------
+RESERVATION_CHANGES = 'reservation'
+
+def next_change_seq(connection, count=1):
+    """Reserve `count` change_seq values; returns (change_xid, [values]).
+
+    PostgreSQL draws them from a sequence and pairs them with the writing transaction's id, so
+    writers never wait on each other; the feed orders by (change_xid, change_seq) and only serves
+    transactions older than every one still running (see changes_horizon). On SQLite the counter
+    row stays locked until commit, so change_seq alone follows commit order and change_xid is 0.
+    """
+    if connection.dialect.name == 'postgresql':
+        rows = connection.execute(
+            db.select(db.cast(db.cast(func.pg_current_xact_id(), db.Text), db.BigInteger),
+                      RESERVATION_CHANGE_SEQUENCE.next_value())
+            .select_from(func.generate_series(1, count))
+        ).all()
+        return rows[0][0], [row[1] for row in rows]
+    table = ChangeSequence.__table__
+    last = connection.execute(
+        update(table).where(table.c.name == RESERVATION_CHANGES)
+        .values(value=table.c.value + count).returning(table.c.value)
+    ).scalar()
+    if last is None:
+        raise RuntimeError("change_sequence is not seeded; run `flask init-db`")
+    return 0, list(range(last - count + 1, last + 1))
+
+def changes_horizon():
+    """PostgreSQL: the oldest transaction id still running. Rows written by older transactions are
+    final, so the feed can hand them out without a later commit slipping in behind the cursor."""
+    return db.cast(db.cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), db.Text), db.BigInteger)
+
+@event.listens_for(Session, 'before_flush')
+def stamp_reservation_changes(session, flush_context, instances):
+    """Stamp new and modified reservations with the next change_seq and updated_at."""
+    changed = [obj for obj in session.new if isinstance(obj, Reservation)] + [
+        obj for obj in session.dirty
+        if isinstance(obj, Reservation) and session.is_modified(obj, include_collections=False)]
+    if not changed:
+        return
+    xid, values = next_change_seq(session.connection(), len(changed))
+    now = datetime.now(IST)
+    for obj, value in zip(changed, values):
+        obj.change_seq, obj.change_xid = value, xid
+        obj.updated_at = now
+
+# -----------------------
+# Bulk spot provisioning
+# -----------------------
+def parse_lot_numbers(data, number_of_spots=None, price=None):
+    """(number_of_spots, price) from a lot payload, keeping the given values for absent fields.
+
+    number_of_spots must be a non-negative integer and price a positive number; raises ValueError
+    with the reason otherwise.
+    """
+    if 'number_of_spots' in data:
+        value = data['number_of_spots']
+        try:
+            if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+                raise ValueError
+            number_of_spots = int(value)
+        except (ValueError, TypeError):
+            raise ValueError("number_of_spots must be an integer")
+        if number_of_spots < 0:
+            raise ValueError("number_of_spots cannot be negative")
+    if 'price' in data:
+        value = data['price']
+        try:
+            if isinstance(value, bool):
+                raise ValueError
+            price = float(value)
+        except (ValueError, TypeError):
+            raise ValueError("price must be a number")
+        if not 0 < price < float('inf'):
+            raise ValueError("price must be positive")
+    return number_of_spots, price
+
+LAYOUT_KEYS = ('levels', 'rows', 'per_row')
+
+def parse_layout(layout, count):
+    """Validate a {'levels', 'rows', 'per_row'} layout for `count` spots; raises ValueError with the reason.
+
+    per_row is required; rows defaults to 1 and levels to as many as the spots need.
+    """
+    if not isinstance(layout, dict):
+        raise ValueError("layout must be an object with levels, rows and per_row")
+    unknown = sorted(set(layout) - set(LAYOUT_KEYS))
+    if unknown:
+        raise ValueError(f"Unknown layout field: {', '.join(unknown)}")
+    if 'per_row' not in layout:
+        raise ValueError("layout.per_row is required")
+    parsed = {}
+    for key in LAYOUT_KEYS:
+        value = layout.get(key, 1 if key == 'rows' else None)
+        if value is None and key == 'levels':
+            continue
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise ValueError(f"layout.{key} must be a positive integer")
+        parsed[key] = value
+    if 'levels' in parsed and parsed['levels'] * parsed['rows'] * parsed['per_row'] < count:
+        raise ValueError(f"layout holds {parsed['levels'] * parsed['rows'] * parsed['per_row']} spots, "
+                         f"fewer than number_of_spots ({count})")
+    return parsed
+
+def spot_labels(layout, count):
+    """Labels 'L<level>-R<row>-<number>' for a layout checked by parse_layout()."""
+    rows, per_row = layout['rows'], layout['per_row']
+    width = len(str(per_row))
+    return [
+        f"L{i // (rows * per_row) + 1}-R{i // per_row % rows + 1}-{i % per_row + 1:0{width}d}"
+        for i in range(count)
+    ]
+
+def provision_spots(lot_id, count, labels=None):
+    """Insert `count` available spots for a lot with a single executemany INSERT."""
+    if count <= 0:
+        return 0
+    labels = labels or [None] * count
+    db.session.execute(insert(ParkingSpot), [{'lot_id': lot_id, 'status': 'A', 'label': label} for label in labels])
+    return count
+
+def remove_free_spots(lot_id, count):
+    """Delete the `count` newest available spots of a lot in one bounded DELETE; returns rows removed."""
+    victims = (
+        db.select(ParkingSpot.id)
+        .where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A')
+        .order_by(ParkingSpot.id.desc())
+        .limit(count)
+    )
+    return db.session.execute(
+        delete(ParkingSpot)
+        .where(ParkingSpot.id.in_(victims), ParkingSpot.status == 'A')
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+# -----------------------
+# Free-spot pool (process-local; the database stays the source of truth)
+# -----------------------
+class FreeSpotPool:
+    """Per-lot sets of available spot ids so allocation and availability are O(1).
+
+    Entries are only hints: every claim is still confirmed by the conditional UPDATE in
+    claim_spot(), so a stale entry (e.g. a spot taken by another worker process) is
+    simply dropped. Built lazily from parking_spot on first use.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._free = {}
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.rebuild()
+
+    def _load_rows(self, lot_id=None):
+        q = db.session.query(ParkingSpot.lot_id, ParkingSpot.id).join(ParkingLot).filter(
+            ParkingSpot.status == 'A', ParkingLot.is_deleted.is_(False))
+        if lot_id is not None:
+            q = q.filter(ParkingSpot.lot_id == lot_id)
+        free = {}
+        for lid, sid in q:
+            free.setdefault(lid, set()).add(sid)
+        return free
+
+    def rebuild(self):
+        free = self._load_rows()
+        with self._lock:
+            self._free = free
+            self._loaded = True
+
+    def reload_lot(self, lot_id):
+        if not self._loaded:
+            return
+        spots = self._load_rows(lot_id).get(lot_id, set())
+        with self._lock:
+            self._free[lot_id] = spots
+
+    def take(self, lot_id):
+        self._ensure_loaded()
+        with self._lock:
+            spots = self._free.get(lot_id)
+            return spots.pop() if spots else None
+
+    def put(self, lot_id, spot_id):
+        if not self._loaded:
+            return
+        with self._lock:
+            self._free.setdefault(lot_id, set()).add(spot_id)
+
+    def available(self, lot_id):
+        self._ensure_loaded()
+        with self._lock:
+            return len(self._free.get(lot_id, ()))
+
+    def check(self):
+        """Compare the pool with the database; returns {lot_id: {'missing': [...], 'stale': [...]}}."""
+        self._ensure_loaded()
+        actual = self._load_rows()
+        with self._lock:
+            pooled = {lid: set(spots) for lid, spots in self._free.items()}
+        problems = {}
+        for lid in set(actual) | set(pooled):
+            missing = actual.get(lid, set()) - pooled.get(lid, set())
+            stale = pooled.get(lid, set()) - actual.get(lid, set())
+            if missing or stale:
+                problems[lid] = {'missing': sorted(missing), 'stale': sorted(stale)}
+        return problems
+
+free_spot_pool = FreeSpotPool()
+
+@app.cli.command('check-spot-pool')
+@click.option('--repair', is_flag=True, help='Rebuild the pool from the database if it has drifted.')
+def check_spot_pool(repair):
+    """Report free-spot pool entries that disagree with parking_spot."""
+    problems = free_spot_pool.check()
+    for lot_id, diff in sorted(problems.items()):
+        click.echo(f"lot {lot_id}: missing={diff['missing']} stale={diff['stale']}")
+    if not problems:
+        click.echo("Free-spot pool is consistent with the database.")
+    elif repair:
+        free_spot_pool.rebuild()
+        click.echo("Free-spot pool rebuilt.")
+
+# -----------------------
+# Spot claim (atomic compare-and-swap on parking_spot.status)
+# -----------------------
+SPOT_CLAIM_MAX_RETRIES = int(os.getenv('SPOT_CLAIM_MAX_RETRIES', 5))
+
+def _claim_spot_by_id(spot_id):
+    return db.session.execute(
+        update(ParkingSpot)
+        .where(ParkingSpot.id == spot_id, ParkingSpot.status == 'A')
+        .values(status='R')
+        .returning(ParkingSpot.id)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+def claim_spot(lot_id):
+    """Flip one available spot of the lot to 'R' in a single statement and return its id.
+
+    Candidates come from the free-spot pool first; once the pool has nothing for the lot
+    the candidate is sub-selected from parking_spot (spots released by other processes).
+    The UPDATE re-checks status='A', so two concurrent claims can never get the same
+    spot; a claim that loses the race updates nothing and is retried. On PostgreSQL the
+    candidate sub-select uses SKIP LOCKED so claimers do not queue behind each other.
+    Runs inside the caller's transaction; returns None when the lot is full.
+    """
+    while True:
+        spot_id = free_spot_pool.take(lot_id)
+        if spot_id is None:
+            break
+        if _claim_spot_by_id(spot_id) is not None:
+            return spot_id
+
+    for _ in range(SPOT_CLAIM_MAX_RETRIES):
+        candidate = (
+            db.select(ParkingSpot.id)
+            .where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A')
+            .order_by(ParkingSpot.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        spot_id = _claim_spot_by_id(candidate)
+        if spot_id is not None:
+            return spot_id
+        if not db.session.query(ParkingSpot.id).filter_by(lot_id=lot_id, status='A').first():
+            return None
+    return None
+
+# -----------------------
+# Parking-lot payload cache (version-stamped keys, single-flight rebuild)
+# -----------------------
+PARKING_LOTS_VERSION_KEY = 'parking_lots:version'
+PARKING_LOTS_CACHE_TTL = int(os.getenv('PARKING_LOTS_CACHE_TTL', 60))
+PARKING_LOTS_REBUILD_WAIT = float(os.getenv('PARKING_LOTS_REBUILD_WAIT', 2))
+
+cache_stats = {'hits': 0, 'misses': 0, 'rebuilds': 0, 'waits': 0, 'errors': 0}
+_cache_stats_lock = threading.Lock()
+_rebuild_locks = {}
+
+def _count_cache(stat):
+    with _cache_stats_lock:
+        cache_stats[stat] += 1
+
+def _cache_call(fn, *args, **kwargs):
+    """Run a cache operation; a cache outage degrades to a miss instead of a 500."""
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        _count_cache('errors')
+        app.logger.warning("Cache unavailable: %s", e)
+        return None
+
+def bump_parking_lots_version():
+    """Invalidate every cached lot payload. Call after a lot or spot change commits."""
+    _cache_call(cache.cache.inc, PARKING_LOTS_VERSION_KEY)
+
+def cached_parking_lots(scope, build):
+    """Read-through cache for lot payloads keyed by scope and the current version.
+
+    On a miss only one caller per key rebuilds: threads of this process share a lock and
+    other processes back off on a cache.add() marker, polling for the fresh value for up
+    to PARKING_LOTS_REBUILD_WAIT seconds before building it themselves.
+    """
+    version = _cache_call(cache.get, PARKING_LOTS_VERSION_KEY) or 0
+    key = f"parking_lots:{scope}:v{version}"
+    value = _cache_call(cache.get, key)
+    if value is not None:
+        _count_cache('hits')
+        return value
+    _count_cache('misses')
+
+    with _cache_stats_lock:
+        local_lock = _rebuild_locks.setdefault(key, threading.Lock())
+    with local_lock:
+        value = _cache_call(cache.get, key)
+        if value is not None:
+            _count_cache('hits')
+            return value
+        marker = key + ':rebuilding'
+        # add() is False when another process holds the marker, None when the cache is down
+        if _cache_call(cache.add, marker, 1, timeout=max(int(PARKING_LOTS_REBUILD_WAIT * 5), 1)) is False:
+            _count_cache('waits')
+            deadline = time_module.monotonic() + PARKING_LOTS_REBUILD_WAIT
+            while time_module.monotonic() < deadline:
+                time_module.sleep(0.05)
+                value = _cache_call(cache.get, key)
+                if value is not None:
+                    return value
+        try:
+            value = build()
+            _count_cache('rebuilds')
+            _cache_call(cache.set, key, value, timeout=PARKING_LOTS_CACHE_TTL)
+        finally:
+            _cache_call(cache.delete, marker)
+            with _cache_stats_lock:
+                _rebuild_locks.pop(key, None)
+    return value
+
+@app.route('/api/admin/cache-stats', methods=['GET'])
+@role_required('admin')
+def admin_cache_stats():
+    with _cache_stats_lock:
+        stats = dict(cache_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+    stats['version'] = _cache_call(cache.get, PARKING_LOTS_VERSION_KEY) or 0
+    return jsonify(stats), 200
+
+# -----------------------
+# Live availability feed (one shared change feed, fanned out to SSE streams)
+# -----------------------
+AVAILABILITY_CHANNEL = 'parking_lots:availability'
+SSE_QUEUE_SIZE = int(os.getenv('SSE_QUEUE_SIZE', 256))
+SSE_KEEPALIVE_SEC = int(os.getenv('SSE_KEEPALIVE_SEC', 15))
+# every open stream holds a server thread for as long as the client stays connected; past this many
+# per process new streams get 503 and clients poll instead (size worker threads above it, see gunicorn.conf.py)
+SSE_MAX_STREAMS = int(os.getenv('SSE_MAX_STREAMS', 50))
+SSE_RETRY_AFTER_SEC = 30
+
+class AvailabilityBroker:
+    """Fans lot availability changes out to every open stream of this process.
+
+    With Redis, changes are published to one channel and a single listener thread per
+    process relays them, so streams on every worker see changes made by any worker.
+    Without Redis (or with AVAILABILITY_BROKER=memory) the fan-out stays in-process.
+    """
+
+    def __init__(self, redis_url=None):
+        self._redis_url = redis_url
+        self._redis = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def _client(self):
+        with self._lock:
+            if self._redis is None and self._redis_url:
+                try:
+                    client = redis.Redis.from_url(self._redis_url)
+                    client.ping()
+                    self._redis = client
+                except Exception as e:
+                    app.logger.warning("Availability feed using in-process fan-out: %s", e)
+                    self._redis_url = None
+            return self._redis
+
+    def subscribe(self):
+        """A queue for one stream, or None when this process already serves SSE_MAX_STREAMS streams."""
+        q = queue.Queue(maxsize=SSE_QUEUE_SIZE)
+        with self._lock:
+            if len(self._subscribers) >= SSE_MAX_STREAMS:
+                return None
+            self._subscribers.add(q)
+        self._ensure_listener()
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, message):
+        client = self._client()
+        if client is not None:
+            try:
+                client.publish(AVAILABILITY_CHANNEL, json.dumps(message))
+                return
+            except Exception as e:
+                app.logger.warning("Availability publish failed, delivering locally: %s", e)
+        self._fan_out(message)
+
+    def _fan_out(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # slow client: end its stream, EventSource reconnects and gets a fresh snapshot
+                self.unsubscribe(q)
+                with q.mutex:
+                    q.queue.clear()
+                q.put_nowait(None)
+
+    def _ensure_listener(self):
+        client = self._client()
+        with self._lock:
+            if client is None or self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen, args=(client,), daemon=True)
+            self._listener.start()
+
+    def _listen(self, client):
+        while True:
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(AVAILABILITY_CHANNEL)
+                for item in pubsub.listen():
+                    self._fan_out(json.loads(item['data']))
+            except Exception as e:
+                app.logger.warning("Availability listener reconnecting: %s", e)
+                time_module.sleep(1)
+
+availability_broker = AvailabilityBroker(
+    None if os.getenv('AVAILABILITY_BROKER', 'redis') == 'memory'
+    else os.getenv('AVAILABILITY_REDIS_URL', app.config['broker_url'])
+)
+
+def lot_changed(lot_id):
+    """Post-commit hook for lot/spot changes: invalidate cached listings and push the lot's availability."""
+    bump_parking_lots_version()
+    lot = db.session.get(ParkingLot, lot_id)
+    if lot is None:
+        return
+    availability_broker.publish({
+        'id': lot.id,
+        'available_spots': lot.available_spots,
+        'reserved_spots': lot.reserved_spots,
+        'number_of_spots': lot.number_of_spots,
+        'is_deleted': bool(lot.is_deleted)
+    })
+
+@app.route('/api/user/parking-lots/stream', methods=['GET'])
+def user_parking_lots_stream():
+    """Server-sent events: one 'snapshot' event with the lot listing, then 'availability' deltas."""
+    subscription = availability_broker.subscribe()
+    if subscription is None:
+        response = jsonify({"message": "Too many live streams, poll /api/user/parking-lots instead"})
+        response.headers['Retry-After'] = str(SSE_RETRY_AFTER_SEC)
+        return response, 503
+    # subscribe before reading the snapshot so no change can fall between the two
+    try:
+        snapshot = cached_parking_lots('user', user_parking_lots_snapshot)
+    except Exception:
+        availability_broker.unsubscribe(subscription)
+        raise
+
+    def events():
+        try:
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            while True:
+                try:
+                    message = subscription.get(timeout=SSE_KEEPALIVE_SEC)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield f"event: availability\ndata: {json.dumps(message)}\n\n"
+        finally:
+            availability_broker.unsubscribe(subscription)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # -----------------------
 # Auth routes (SQLAlchemy + flask_jwt_extended)
 # -----------------------
 
 @app.route('/api/register', methods=['POST'])
+@write_transaction
 def register():
     data = request.get_json()
     required_fields = ['username', 'password']
@@ -242,12 +1349,12 @@ def register():
     name = data.get('name')
     address = data.get('address')
     pin_code = data.get('pin_code')
+    # hash before the first query: the write lock is held from there until commit
+    password_hash = generate_password_hash(password)
     existing_user = User.query.filter_by(username=username).first()
     if existing_user:
         return jsonify({'message': 'Username already exists'}), 400
 
-    password_hash = generate_password_hash(password)
-
     new_user = User(
         username=username,
         password_hash=password_hash,
@@ -291,12 +1398,58 @@ def login():
 @app.route('/api/admin/parking-lots', methods=['GET'])
 @role_required('admin')
 def admin_get_parking_lots():
-    lots = ParkingLot.query.all()   # admin sees both active + disabled
-    result = []
+    """Lots with their spots in a fixed number of queries (lots, spots, current holders).
+
+    Optional query params: lot_id, status (A / R / DISABLED) to filter the spot lists,
+    and page / per_page to page through lots (total count in X-Total-Count).
+    """
+    lot_id = request.args.get('lot_id', type=int)
+    status = (request.args.get('status') or '').strip().upper()
+    page = request.args.get('page', type=int)
+    per_page = min(request.args.get('per_page', 20, type=int), 200)
+
+    result, total = cached_parking_lots(
+        f"admin:{lot_id}:{status}:{page}:{per_page}",
+        lambda: admin_parking_lots_snapshot(lot_id, status, page, per_page)
+    )
+    headers = {'X-Total-Count': str(total)} if total is not None else {}
+    return jsonify(result), 200, headers
+
+def admin_parking_lots_snapshot(lot_id, status, page, per_page):
+    lots_query = ParkingLot.query.order_by(ParkingLot.id)   # admin sees both active + disabled
+    if lot_id is not None:
+        lots_query = lots_query.filter(ParkingLot.id == lot_id)
+    total = None
+    if page:
+        total = lots_query.count()
+        lots_query = lots_query.limit(per_page).offset((max(page, 1) - 1) * per_page)
+    lots = lots_query.all()
+    lot_ids = [lot.id for lot in lots]
+
+    spots_query = db.session.query(ParkingSpot.id, ParkingSpot.lot_id, ParkingSpot.status, ParkingSpot.label).filter(
+        ParkingSpot.lot_id.in_(lot_ids))
+    if status:
+        spots_query = spots_query.filter(ParkingSpot.status == ("INACTIVE" if status == "DISABLED" else status))
+    spots_by_lot = {}
+    for spot in spots_query.order_by(ParkingSpot.id):
+        spots_by_lot.setdefault(spot.lot_id, []).append(spot)
+
+    # latest active reservation per spot, joined to its user, in one query
+    latest = (
+        db.session.query(func.max(Reservation.id).label('reservation_id'))
+        .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+        .filter(ParkingSpot.lot_id.in_(lot_ids), active_reservation())
+        .group_by(Reservation.spot_id)
+        .subquery()
+    )
+    reserved_by = dict(
+        db.session.query(Reservation.spot_id, User.name)
+        .join(latest, latest.c.reservation_id == Reservation.id)
+        .join(User, User.id == Reservation.user_id)
+    )
 
+    result = []
     for lot in lots:
-        available_spots = ParkingSpot.query.filter_by(lot_id=lot.id, status='A').count()
-
         result.append({
             'id': lot.id,
             'prime_location_name': lot.prime_location_name,
@@ -304,31 +1457,24 @@ def admin_get_parking_lots():
             'address': lot.address,
             'pin_code': lot.pin_code,
             'number_of_spots': lot.number_of_spots,
-            'available_spots': available_spots,
+            'available_spots': lot.available_spots,
             'is_deleted': bool(lot.is_deleted),       # ⭐ show active/disabled
             'spots': [
             {
                 'id': s.id,
+                'label': s.label,
                 'status': "DISABLED" if s.status == "INACTIVE" else s.status,
-                'reserved_by': (
-                    Reservation.query.join(User)
-                    .with_entities(User.name)
-                    .filter(
-                        Reservation.spot_id == s.id,
-                        Reservation.status.in_(["Reserved", "Occupied"])
-                    )
-                    .order_by(Reservation.id.desc())
-                    .first()
-                )[0] if s.status in ["R", "Reserved", "Occupied"] else None
+                'reserved_by': reserved_by.get(s.id) if s.status in ["R", "Reserved", "Occupied"] else None
             }
-            for s in lot.spots
+            for s in spots_by_lot.get(lot.id, [])
             ]
         })
 
-    return jsonify(result), 200
+    return result, total
 
 @app.route('/api/admin/parking-lots', methods=['POST'])
 @role_required('admin')
+@write_transaction
 def admin_create_parking_lot():
     data = request.get_json() or {}
     required_fields = ['prime_location_name', 'price', 'address', 'pin_code', 'number_of_spots']
@@ -337,24 +1483,37 @@ def admin_create_parking_lot():
         if f not in data:
             return jsonify({"message": f"Missing field: {f}"}), 400
 
+    try:
+        number_of_spots, price = parse_lot_numbers(data)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    # optional layout, e.g. {"levels": 3, "rows": 4, "per_row": 25} -> labels L1-R1-01 ...
+    layout = data.get('layout')
+    try:
+        labels = spot_labels(parse_layout(layout, number_of_spots), number_of_spots) if layout is not None else None
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
     try:
         lot = ParkingLot(
             prime_location_name=data['prime_location_name'],
-            price=float(data['price']),
+            price=price,
             address=data['address'],
             pin_code=data['pin_code'],
-            number_of_spots=int(data['number_of_spots']),
+            number_of_spots=number_of_spots,
+            available_spots=number_of_spots,
+            reserved_spots=0,
             is_deleted=False
         )
         db.session.add(lot)
-        db.session.commit()
+        db.session.flush()
 
-        # create spots
-        for _ in range(lot.number_of_spots):
-            db.session.add(ParkingSpot(lot_id=lot.id, status='A'))
+        # create spots (same transaction as the lot)
+        provision_spots(lot.id, number_of_spots, labels)
         db.session.commit()
+        free_spot_pool.reload_lot(lot.id)
 
-        cache.delete('parking_lots_all')
+        lot_changed(lot.id)
         return jsonify({"message": "Parking lot created successfully"}), 201
 
     except Exception as e:
@@ -363,48 +1522,55 @@ def admin_create_parking_lot():
 
 @app.route('/api/admin/parking-lots/<int:lot_id>', methods=['PUT'])
 @role_required('admin')
+@write_transaction
 def admin_update_parking_lot(lot_id):
+    data = request.get_json() or {}
+    # validate before the first query, which opens the write transaction
+    try:
+        new_spots, price = parse_lot_numbers(data)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
     try:
         lot = db.session.get(ParkingLot, lot_id)
         if not lot:
             return jsonify({'message': 'Parking lot not found'}), 404
 
-        data = request.get_json() or {}
-
         if 'prime_location_name' in data:
             lot.prime_location_name = data['prime_location_name']
-        if 'price' in data:
-            lot.price = float(data['price'])
+        if price is not None:
+            lot.price = price
         if 'address' in data:
             lot.address = data['address']
         if 'pin_code' in data:
             lot.pin_code = data['pin_code']
 
         old_spots = lot.number_of_spots
-        new_spots = int(data.get('number_of_spots', old_spots))
+        if new_spots is None:
+            new_spots = old_spots
+        if new_spots != old_spots and lot.is_deleted:
+            # a disabled lot has only INACTIVE spots and zero counters; restore it before resizing
+            db.session.rollback()
+            return jsonify({'message': 'Restore the parking lot before changing its number of spots'}), 409
 
         if new_spots != old_spots:
             if new_spots > old_spots:
                 # ADD NEW SPOTS
-                for _ in range(new_spots - old_spots):
-                    db.session.add(ParkingSpot(lot_id=lot.id, status='A'))
+                provision_spots(lot.id, new_spots - old_spots)
+                shift_lot_counters(lot.id, available=new_spots - old_spots)
             else:
                 # REMOVE ONLY AVAILABLE SPOTS
                 to_delete = old_spots - new_spots
-                available_spots = ParkingSpot.query.filter_by(
-                    lot_id=lot.id, status='A'
-                ).order_by(ParkingSpot.id.desc()).limit(to_delete).all()
-
-                if len(available_spots) < to_delete:
+                if remove_free_spots(lot.id, to_delete) < to_delete:
+                    db.session.rollback()
                     return jsonify({"message": "Cannot reduce spots — not enough free spots"}), 400
-
-                for sp in available_spots:
-                    db.session.delete(sp)
+                shift_lot_counters(lot.id, available=-to_delete)
 
             lot.number_of_spots = new_spots
 
         db.session.commit()
-        cache.delete('parking_lots_all')
+        free_spot_pool.reload_lot(lot.id)
+        lot_changed(lot.id)
 
         return jsonify({'message': 'Parking lot updated successfully'}), 200
 
@@ -414,6 +1580,7 @@ def admin_update_parking_lot(lot_id):
 
 @app.route('/api/admin/parking-lots/<int:lot_id>', methods=['DELETE'])
 @role_required('admin')
+@write_transaction
 def admin_delete_parking_lot(lot_id):
     try:
         lot = db.session.get(ParkingLot, lot_id)
@@ -437,8 +1604,12 @@ def admin_delete_parking_lot(lot_id):
 
         # Disable all spots
         ParkingSpot.query.filter_by(lot_id=lot.id).update({"status": "INACTIVE"})
+        lot.available_spots = 0
+        lot.reserved_spots = 0
 
         db.session.commit()
+        free_spot_pool.reload_lot(lot.id)
+        lot_changed(lot.id)
         return jsonify({'message': 'Parking lot disabled successfully'}), 200
 
     except Exception as e:
@@ -447,6 +1618,7 @@ def admin_delete_parking_lot(lot_id):
 
 @app.route('/api/admin/parking-lots/<int:lot_id>/restore', methods=['POST'])
 @role_required('admin')
+@write_transaction
 def admin_restore_parking_lot(lot_id):
     try:
         lot = db.session.get(ParkingLot, lot_id)
@@ -464,12 +1636,13 @@ def admin_restore_parking_lot(lot_id):
         # If there are no spot rows at all (unlikely), ensure spots exist matching number_of_spots
         existing_spot_count = ParkingSpot.query.filter_by(lot_id=lot.id).count()
         if existing_spot_count < (lot.number_of_spots or 0):
-            to_create = (lot.number_of_spots or 0) - existing_spot_count
-            for _ in range(to_create):
-                db.session.add(ParkingSpot(lot_id=lot.id, status='A'))
+            provision_spots(lot.id, (lot.number_of_spots or 0) - existing_spot_count)
 
+        db.session.flush()
+        recompute_lot_counters(lot.id)
         db.session.commit()
-        cache.delete('parking_lots_all')
+        free_spot_pool.reload_lot(lot.id)
+        lot_changed(lot.id)
 
         return jsonify({
             'message': 'Parking lot restored successfully',
@@ -483,17 +1656,197 @@ def admin_restore_parking_lot(lot_id):
         app.logger.exception("Error restoring parking lot %s: %s", lot_id, e)
         return jsonify({'message': f'Error restoring parking lot: {str(e)}'}), 500
 
+# -----------------------
+# Search index (SQLite FTS5 over users, lots and reservations)
+# -----------------------
+SEARCH_ENTITY_CODES = {'user': 1, 'lot': 2, 'reservation': 3}   # rowid = entity_id * 4 + code
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', 25))
+
+# one INSERT ... SELECT per entity type; {where} narrows it to the changed rows
+SEARCH_INDEX_SQL = {
+    'user': """
+        INSERT OR REPLACE INTO search_index(rowid, entity, entity_id, body)
+        SELECT u.id * 4 + 1, 'user', u.id,
+               coalesce(u.name, '') || ' ' || u.username || ' ' || coalesce(u.address, '') || ' ' ||
+               coalesce(u.pin_code, '') || ' ' || coalesce(u.role, '')
+        FROM user u {where}""",
+    'lot': """
+        INSERT OR REPLACE INTO search_index(rowid, entity, entity_id, body)
+        SELECT l.id * 4 + 2, 'lot', l.id,
+               l.prime_location_name || ' ' || coalesce(l.address, '') || ' ' || coalesce(l.pin_code, '') || ' ' ||
+               l.price || ' lot ' || l.id || ' ' ||
+               CASE WHEN l.is_deleted THEN 'disabled inactive deleted off' ELSE 'active enabled' END
+        FROM parking_lot l {where}""",
+    'reservation': """
+        INSERT OR REPLACE INTO search_index(rowid, entity, entity_id, body)
+        SELECT r.id * 4 + 3, 'reservation', r.id,
+               'reservation ' || r.id || ' ' || r.status || ' ' || coalesce(r.vehicle_number, '') || ' spot ' ||
+               coalesce(r.spot_id, '') || ' lot ' || coalesce(r.lot_id, '') || ' ' || coalesce(u.name, '') || ' ' ||
+               coalesce(u.username, '') || ' ' || coalesce(l.prime_location_name, '')
+        FROM reservation r LEFT JOIN user u ON u.id = r.user_id LEFT JOIN parking_lot l ON l.id = r.lot_id {where}""",
+}
+SEARCH_ENTITY_ALIASES = {'user': 'u', 'lot': 'l', 'reservation': 'r'}
+
+def search_index_enabled(bind=None):
+    return (bind or db.engine).dialect.name == 'sqlite'
+
+def ensure_search_index():
+    """Create the FTS5 table on SQLite and fill it the first time."""
+    if not search_index_enabled():
+        return
+    exists = db.session.execute(db.text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'")).first()
+    if not exists:
+        db.session.execute(db.text(
+            "CREATE VIRTUAL TABLE search_index USING fts5("
+            "entity UNINDEXED, entity_id UNINDEXED, body, prefix='2 3')"))
+        rebuild_search_index()
+        db.session.commit()
+
+@event.listens_for(db.metadata, 'after_drop')
+def drop_search_index(target, connection, **kw):
+    """The FTS table is not in the metadata, so without this db.drop_all() would leave stale rows behind."""
+    if search_index_enabled(connection):
+        connection.execute(db.text("DROP TABLE IF EXISTS search_index"))
+
+def rebuild_search_index():
+    db.session.execute(db.text("DELETE FROM search_index"))
+    for sql in SEARCH_INDEX_SQL.values():
+        db.session.execute(db.text(sql.format(where='')))
+
+def _reindex(connection, entity, ids, column='id'):
+    if not ids:
+        return
+    where = f"WHERE {SEARCH_ENTITY_ALIASES[entity]}.{column} IN :ids"
+    connection.execute(
+        db.text(SEARCH_INDEX_SQL[entity].format(where=where)).bindparams(bindparam('ids', expanding=True)),
+        {'ids': list(ids)})
+
+@event.listens_for(Session, 'after_flush')
+def sync_search_index(session, flush_context):
+    """Keep search_index in step with ORM writes, inside the same transaction."""
+    if not search_index_enabled(session.get_bind()):
+        return
+    changed = {'user': set(), 'lot': set(), 'reservation': set()}
+    renamed = {'user_id': set(), 'lot_id': set()}
+    removed = []
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, User):
+            changed['user'].add(obj.id)
+            if db.inspect(obj).attrs.name.history.has_changes() or db.inspect(obj).attrs.username.history.has_changes():
+                renamed['user_id'].add(obj.id)
+        elif isinstance(obj, ParkingLot):
+            changed['lot'].add(obj.id)
+            if db.inspect(obj).attrs.prime_location_name.history.has_changes():
+                renamed['lot_id'].add(obj.id)
+        elif isinstance(obj, Reservation):
+            changed['reservation'].add(obj.id)
+    for obj in session.deleted:
+        code = SEARCH_ENTITY_CODES.get({User: 'user', ParkingLot: 'lot', Reservation: 'reservation'}.get(type(obj)))
+        if code:
+            removed.append(obj.id * 4 + code)
+    if not (any(changed.values()) or removed):
+        return
+    connection = session.connection()
+    if removed:
+        connection.execute(
+            db.text("DELETE FROM search_index WHERE rowid IN :ids").bindparams(bindparam('ids', expanding=True)),
+            {'ids': removed})
+    for entity, ids in changed.items():
+        _reindex(connection, entity, ids)
+    # reservation bodies carry user and lot names
+    for column, ids in renamed.items():
+        _reindex(connection, 'reservation', ids, column=column)
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Recreate the admin search index from users, lots and reservations."""
+    if not search_index_enabled():
+        click.echo("Search index is only used on SQLite; nothing to do.")
+        return
+    ensure_search_index()
+    rebuild_search_index()
+    db.session.commit()
+    click.echo("Search index rebuilt.")
+
+def _encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def _decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        return None
+
+def search_index_page(query, entity=None, cursor=None, limit=SEARCH_PAGE_SIZE):
+    """Ranked page of (entity, id) hits plus per-entity counts and the next cursor."""
+    tokens = re.findall(r'\w+', query.lower())
+    match = ' '.join(f'"{t}"*' for t in tokens)
+    params = {'match': match, 'limit': limit + 1}
+    filters = ''
+    if entity:
+        filters += ' AND entity = :entity'
+        params['entity'] = entity
+    if cursor:
+        filters += ' AND (rank > :rank OR (rank = :rank AND rowid > :rowid))'
+        params['rank'], params['rowid'] = cursor
+    rows = db.session.execute(db.text(
+        "SELECT rowid, entity, entity_id, rank FROM search_index "
+        f"WHERE search_index MATCH :match{filters} ORDER BY rank, rowid LIMIT :limit"), params).all()
+    counts = dict(db.session.execute(db.text(
+        "SELECT entity, count(*) FROM search_index WHERE search_index MATCH :match GROUP BY entity"),
+        {'match': match}).all())
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor([rows[-1].rank, rows[-1].rowid])
+    return rows, counts, next_cursor
+
 # -----------------------
 # Admin search & users
 # -----------------------
 
 @app.route('/api/admin/search', methods=['GET'])
 @role_required('admin')
+@read_only
 def admin_search():
+    """Ranked, paginated search. Optional params: type (user / lot / reservation), limit, cursor."""
     query = request.args.get("q", "").strip()
     if not query:
         return jsonify({"error": "Search query required"}), 400
-    
+    entity = request.args.get("type")
+    if entity and entity not in SEARCH_ENTITY_CODES:
+        return jsonify({"error": "type must be user, lot or reservation"}), 400
+    limit = max(min(request.args.get("limit", SEARCH_PAGE_SIZE, type=int), 100), 1)
+    cursor = request.args.get("cursor")
+    position = _decode_cursor(cursor) if cursor else None
+    if cursor and position is None:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    if search_index_enabled():
+        if not re.search(r'\w', query):
+            return jsonify({"error": "Search query required"}), 400
+        rows, counts, next_cursor = search_index_page(query, entity, position, limit)
+        ids = {'user': [], 'lot': [], 'reservation': []}
+        for row in rows:
+            ids[row.entity].append(row.entity_id)
+        by_id = {
+            'user': {u.id: u for u in User.query.filter(User.id.in_(ids['user']))},
+            'lot': {l.id: l for l in ParkingLot.query.filter(ParkingLot.id.in_(ids['lot']))},
+            'reservation': {r.id: r for r in Reservation.query.options(
+                joinedload(Reservation.user), joinedload(Reservation.lot)).filter(Reservation.id.in_(ids['reservation']))},
+        }
+        # keep rank order within each type
+        users = [by_id['user'][i] for i in ids['user'] if i in by_id['user']]
+        lots = [by_id['lot'][i] for i in ids['lot'] if i in by_id['lot']]
+        reservations = [by_id['reservation'][i] for i in ids['reservation'] if i in by_id['reservation']]
+    else:
+        users, lots, reservations, counts, next_cursor = _search_like(query, entity, position or 0, limit)
+
+    return jsonify(_format_search_results(users, lots, reservations, counts, next_cursor))
+
+def _search_like(query, entity, offset, limit):
+    """ILIKE fallback for databases without the FTS index; pages each type by offset."""
     # Convert to lower-case for flexible matching
     search = f"%{query}%"
 
@@ -508,7 +1861,7 @@ def admin_search():
             User.pin_code.ilike(search),
             User.role.ilike(search)          # NEW: search by role
         )
-    ).all()
+    )
 
     # -------------------------
     # 2) PARKING LOT SEARCH
@@ -525,7 +1878,7 @@ def admin_search():
 
     # IMPORTANT FIX
     if status_filter is not None:
-        lots = ParkingLot.query.filter(status_filter).all()
+        lots = ParkingLot.query.filter(status_filter)
     else:
         search = f"%{query}%"
         lots = ParkingLot.query.filter(
@@ -536,7 +1889,7 @@ def admin_search():
                 func.cast(ParkingLot.price, db.String).ilike(search),
                 func.cast(ParkingLot.id, db.String).ilike(search)
             )
-        ).all()
+        )
 
 
     # -------------------------
@@ -558,13 +1911,24 @@ def admin_search():
         .outerjoin(User)              # OUTER JOIN avoids NULL join break
         .outerjoin(ParkingLot)
         .filter(or_(*reservation_filter))
-        .all()
     )
 
+    counts, pages, has_more = {}, {}, False
+    for name, q, model in (('user', users, User), ('lot', lots, ParkingLot), ('reservation', reservations, Reservation)):
+        if entity and entity != name:
+            counts[name], pages[name] = 0, []
+            continue
+        counts[name] = q.count()
+        pages[name] = q.order_by(model.id).offset(offset).limit(limit).all()
+        has_more = has_more or counts[name] > offset + limit
+    next_cursor = _encode_cursor(offset + limit) if has_more else None
+    return pages['user'], pages['lot'], pages['reservation'], counts, next_cursor
+
+def _format_search_results(users, lots, reservations, counts, next_cursor):
     # -------------------------
     # FORMAT RESPONSE
     # -------------------------
-    return jsonify({
+    return {
         "users": [{
             "username": u.username,
             "name": u.name,
@@ -602,8 +1966,74 @@ def admin_search():
             "start_time": r.start_time,
             "end_time": r.end_time,
             "total_cost": r.total_cost
-        } for r in reservations]
-    })
+        } for r in reservations],
+
+        "counts": {name: counts.get(name, 0) for name in SEARCH_ENTITY_CODES},
+        "next_cursor": next_cursor
+    }
+
+# -----------------------
+# Vehicle lookup (prefix on vehicle_plate, trailing digits on vehicle_plate_rev)
+# -----------------------
+# a fragment from the middle of a plate matches neither index; it is looked for with LIKE among the
+# active reservations and only this many of the most recent ones, never the whole table
+VEHICLE_LOOKUP_SCAN_ROWS = int(os.getenv('VEHICLE_LOOKUP_SCAN_ROWS', 50000))
+
+def _prefix_range(column, prefix):
+    """column starts with prefix, as an index-friendly range (plates are uppercase alphanumerics)."""
+    return db.and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+@app.route('/api/admin/vehicles/lookup', methods=['GET'])
+@role_required('admin')
+def admin_vehicle_lookup():
+    """Partial plate lookup ("TN07", "4946", "AB49"): active reservations first, then recent history."""
+    plate = normalize_plate(request.args.get("q"))
+    if len(plate) < 2:
+        return jsonify({"error": "At least 2 letters or digits required"}), 400
+    limit = max(min(request.args.get("limit", 20, type=int), 100), 1)
+
+    matches = or_(
+        _prefix_range(Reservation.vehicle_plate, plate),
+        _prefix_range(Reservation.vehicle_plate_rev, plate[::-1])
+    )
+    base = Reservation.query.options(joinedload(Reservation.user), joinedload(Reservation.lot)).filter(matches)
+    active = base.filter(active_reservation()) \
+        .order_by(Reservation.start_time.desc()).limit(limit).all()
+    history = []
+    if len(active) < limit:
+        history = base.filter(active_reservation(negate=True)) \
+            .order_by(Reservation.start_time.desc()).limit(limit - len(active)).all()
+
+    if len(plate) >= 3 and len(active) + len(history) < limit:
+        # plate is letters and digits only, so it needs no LIKE escaping
+        inside = Reservation.query.options(joinedload(Reservation.user), joinedload(Reservation.lot)).filter(
+            Reservation.vehicle_plate.like(f"%{plate}%"), Reservation.id.notin_([r.id for r in active + history]))
+        # the active slice is at most one row per spot: read it off the partial index and sort here,
+        # rather than let an ORDER BY start_time tempt the planner into walking the whole table
+        active += sorted(inside.filter(active_reservation()).all(),
+                         key=lambda r: r.start_time or datetime.min, reverse=True)[:limit - len(active) - len(history)]
+        if len(active) + len(history) < limit:
+            recent_from = (db.session.query(func.max(Reservation.id)).scalar() or 0) - VEHICLE_LOOKUP_SCAN_ROWS
+            # newest id first walks the primary key down to recent_from; no sort over the window
+            history += inside.filter(active_reservation(negate=True), Reservation.id > recent_from) \
+                .order_by(Reservation.id.desc()).limit(limit - len(active) - len(history)).all()
+
+    return jsonify({
+        "query": plate,
+        "results": [{
+            "reservation_id": r.id,
+            "vehicle_number": r.vehicle_number,
+            "match": "prefix" if r.vehicle_plate.startswith(plate) else
+                     "suffix" if r.vehicle_plate.endswith(plate) else "contains",
+            "status": r.status,
+            "active": r.status in ["Reserved", "Occupied"],
+            "lot": {"id": r.lot_id, "name": r.lot.prime_location_name if r.lot else None},
+            "spot_id": r.spot_id,
+            "user": {"name": r.user.name if r.user else None, "username": r.user.username if r.user else None},
+            "start_time": r.start_time.isoformat() if r.start_time else None,
+            "end_time": r.end_time.isoformat() if r.end_time else None
+        } for r in active + history]
+    }), 200
 
 @app.route('/api/admin/users', methods=['GET'])
 @role_required('admin')
@@ -612,66 +2042,545 @@ def admin_get_users():
     return jsonify([{'id': u.id, 'name': u.name, 'username': u.username, 'address': u.address, 'pin_code': u.pin_code, 'role': u.role} for u in users]), 200
 
 # -----------------------
-# Admin summary (single endpoint returning all needed pieces)
+# Revenue & occupancy rollups (lot x hour, lot x day)
+# -----------------------
+DURATION_BUCKETS = [("0-1 Hour", 1), ("1-3 Hours", 3), ("3-6 Hours", 6), ("6-9 Hours", 9), ("9+ Hours", None)]
+DURATION_BUCKET_COLUMNS = ['sessions_0_1h', 'sessions_1_3h', 'sessions_3_6h', 'sessions_6_9h', 'sessions_9h_plus']
+
+def duration_bucket(hours):
+    for i, (_, upper) in enumerate(DURATION_BUCKETS[:-1]):
+        if hours <= upper:
+            return i
+    return len(DURATION_BUCKETS) - 1
+
+def _rollup_keys(lot_id, moment):
+    """Hourly and daily rollup keys for an instant, in IST wall-clock time like the stored datetimes."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(IST).replace(tzinfo=None)
+    hour_start = moment.replace(minute=0, second=0, microsecond=0)
+    return {'lot_id': lot_id, 'hour_start': hour_start}, {'lot_id': lot_id, 'day': hour_start.date()}
+
+def _upsert_rollup(model, key, values):
+    """INSERT the row or fold the values into it: additive measures are summed, peak takes the max."""
+    if db.engine.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        greatest = func.max
+    else:
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        greatest = func.greatest
+    table = model.__table__
+    stmt = dialect_insert(table).values(**key, **values)
+    merged = {
+        name: (greatest(table.c[name], stmt.excluded[name]) if name == 'peak_occupancy'
+               else table.c[name] + stmt.excluded[name])
+        for name in values
+    }
+    db.session.execute(stmt.on_conflict_do_update(index_elements=list(key), set_=merged))
+
+def record_peak_occupancy(lot_id, moment, occupied):
+    """Raise the hour's and day's peak to `occupied`.
+
+    Called with the count after each arrival and the count before each release; cars that stay
+    across an hour with no events are stamped by record_open_occupancy().
+    """
+    hourly, daily = _rollup_keys(lot_id, moment)
+    _upsert_rollup(LotHourlyRollup, hourly, {'peak_occupancy': occupied})
+    _upsert_rollup(LotDailyRollup, daily, {'peak_occupancy': occupied})
+
+def record_open_occupancy(moment=None):
+    """Carry each lot's current reserved_spots into the current hour and day, so hours where cars
+    stayed parked but nobody arrived or left still show them. Runs at the top of every hour."""
+    moment = moment or datetime.now(IST)
+    lots = db.session.query(ParkingLot.id, ParkingLot.reserved_spots).filter(ParkingLot.reserved_spots > 0).all()
+    for lot_id, occupied in lots:
+        record_peak_occupancy(lot_id, moment, occupied)
+    db.session.commit()
+    return len(lots)
+
+@celery.task(name='tasks.record_open_occupancy')
+@write_transaction
+def task_record_open_occupancy():
+    with app.app_context():
+        return {"lots": record_open_occupancy()}
+
+def record_completed_session(lot_id, end_time, cost, parked_hours):
+    """Fold one released reservation into the rollups (same transaction as the release)."""
+    hourly, daily = _rollup_keys(lot_id, end_time)
+    measures = {'revenue': float(cost or 0), 'sessions': 1, 'parked_minutes': parked_hours * 60}
+    _upsert_rollup(LotHourlyRollup, hourly, measures)
+    bucket = {column: int(i == duration_bucket(parked_hours)) for i, column in enumerate(DURATION_BUCKET_COLUMNS)}
+    _upsert_rollup(LotDailyRollup, daily, {**measures, **bucket})
+
+def backfill_rollups(batch_size=5000):
+    """Rebuild both rollup tables from reservation history, streaming rows in batches."""
+    hourly, daily = {}, {}
+
+    def bucket(store, key, extra=()):
+        row = store.get(key)
+        if row is None:
+            row = store[key] = {'revenue': 0.0, 'sessions': 0, 'parked_minutes': 0.0, 'peak_occupancy': 0,
+                                **{column: 0 for column in extra}}
+        return row
+
+    sessions = db.session.query(Reservation.lot_id, Reservation.start_time, Reservation.end_time,
+                                Reservation.total_cost).filter(
+        Reservation.status == 'Released', Reservation.lot_id.isnot(None),
+        Reservation.start_time.isnot(None), Reservation.end_time.isnot(None)
+    ).execution_options(yield_per=batch_size)
+    for lot_id, start, end, cost in sessions:
+        hours = (end - start).total_seconds() / 3600
+        hour_key, day_key = _rollup_keys(lot_id, end)
+        for row in (bucket(hourly, tuple(hour_key.values())),
+                    bucket(daily, tuple(day_key.values()), DURATION_BUCKET_COLUMNS)):
+            row['revenue'] += float(cost or 0)
+            row['sessions'] += 1
+            row['parked_minutes'] += hours * 60
+        daily[tuple(day_key.values())][DURATION_BUCKET_COLUMNS[duration_bucket(hours)]] += 1
+
+    def raise_peak(lot_id, moment, occupied):
+        hour_key, day_key = _rollup_keys(lot_id, moment)
+        for store, key, extra in ((hourly, tuple(hour_key.values()), ()),
+                                  (daily, tuple(day_key.values()), DURATION_BUCKET_COLUMNS)):
+            row = bucket(store, key, extra)
+            row['peak_occupancy'] = max(row['peak_occupancy'], occupied)
+
+    def carry(lot_id, since, until, occupied):
+        """Stamp the hours after since's hour up to and including until's hour, like the hourly beat."""
+        hour = _rollup_keys(lot_id, since)[0]['hour_start'] + timedelta(hours=1)
+        until = _rollup_keys(lot_id, until)[0]['hour_start']
+        while hour <= until:
+            raise_peak(lot_id, hour, occupied)
+            hour += timedelta(hours=1)
+
+    # peak occupancy: sweep start (+1) and end (-1) events in time order per lot, recording the count
+    # after each arrival and before each release, and carrying it across hours without events
+    events = db.union_all(
+        db.select(Reservation.lot_id, Reservation.start_time.label('at'), db.literal(1).label('delta'))
+        .where(Reservation.lot_id.isnot(None), Reservation.start_time.isnot(None)),
+        db.select(Reservation.lot_id, Reservation.end_time.label('at'), db.literal(-1).label('delta'))
+        .where(Reservation.lot_id.isnot(None), Reservation.start_time.isnot(None), Reservation.end_time.isnot(None))
+    ).subquery()
+    now = datetime.now(IST)
+    current_lot, occupied, last_at = None, 0, None
+    for lot_id, at, delta in db.session.execute(
+            db.select(events.c.lot_id, events.c.at, events.c.delta)
+            .order_by(events.c.lot_id, events.c.at, events.c.delta).execution_options(yield_per=batch_size)):
+        if lot_id != current_lot:
+            if occupied > 0:
+                carry(current_lot, last_at, now, occupied)  # still parked
+            current_lot, occupied = lot_id, 0
+        elif occupied > 0:
+            carry(lot_id, last_at, at, occupied)
+        raise_peak(lot_id, at, max(occupied, occupied + delta))
+        occupied += delta
+        last_at = at
+    if occupied > 0:
+        carry(current_lot, last_at, now, occupied)
+
+    db.session.execute(delete(LotHourlyRollup))
+    db.session.execute(delete(LotDailyRollup))
+    for model, store, names in ((LotHourlyRollup, hourly, ('lot_id', 'hour_start')),
+                                (LotDailyRollup, daily, ('lot_id', 'day'))):
+        rows = [{**dict(zip(names, key)), **values} for key, values in store.items()]
+        for i in range(0, len(rows), batch_size):
+            db.session.execute(insert(model), rows[i:i + batch_size])
+    db.session.commit()
+    return len(hourly), len(daily)
+
+@app.cli.command('backfill-rollups')
+def backfill_rollups_command():
+    """Rebuild lot hourly/daily rollups from reservation history."""
+    hours, days = backfill_rollups()
+    click.echo(f"Rebuilt {hours} hourly and {days} daily rollup rows.")
+
+# -----------------------
+# Admin summary (single endpoint returning all needed pieces, read from the rollups)
 # -----------------------
 @app.route('/api/admin/summary', methods=['GET'])
+@read_only
 def admin_summary():
     # Occupancy
-    active_lot_ids = [l.id for l in ParkingLot.query.filter_by(is_deleted=False).all()]
-    total_spots = ParkingSpot.query.filter(ParkingSpot.lot_id.in_(active_lot_ids)).count()
-    reserved = ParkingSpot.query.filter(ParkingSpot.lot_id.in_(active_lot_ids), ParkingSpot.status == 'R').count()
-    available = ParkingSpot.query.filter(ParkingSpot.lot_id.in_(active_lot_ids), ParkingSpot.status == 'A').count()
-    occupancy = {"reserved": reserved, "available": available, "total": total_spots}
+    reserved, available = db.session.query(
+        func.coalesce(func.sum(ParkingLot.reserved_spots), 0),
+        func.coalesce(func.sum(ParkingLot.available_spots), 0)
+    ).filter(ParkingLot.is_deleted.is_(False)).one()
+    occupancy = {"reserved": reserved, "available": available, "total": reserved + available}
 
     # Revenue per lot
-    revenue_results = db.session.query(ParkingLot.prime_location_name, func.sum(Reservation.total_cost)).join(
-        Reservation, Reservation.lot_id == ParkingLot.id).group_by(ParkingLot.prime_location_name).all()
+    revenue_results = db.session.query(ParkingLot.prime_location_name, func.sum(LotDailyRollup.revenue)).join(
+        LotDailyRollup, LotDailyRollup.lot_id == ParkingLot.id).group_by(ParkingLot.prime_location_name).all()
     lots = [row[0] for row in revenue_results]
     revenue = [float(row[1] or 0) for row in revenue_results]
     revenue_per_lot = {"lots": lots, "revenue": revenue}
 
-    # Daily revenue for last N days (default 7 or 10)
-    days = int(os.getenv('ADMIN_DAILY_RANGE_DAYS', 7))
+    # Daily revenue for last N days (default 7 or 10, or ?days=)
+    days = request.args.get('days', int(os.getenv('ADMIN_DAILY_RANGE_DAYS', 7)), type=int)
+    days = max(min(days, 366), 1)
     today_ist = datetime.now(IST).date()
     lastN = [today_ist - timedelta(days=i) for i in range(days-1, -1, -1)]
-    dates, values = [], []
-    for single_date in lastN:
-        day_start = datetime.combine(single_date, time.min)
-        day_end = datetime.combine(single_date + timedelta(days=1), time.min)
-        if day_start.tzinfo is None:
-            day_start = IST.localize(day_start)
-        if day_end.tzinfo is None:
-            day_end = IST.localize(day_end)
-        day_sum = db.session.query(func.sum(Reservation.total_cost)).filter(Reservation.end_time >= day_start, Reservation.end_time < day_end).scalar()
-        dates.append(single_date.strftime("%Y-%m-%d"))
-        values.append(float(day_sum or 0))
-    daily_revenue = {"dates": dates, "values": values}
+    day_sums = dict(
+        db.session.query(LotDailyRollup.day, func.sum(LotDailyRollup.revenue))
+        .filter(LotDailyRollup.day >= lastN[0], LotDailyRollup.day <= today_ist)
+        .group_by(LotDailyRollup.day)
+    )
+    dates = [single_date.strftime("%Y-%m-%d") for single_date in lastN]
+    daily_revenue = {"dates": dates, "values": [float(day_sums.get(d) or 0) for d in lastN]}
 
     # Duration distribution
-    reservations = Reservation.query.all()
-    buckets = {"0-1 Hour": 0, "1-3 Hours": 0, "3-6 Hours": 0, "6-9 Hours": 0, "9+ Hours": 0}
-    for r in reservations:
-        if r.start_time and r.end_time:
-            diff = (r.end_time - r.start_time).total_seconds() / 3600
-            if diff <= 1:
-                buckets["0-1 Hour"] += 1
-            elif diff <= 3:
-                buckets["1-3 Hours"] += 1
-            elif diff <= 6:
-                buckets["3-6 Hours"] += 1
-            elif diff <= 9:
-                buckets["6-9 Hours"] += 1
-            else:
-                buckets["9+ Hours"] += 1
-    duration_summary = {"buckets": list(buckets.keys()), "counts": list(buckets.values())}
+    counts = db.session.query(
+        *[func.coalesce(func.sum(getattr(LotDailyRollup, column)), 0) for column in DURATION_BUCKET_COLUMNS]
+    ).one()
+    duration_summary = {"buckets": [label for label, _ in DURATION_BUCKETS], "counts": [int(n) for n in counts]}
 
     return jsonify({"success": True, "occupancy": occupancy, "revenue_per_lot": revenue_per_lot, "daily_revenue": daily_revenue, "duration_distribution": duration_summary}), 200
 
+@app.route('/api/admin/summary/hourly', methods=['GET'])
+@role_required('admin')
+def admin_hourly_summary():
+    """Hourly revenue, sessions and peak occupancy for one IST day (?date=YYYY-MM-DD, optional ?lot_id=)."""
+    try:
+        day = datetime.strptime(request.args.get('date') or datetime.now(IST).strftime("%Y-%m-%d"), "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"message": "date must be YYYY-MM-DD"}), 400
+    lot_id = request.args.get('lot_id', type=int)
+
+    q = db.session.query(
+        LotHourlyRollup.hour_start,
+        func.sum(LotHourlyRollup.revenue),
+        func.sum(LotHourlyRollup.sessions),
+        func.sum(LotHourlyRollup.parked_minutes),
+        func.max(LotHourlyRollup.peak_occupancy)
+    ).filter(LotHourlyRollup.hour_start >= day, LotHourlyRollup.hour_start < day + timedelta(days=1))
+    if lot_id is not None:
+        q = q.filter(LotHourlyRollup.lot_id == lot_id)
+    by_hour = {row[0].hour: row[1:] for row in q.group_by(LotHourlyRollup.hour_start)}
+
+    hours = range(24)
+    return jsonify({
+        "date": day.strftime("%Y-%m-%d"),
+        "lot_id": lot_id,
+        "hours": [f"{h:02d}:00" for h in hours],
+        "revenue": [float(by_hour[h][0] or 0) if h in by_hour else 0.0 for h in hours],
+        "sessions": [int(by_hour[h][1] or 0) if h in by_hour else 0 for h in hours],
+        "parked_minutes": [round(float(by_hour[h][2] or 0), 1) if h in by_hour else 0.0 for h in hours],
+        # with no lot_id this is the busiest single lot of each hour
+        "peak_occupancy": [int(by_hour[h][3] or 0) if h in by_hour else 0 for h in hours]
+    }), 200
+
+# -----------------------
+# Occupancy analytics (vectorized sweep over reservation intervals)
+# -----------------------
+OCCUPANCY_STEPS = {"minute": 60, "hour": 3600, "day": 86400}
+OCCUPANCY_MAX_POINTS = int(os.getenv('OCCUPANCY_MAX_POINTS', 200000))
+EPOCH = datetime(1970, 1, 1)
+
+def to_epoch(moment):
+    return int((moment - EPOCH).total_seconds())
+
+def _epoch_seconds(column):
+    """SQL expression for a naive IST timestamp as seconds since 1970-01-01 (the clock is only used for differences)."""
+    if db.engine.dialect.name == 'postgresql':
+        return func.extract('epoch', column)
+    # julianday() is the cheapest date function SQLite has; strftime('%s') is about twice as slow
+    return (func.julianday(column) - 2440587.5) * 86400.0
+
+def _fetch_tuples(stmt):
+    """Plain DBAPI tuples; skipping SQLAlchemy's Row processing halves the cost of multi-million-row reads."""
+    result = db.session.connection().execute(stmt)
+    try:
+        return result.cursor.fetchall()
+    finally:
+        result.close()
+
+def _merge_sorted(values, new):
+    new = np.sort(np.asarray(new, dtype=np.int64))
+    return np.insert(values, np.searchsorted(values, new), new) if new.size else values
+
+class ReservationIntervals:
+    """Released reservations (lot, start, end, cost) per lot, kept in memory as NumPy arrays.
+
+    Released rows never change and reservations are never deleted, so after the first full
+    load a refresh only reads rows with an id above the highest one seen plus the ones that
+    were still open last time: a primary-key range and a short IN list instead of a rescan.
+    Occupancy only needs the two sorted multisets of start and end times, so those are kept
+    sorted next to the paired columns used for repricing.
+    """
+
+    MAX_TRACKED_OPEN = 30000  # larger open sets fall back to a full reload (IN-list size)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lots = {}  # lot_id (None = all lots) -> state dict, see _load()
+
+    @staticmethod
+    def _scoped(q, lot_id):
+        return q.filter(Reservation.lot_id == lot_id) if lot_id is not None else q
+
+    @staticmethod
+    def _session_columns():
+        return (func.coalesce(Reservation.lot_id, 0), _epoch_seconds(Reservation.start_time),
+                _epoch_seconds(Reservation.end_time), func.coalesce(Reservation.total_cost, 0))
+
+    def _load(self, lot_id):
+        max_id = self._scoped(db.session.query(func.max(Reservation.id)), lot_id).scalar() or 0
+        closed = self._scoped(db.session.query(*self._session_columns()).filter(
+            Reservation.id <= max_id, Reservation.status == 'Released',
+            Reservation.start_time.isnot(None), Reservation.end_time.isnot(None)
+        ), lot_id)
+        rows = np.array(_fetch_tuples(closed.statement), dtype=np.float64).reshape(-1, 4)
+        opened = self._scoped(db.session.query(Reservation.id, _epoch_seconds(Reservation.start_time)).filter(
+            Reservation.id <= max_id, Reservation.status != 'Released', Reservation.start_time.isnot(None)
+        ), lot_id)
+        state = {'max_id': max_id, 'open': {rid: int(round(start)) for rid, start in opened}}
+        self._set_sessions(state, rows)
+        return state
+
+    @staticmethod
+    def _set_sessions(state, rows):
+        state['lot_ids'] = rows[:, 0].astype(np.int64)
+        state['start_s'], state['end_s'], state['costs'] = rows[:, 1], rows[:, 2], rows[:, 3]
+        state['starts'] = np.sort(np.rint(rows[:, 1]).astype(np.int64))
+        state['ends'] = np.sort(np.rint(rows[:, 2]).astype(np.int64))
+
+    def _refresh(self, lot_id, state):
+        rows = self._scoped(db.session.query(Reservation.id, Reservation.status, *self._session_columns()).filter(
+            or_(Reservation.id > state['max_id'], Reservation.id.in_(list(state['open']))),
+            Reservation.start_time.isnot(None)
+        ), lot_id).all()
+        released, still_open = [], {}
+        for rid, status, lid, start, end, cost in rows:
+            if status != 'Released':
+                still_open[rid] = int(round(start))
+            elif end is not None:
+                released.append((lid, start, end, cost))
+        state['max_id'] = max([state['max_id']] + [row[0] for row in rows])
+        state['open'] = still_open
+        if released:
+            new = np.array(released, dtype=np.float64)
+            state['lot_ids'] = np.concatenate((state['lot_ids'], new[:, 0].astype(np.int64)))
+            state['start_s'] = np.concatenate((state['start_s'], new[:, 1]))
+            state['end_s'] = np.concatenate((state['end_s'], new[:, 2]))
+            state['costs'] = np.concatenate((state['costs'], new[:, 3]))
+            state['starts'] = _merge_sorted(state['starts'], np.rint(new[:, 1]))
+            state['ends'] = _merge_sorted(state['ends'], np.rint(new[:, 2]))
+
+    def _current(self, lot_id):
+        # callers hold self._lock; arrays are replaced, never mutated, so they can be used after release
+        state = self._lots.get(lot_id)
+        if state is None or len(state['open']) > self.MAX_TRACKED_OPEN:
+            state = self._lots[lot_id] = self._load(lot_id)
+        else:
+            self._refresh(lot_id, state)
+        return state
+
+    def snapshot(self, lot_id, now):
+        """(starts, ends) sorted int64 arrays for every reservation of the lot; open ones are still in use at `now`."""
+        with self._lock:
+            state = self._current(lot_id)
+            starts, ends, open_starts = state['starts'], state['ends'], list(state['open'].values())
+        return _merge_sorted(starts, open_starts), _merge_sorted(ends, [max(now, s) + 1 for s in open_starts])
+
+    def sessions(self, lot_id=None):
+        """Released sessions as paired arrays: (lot_ids, start seconds, end seconds, billed total_cost)."""
+        with self._lock:
+            state = self._current(lot_id)
+            return state['lot_ids'], state['start_s'], state['end_s'], state['costs']
+
+    def clear(self):
+        with self._lock:
+            self._lots.clear()
+
+reservation_intervals = ReservationIntervals()
+
+def occupancy_series(starts, ends, t0, t1, step):
+    """
+    Occupancy on the grid t0, t0+step, ... < t1, from sorted start and end times.
+    Returns (grid, at_start, average, peak): spots in use at each grid instant, the time-weighted
+    mean over [t, t+step) and the maximum reached inside it.
+    """
+    grid = np.arange(t0, t1, step, dtype=np.int64)
+    if grid.size == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return grid, empty, empty.astype(float), empty
+    s, e = starts, ends
+
+    # occupancy(t) = #starts <= t - #ends <= t
+    def occupied_at(t):
+        return np.searchsorted(s, t, side='right') - np.searchsorted(e, t, side='right')
+    at_start = occupied_at(grid)
+
+    # integral of occupancy up to t, from prefix sums of the sorted event times
+    s_cum = np.concatenate(([0], np.cumsum(s, dtype=np.float64)))
+    e_cum = np.concatenate(([0], np.cumsum(e, dtype=np.float64)))
+    edges = np.append(grid, min(grid[-1] + step, t1)).astype(np.float64)
+    ns = np.searchsorted(s, edges, side='right')
+    ne = np.searchsorted(e, edges, side='right')
+    area = (ns * edges - s_cum[ns]) - (ne * edges - e_cum[ne])
+    average = np.diff(area) / np.diff(edges)
+
+    # peak: the bucket-start value or the running count right after any start inside the bucket
+    peak = at_start.copy()
+    if s.size:
+        after_start = occupied_at(s)
+        bucket = np.searchsorted(grid, s, side='right') - 1
+        inside = (bucket >= 0) & (s < edges[-1])
+        np.maximum.at(peak, bucket[inside], after_start[inside])
+    return grid, at_start, average, peak
+
+def _parse_when(value, default):
+    if not value:
+        return default
+    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(value)
+
+@app.route('/api/admin/analytics/occupancy', methods=['GET'])
+@role_required('admin')
+def admin_occupancy_analytics():
+    """Spots in use per step (minute/hour/day) for one lot, or all lots, over [from, to); defaults to the last 90 days by hour."""
+    lot_id = request.args.get('lot_id', type=int)
+    step_name = request.args.get('step', 'hour')
+    if step_name not in OCCUPANCY_STEPS:
+        return jsonify({"message": f"step must be one of {', '.join(OCCUPANCY_STEPS)}"}), 400
+    step = OCCUPANCY_STEPS[step_name]
+    # default window ends at the step boundary after now, so the current minute/hour/day is included
+    now = to_epoch(datetime.now(IST).replace(tzinfo=None))
+    now = EPOCH + timedelta(seconds=now - now % step + step)
+    try:
+        end = _parse_when(request.args.get('to'), now)
+        start = _parse_when(request.args.get('from'), end - timedelta(days=90))
+    except ValueError:
+        return jsonify({"message": "from/to must be YYYY-MM-DD or YYYY-MM-DDTHH:MM[:SS]"}), 400
+    if start >= end:
+        return jsonify({"message": "from must be before to"}), 400
+    t0, t1 = to_epoch(start), to_epoch(end)
+    if (t1 - t0) // step > OCCUPANCY_MAX_POINTS:
+        return jsonify({"message": f"Range too long for step={step_name} (max {OCCUPANCY_MAX_POINTS} points)"}), 400
+
+    capacity = None
+    if lot_id is not None:
+        lot = ParkingLot.query.get(lot_id)
+        if not lot:
+            return jsonify({"message": "Parking lot not found"}), 404
+        capacity = lot.number_of_spots
+
+    starts, ends = reservation_intervals.snapshot(lot_id, to_epoch(datetime.now(IST).replace(tzinfo=None)))
+    grid, at_start, average, peak = occupancy_series(starts, ends, t0, t1, step)
+    # every interval has end >= start, so those overlapping [t0, t1) are starts before t1 minus ends at or before t0
+    overlapping = int(np.searchsorted(starts, t1) - np.searchsorted(ends, t0, side='right'))
+    return jsonify({
+        "lot_id": lot_id,
+        "capacity": capacity,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "step": step_name,
+        "intervals": overlapping,
+        "timestamps": np.datetime_as_string(grid.astype('datetime64[s]'), unit='m' if step < 86400 else 'D').tolist(),
+        "occupied": at_start.tolist(),
+        "average": np.round(average, 2).tolist(),
+        "peak": peak.tolist()
+    }), 200
+
+# -----------------------
+# Tariff engine (scalar path for checkout, NumPy batch path for repricing)
+# -----------------------
+MIN_BILLED_HOURS = 0.25
+DAY_RATE_MULTIPLIER = 18  # a full day costs 18x the hourly price
+
+def compute_total_cost(hours, price, day_rate_multiplier=DAY_RATE_MULTIPLIER):
+    """Hourly tariff: 0.25 h minimum; past 24 h each full day is billed at the day rate plus the remaining hours."""
+    price = float(price)
+    if hours > 24:
+        days = int(hours // 24)
+        remaining = hours % 24
+        return round(days * (day_rate_multiplier * price) + remaining * price)
+    return round(max(hours, MIN_BILLED_HOURS) * price)
+
+def compute_total_costs(hours, prices, day_rate_multiplier=DAY_RATE_MULTIPLIER):
+    """compute_total_cost() over arrays (prices broadcast); same float operations, same rounding (half to even)."""
+    hours = np.asarray(hours, dtype=np.float64)
+    prices = np.asarray(prices, dtype=np.float64)
+    long_stay = np.floor_divide(hours, 24) * (day_rate_multiplier * prices) + np.mod(hours, 24) * prices
+    short_stay = np.maximum(hours, MIN_BILLED_HOURS) * prices
+    return np.round(np.where(hours > 24, long_stay, short_stay))
+
+@app.route('/api/admin/pricing/simulate', methods=['GET'])
+@role_required('admin')
+def admin_pricing_simulation():
+    """
+    Reprice released reservations under a proposed tariff and report the revenue delta.
+    ?lot_id= limits to one lot (required with ?price=); ?day_rate_multiplier= changes the day rate;
+    ?from= / ?to= bound the checkout time (default: the whole history).
+    """
+    lot_id = request.args.get('lot_id', type=int)
+    price = request.args.get('price', type=float)
+    multiplier = request.args.get('day_rate_multiplier', DAY_RATE_MULTIPLIER, type=float)
+    if price is not None and lot_id is None:
+        return jsonify({"message": "price can only be simulated for a single lot_id"}), 400
+    if (price is not None and price < 0) or multiplier <= 0:
+        return jsonify({"message": "price must be >= 0 and day_rate_multiplier > 0"}), 400
+    try:
+        start = _parse_when(request.args.get('from'), None)
+        end = _parse_when(request.args.get('to'), None)
+    except ValueError:
+        return jsonify({"message": "from/to must be YYYY-MM-DD or YYYY-MM-DDTHH:MM[:SS]"}), 400
+
+    lots = {lot.id: lot for lot in ParkingLot.query.all()}
+    if lot_id is not None and lot_id not in lots:
+        return jsonify({"message": "Parking lot not found"}), 404
+
+    lot_ids, start_s, end_s, billed = reservation_intervals.sessions(lot_id)
+    keep = np.ones(lot_ids.size, dtype=bool)
+    if start is not None:
+        keep &= end_s >= to_epoch(start)
+    if end is not None:
+        keep &= end_s < to_epoch(end)
+    lot_ids, hours, billed = lot_ids[keep], (end_s[keep] - start_s[keep]) / 3600, billed[keep]
+
+    price_by_lot = np.zeros(max(lots, default=0) + 1)
+    for lid, lot in lots.items():
+        price_by_lot[lid] = lot.price or 0
+    current_prices = price_by_lot[np.clip(lot_ids, 0, price_by_lot.size - 1)]
+    current = compute_total_costs(hours, current_prices)
+    projected = compute_total_costs(hours, current_prices if price is None else price, multiplier)
+
+    # per-lot totals in one pass each
+    index, position = np.unique(lot_ids, return_inverse=True)
+    per_lot = [np.bincount(position, weights=w, minlength=index.size) for w in (billed, current, projected)]
+    sessions = np.bincount(position, minlength=index.size)
+
+    current_total, projected_total = float(current.sum()), float(projected.sum())
+    return jsonify({
+        "lot_id": lot_id,
+        "price": price if price is not None else (lots[lot_id].price if lot_id is not None else None),
+        "day_rate_multiplier": multiplier,
+        "sessions": int(hours.size),
+        "billed_revenue": float(billed.sum()),
+        "current_tariff_revenue": current_total,
+        "projected_revenue": projected_total,
+        "revenue_delta": projected_total - current_total,
+        "revenue_delta_pct": round(100 * (projected_total - current_total) / current_total, 2) if current_total else None,
+        "lots": [{
+            "lot_id": int(lid),
+            "name": lots[lid].prime_location_name if lid in lots else None,
+            "sessions": int(sessions[k]),
+            "billed_revenue": float(per_lot[0][k]),
+            "current_tariff_revenue": float(per_lot[1][k]),
+            "projected_revenue": float(per_lot[2][k]),
+            "revenue_delta": float(per_lot[2][k] - per_lot[1][k])
+        } for k, lid in enumerate(index.tolist())]
+    }), 200
+
 # -----------------------
 # User routes (allocate, reservations, terminate, parking-lots, details, summary)
 # -----------------------
 @app.route('/api/user/allocate', methods=['POST'])
+@write_transaction
 def allocate_spot():
+    lot_id = spot_id = None
     try:
         data = request.get_json() or {}
         username = data.get('user')
@@ -688,28 +2597,32 @@ def allocate_spot():
         if not lot or lot.is_deleted:
             return jsonify({'message': 'Parking lot not found'}), 404
 
-        spot = ParkingSpot.query.filter_by(lot_id=lot.id, status="A").first()
-        if not spot:
+        spot_id = claim_spot(lot.id)
+        if spot_id is None:
+            db.session.rollback()
             return jsonify({'message': 'No available spots'}), 400
+        occupied = shift_lot_counters(lot.id, available=-1, reserved=1)
+        record_peak_occupancy(lot.id, datetime.now(IST), occupied)
 
-        spot.status = "R"
         reservation = Reservation(
             user_id=user.id,
             lot_id=lot.id,
-            spot_id=spot.id,
+            spot_id=spot_id,
             vehicle_number=vehicle_no,
             start_time=datetime.now(IST),
             status="Reserved"
         )
         db.session.add(reservation)
+        record_user_reservation(user.id, reservation.start_time)
         db.session.commit()
+        lot_changed(lot.id)
 
-        # Sync status (committed)
-        update_spot_status_from_reservation(reservation)
-
-        return jsonify({"message": "Spot reserved successfully!", "reservation_id": reservation.id, "spot_id": spot.id, "vehicle_no": vehicle_no}), 200
+        return jsonify({"message": "Spot reserved successfully!", "reservation_id": reservation.id, "spot_id": spot_id, "vehicle_no": vehicle_no}), 200
     except Exception as e:
         db.session.rollback()
+        if spot_id is not None:
+            # the claim was rolled back, so the spot is free again
+            free_spot_pool.put(int(lot_id), spot_id)
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @app.route('/api/user/reservations/<string:username>', methods=['GET'])
@@ -718,7 +2631,7 @@ def get_user_reservations(username):
     if not user:
         return jsonify({"message": "User not found"}), 404
 
-    reservations = Reservation.query.filter(Reservation.user_id == user.id, Reservation.status.in_(["Reserved", "Occupied"])).all()
+    reservations = Reservation.query.filter(Reservation.user_id == user.id, active_reservation()).all()
     result = []
     for r in reservations:
         result.append({
@@ -734,6 +2647,7 @@ def get_user_reservations(username):
     return jsonify(result)
 
 @app.route('/api/user/reservations/terminate/<int:reservation_id>', methods=['POST'])
+@write_transaction
 def terminate_reservation(reservation_id):
     try:
         reservation = db.session.get(Reservation, reservation_id)
@@ -743,31 +2657,48 @@ def terminate_reservation(reservation_id):
             return jsonify({'message': 'Reservation already released'}), 400
 
         end_time = datetime.now(IST)
+        previous_status = reservation.status
+        # flip the status only if no concurrent request already did, so stats and rollups count it once
+        if not db.session.execute(
+            update(Reservation)
+            .where(Reservation.id == reservation.id, Reservation.status != 'Released')
+            .values(status='Released', end_time=end_time)
+            .execution_options(synchronize_session=False)
+        ).rowcount:
+            db.session.rollback()
+            return jsonify({'message': 'Reservation already released'}), 400
         reservation.end_time = end_time
         reservation.status = "Released"
 
-        spot = db.session.get(ParkingSpot, reservation.spot_id)
-        if spot:
-            spot.status = "A"
+        # release the spot only if it is still reserved, so counters move exactly once
+        released_spot = db.session.execute(
+            update(ParkingSpot)
+            .where(ParkingSpot.id == reservation.spot_id, ParkingSpot.status == 'R')
+            .values(status='A')
+            .returning(ParkingSpot.lot_id, ParkingSpot.id)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if released_spot:
+            occupied = shift_lot_counters(released_spot.lot_id, available=1, reserved=-1)
+            # the departing car was still parked at this moment, so the hour saw at least one more
+            record_peak_occupancy(released_spot.lot_id, end_time, occupied + 1)
 
         # compute total_cost
         if reservation.start_time:
             start_time = reservation.start_time
             if start_time.tzinfo is None:
                 start_time = IST.localize(start_time)
-            duration_hours = (end_time - start_time).total_seconds() / 3600
-            if duration_hours > 24:
-                days = int(duration_hours // 24)
-                remaining = duration_hours % 24
-                daily_rate = 18 * float(reservation.lot.price)
-                total_cost = round(days * daily_rate + remaining * float(reservation.lot.price))
-            else:
-                duration_hours = max(duration_hours, 0.25)
-                total_cost = round(duration_hours * float(reservation.lot.price))
+            parked_hours = (end_time - start_time).total_seconds() / 3600
+            total_cost = compute_total_cost(parked_hours, reservation.lot.price)
             reservation.total_cost = total_cost
+            record_completed_session(reservation.lot_id, end_time, total_cost, parked_hours)
+            record_user_release(reservation.user_id, reservation.start_time, total_cost, parked_hours,
+                                was_reserved=previous_status == 'Reserved')
 
         db.session.commit()
-        update_spot_status_from_reservation(reservation)
+        if released_spot:
+            free_spot_pool.put(released_spot.lot_id, released_spot.id)
+            lot_changed(released_spot.lot_id)
         return jsonify({'message': 'Spot released successfully!'}), 200
     except Exception as e:
         db.session.rollback()
@@ -776,23 +2707,25 @@ def terminate_reservation(reservation_id):
 @app.route('/api/user/parking-lots', methods=['GET'])
 def user_get_parking_lots():
     try:
-        lots = ParkingLot.query.filter_by(is_deleted=False).all()
-        result = []
-        for lot in lots:
-            available_spots = ParkingSpot.query.filter_by(lot_id=lot.id, status='A').count()
-            result.append({
-                'id': lot.id,
-                'prime_location_name': lot.prime_location_name,
-                'price': lot.price,
-                'address': lot.address,
-                'pin_code': lot.pin_code,
-                'number_of_spots': lot.number_of_spots,
-                'available_spots': available_spots
-            })
-        return jsonify(result), 200
+        return jsonify(cached_parking_lots('user', user_parking_lots_snapshot)), 200
     except Exception as e:
         return jsonify({'message': f'Error fetching parking lots: {str(e)}'}), 500
 
+def user_parking_lots_snapshot():
+    lots = ParkingLot.query.filter_by(is_deleted=False).all()
+    result = []
+    for lot in lots:
+        result.append({
+            'id': lot.id,
+            'prime_location_name': lot.prime_location_name,
+            'price': lot.price,
+            'address': lot.address,
+            'pin_code': lot.pin_code,
+            'number_of_spots': lot.number_of_spots,
+            'available_spots': lot.available_spots
+        })
+    return result
+
 @app.route('/api/user/details/<string:username>', methods=['GET'])
 def get_user_details(username):
     user = User.query.filter_by(username=username).first()
@@ -800,67 +2733,290 @@ def get_user_details(username):
         return jsonify({"message": "User not found"}), 404
     return jsonify({"username": user.username, "name": user.name, "address": user.address, "pin_code": user.pin_code}), 200
 
+# -----------------------
+# Per-user statistics (user_stats / user_weekly_stats, maintained at allocate and terminate)
+# -----------------------
+USER_HISTORY_PAGE_SIZE = 20
+USER_SUMMARY_WEEKS = 5
+
+def _week_start(moment):
+    """Monday of the IST week containing the instant."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(IST).replace(tzinfo=None)
+    return moment.date() - timedelta(days=moment.weekday())
+
+def record_user_reservation(user_id, start_time):
+    """Count a new reservation (same transaction as the insert)."""
+    _upsert_rollup(UserStats, {'user_id': user_id}, {'total_reservations': 1, 'reserved_count': 1})
+    _upsert_rollup(UserWeeklyStats, {'user_id': user_id, 'week_start': _week_start(start_time)}, {'sessions': 1})
+
+def record_user_release(user_id, start_time, cost, parked_hours, was_reserved=True):
+    """Fold a released reservation into the user's totals; cost and hours go to the week it started in."""
+    measures = {'total_cost': float(cost or 0), 'total_hours': parked_hours}
+    _upsert_rollup(UserStats, {'user_id': user_id},
+                   {**measures, 'released_count': 1, 'reserved_count': -1 if was_reserved else 0})
+    _upsert_rollup(UserWeeklyStats, {'user_id': user_id, 'week_start': _week_start(start_time)}, measures)
+
+def backfill_user_stats(batch_size=5000):
+    """Rebuild user_stats and user_weekly_stats from reservation history, streaming rows in batches."""
+    totals, weekly = {}, {}
+    rows = db.session.query(Reservation.user_id, Reservation.status, Reservation.start_time,
+                            Reservation.end_time, Reservation.total_cost).filter(
+        Reservation.user_id.isnot(None)
+    ).execution_options(yield_per=batch_size)
+    for user_id, status, start, end, cost in rows:
+        user = totals.setdefault(user_id, {'total_reservations': 0, 'reserved_count': 0, 'released_count': 0,
+                                           'total_cost': 0.0, 'total_hours': 0.0})
+        user['total_reservations'] += 1
+        user['reserved_count'] += status == 'Reserved'
+        user['released_count'] += status == 'Released'
+        user['total_cost'] += float(cost or 0)
+        hours = (end - start).total_seconds() / 3600 if start and end else 0.0
+        user['total_hours'] += hours
+        if start:
+            week = weekly.setdefault((user_id, _week_start(start)), {'sessions': 0, 'total_cost': 0.0, 'total_hours': 0.0})
+            week['sessions'] += 1
+            week['total_cost'] += float(cost or 0)
+            week['total_hours'] += hours
+
+    db.session.execute(delete(UserStats))
+    db.session.execute(delete(UserWeeklyStats))
+    for model, rows in ((UserStats, [{'user_id': k, **v} for k, v in totals.items()]),
+                        (UserWeeklyStats, [{'user_id': k[0], 'week_start': k[1], **v} for k, v in weekly.items()])):
+        for i in range(0, len(rows), batch_size):
+            db.session.execute(insert(model), rows[i:i + batch_size])
+    db.session.commit()
+    return len(totals), len(weekly)
+
+@app.cli.command('backfill-user-stats')
+def backfill_user_stats_command():
+    """Rebuild per-user totals and weekly buckets from reservation history."""
+    users, weeks = backfill_user_stats()
+    click.echo(f"Rebuilt stats for {users} users ({weeks} weekly rows).")
+
+def user_history_page(user_id, cursor=None, limit=USER_HISTORY_PAGE_SIZE):
+    """Newest-first page of a user's reservations, keyset-paginated on reservation id."""
+    q = Reservation.query.options(joinedload(Reservation.lot)).filter(Reservation.user_id == user_id)
+    if cursor is not None:
+        q = q.filter(Reservation.id < cursor)
+    rows = q.order_by(Reservation.id.desc()).limit(limit + 1).all()
+    hist = [{
+        "id": r.id,
+        "lot_name": r.lot.prime_location_name + (" (disabled)" if r.lot and r.lot.is_deleted else "") if r.lot else None,
+        "spot_id": r.spot_id,
+        "start_time": r.start_time,
+        "end_time": r.end_time,
+        "status": r.status,
+        "vehicle_no": r.vehicle_number,
+        "total_cost": r.total_cost or 0
+    } for r in rows[:limit]]
+    next_cursor = _encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+    return hist, next_cursor
+
 # -----------------------
 # User summary
 # -----------------------
 @app.route('/api/user/summary', methods=['GET'])
 @jwt_required()
+@read_only
 def user_summary():
     username = get_jwt_identity()
     user = User.query.filter_by(username=username).first()
     if not user:
         return jsonify({'success': False, 'message': 'User not found'}), 404
     user_id = user.id
-    reservations = Reservation.query.filter_by(user_id=user_id).all()
-    total_reservations = len(reservations)
-    total_cost = sum(r.total_cost or 0 for r in reservations)
-    total_hours = sum(((r.end_time - r.start_time).total_seconds() / 3600) for r in reservations if r.end_time and r.start_time)
-
-    hist = []
-    for r in reservations:
-        hist.append({
-            "lot_name": r.lot.prime_location_name + (" (disabled)" if r.lot and r.lot.is_deleted else "") if r.lot else None,
-            "spot_id": r.spot_id,
-            "start_time": r.start_time,
-            "end_time": r.end_time,
-            "status": r.status,
-            "vehicle_no": r.vehicle_number,
-            "total_cost": r.total_cost or 0
-        })
+    stats = db.session.get(UserStats, user_id) or UserStats(
+        total_reservations=0, reserved_count=0, released_count=0, total_cost=0.0, total_hours=0.0)
 
-    reserved_count = Reservation.query.filter_by(user_id=user_id, status="Reserved").count()
-    released_count = Reservation.query.filter_by(user_id=user_id, status="Released").count()
-    used_spots = ParkingSpot.query.filter(ParkingSpot.status == "R").count()
-    free_spots = ParkingSpot.query.filter(ParkingSpot.status == "A").count()
+    used_spots, free_spots = db.session.query(
+        func.coalesce(func.sum(ParkingLot.reserved_spots), 0),
+        func.coalesce(func.sum(ParkingLot.available_spots), 0)
+    ).one()
 
     # weekly cost (last 5 weeks, oldest->newest)
-    weekly_cost = []
-    weeks = []
-    today = datetime.now(IST)
-    current_monday = (today - timedelta(days=today.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
-    for i in range(5):
-        week_start = current_monday - timedelta(weeks=(4 - i))  # oldest first
-        week_end = week_start + timedelta(days=7)
-        week_label = f"Week {5 - (4 - i)} ({week_start.strftime('%d %b')})"
-        week_data = Reservation.query.filter(Reservation.user_id == user_id, Reservation.start_time >= week_start, Reservation.start_time < week_end).all()
-        weekly_cost.append(sum(r.total_cost or 0 for r in week_data))
-        weeks.append(week_label)
-
+    current_monday = _week_start(datetime.now(IST))
+    week_starts = [current_monday - timedelta(weeks=(USER_SUMMARY_WEEKS - 1 - i)) for i in range(USER_SUMMARY_WEEKS)]
+    week_cost = dict(db.session.query(UserWeeklyStats.week_start, UserWeeklyStats.total_cost).filter(
+        UserWeeklyStats.user_id == user_id, UserWeeklyStats.week_start >= week_starts[0]))
+    weeks = [f"Week {i + 1} ({week_start.strftime('%d %b')})" for i, week_start in enumerate(week_starts)]
+    weekly_cost = [week_cost.get(week_start, 0) for week_start in week_starts]
+
+    hist, next_cursor = user_history_page(user_id)
     return jsonify({
         "success": True,
-        "summary": {"total_reservations": total_reservations, "total_cost": total_cost, "total_hours": round(total_hours, 2)},
+        "summary": {"total_reservations": stats.total_reservations, "total_cost": stats.total_cost, "total_hours": round(stats.total_hours, 2)},
         "history": hist,
-        "graphs": {"reserved": reserved_count, "released": released_count, "used_spots": used_spots, "free_spots": free_spots, "weeks": weeks, "weekly_cost": weekly_cost}
+        "next_cursor": next_cursor,
+        "graphs": {"reserved": stats.reserved_count, "released": stats.released_count, "used_spots": used_spots, "free_spots": free_spots, "weeks": weeks, "weekly_cost": weekly_cost}
     }), 200
 
+@app.route('/api/user/history', methods=['GET'])
+@jwt_required()
+@read_only
+def user_history():
+    """Further pages of the summary's reservation history (?cursor= from next_cursor, ?limit=)."""
+    user = User.query.filter_by(username=get_jwt_identity()).first()
+    if not user:
+        return jsonify({'success': False, 'message': 'User not found'}), 404
+    cursor = request.args.get('cursor')
+    if cursor:
+        cursor = _decode_cursor(cursor)
+        if not isinstance(cursor, int):
+            return jsonify({'success': False, 'message': 'Invalid cursor'}), 400
+    limit = max(min(request.args.get('limit', USER_HISTORY_PAGE_SIZE, type=int), 100), 1)
+    hist, next_cursor = user_history_page(user.id, cursor, limit)
+    return jsonify({"success": True, "history": hist, "next_cursor": next_cursor}), 200
+
 # -----------------------
 # Code supports synchronous download via /api/export-csv and async email via POST /api/user/export/<username>
 # -----------------------
+EXPORT_HEADER = ["Reservation ID", "Lot Name", "Spot ID", "Vehicle Number", "Start Time", "End Time", "Status", "Total Cost"]
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 2000))
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+def export_rows(user_id, status=None, batch_size=EXPORT_BATCH_SIZE):
+    """A user's reservations as CSV rows in start_time order, fetched batch by batch with the lot name joined in."""
+    q = db.session.query(
+        Reservation.id, ParkingLot.prime_location_name, Reservation.spot_id, Reservation.vehicle_number,
+        Reservation.start_time, Reservation.end_time, Reservation.status, Reservation.total_cost
+    ).outerjoin(ParkingLot, ParkingLot.id == Reservation.lot_id).filter(Reservation.user_id == user_id)
+    if status:
+        q = q.filter(Reservation.status == status)
+    for rid, lot_name, spot_id, vehicle, start, end, row_status, cost in \
+            q.order_by(Reservation.start_time.asc(), Reservation.id.asc()).execution_options(yield_per=batch_size):
+        yield [
+            rid,
+            lot_name or "",
+            spot_id,
+            vehicle or "",
+            start.isoformat() if start else "",
+            end.isoformat() if end else "",
+            row_status,
+            cost or 0
+        ]
+
+def iter_csv(rows, compress=False, chunk_bytes=EXPORT_CHUNK_BYTES, header=EXPORT_HEADER):
+    """Encode rows as CSV (header first) in chunks of about chunk_bytes, optionally as a gzip stream."""
+    gzip = zlib.compressobj(wbits=31) if compress else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def drain():
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return gzip.compress(data) if gzip else data
+
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= chunk_bytes:
+            chunk = drain()
+            if chunk:
+                yield chunk
+    chunk = drain() + (gzip.flush() if gzip else b"")
+    if chunk:
+        yield chunk
+
+# Export artifacts: finished files keyed by user, filter and a data watermark, reused until the data changes
+EXPORT_CACHE_DIR = os.path.join(EXPORT_DIR, "cache")
+EXPORT_CACHE_MAX_BYTES = int(os.getenv('EXPORT_CACHE_MAX_MB', 512)) * 1024 * 1024
+EXPORT_MAX_AGE = int(os.getenv('EXPORT_MAX_AGE_HOURS', 24 * 7)) * 3600
+
+def export_watermark(user_id, status=None):
+    """Changes whenever a user's export could: a new reservation, a release (end_time, cost) or a lot rename."""
+    q = db.session.query(func.count(Reservation.id), func.max(Reservation.id), func.max(Reservation.end_time)).filter(
+        Reservation.user_id == user_id)
+    if status:
+        q = q.filter(Reservation.status == status)
+    count, max_id, last_end = q.one()
+    lots = db.session.query(ParkingLot.id, ParkingLot.prime_location_name).order_by(ParkingLot.id).all()
+    lots_digest = hashlib.sha256(json.dumps([list(lot) for lot in lots]).encode()).hexdigest()[:16]
+    return f"{count}:{max_id}:{last_end.isoformat() if last_end else ''}:{lots_digest}"
+
+def export_artifact_path(user_id, status, compress, watermark):
+    key = hashlib.sha256(json.dumps([user_id, status, compress, watermark, EXPORT_HEADER]).encode()).hexdigest()[:32]
+    return os.path.join(EXPORT_CACHE_DIR, f"u{user_id}-{key}.csv" + (".gz" if compress else ""))
+
+def cached_export(path):
+    """True if the artifact exists; touching it keeps recently used files last in line for eviction."""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+def write_export_artifact(path, chunks):
+    """Pass chunks through while saving them; the artifact only appears (atomic rename) once complete."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+                yield chunk
+        os.replace(tmp, path)
+        prune_export_cache()
+    finally:
+        # a failed or abandoned download (client went away) leaves nothing behind
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def prune_export_cache(max_bytes=EXPORT_CACHE_MAX_BYTES, max_age=EXPORT_MAX_AGE):
+    """Drop artifacts older than max_age, then least recently used ones until the cache fits in max_bytes."""
+    try:
+        entries = [e for e in os.scandir(EXPORT_CACHE_DIR) if e.is_file()]
+    except FileNotFoundError:
+        return 0, 0
+    cutoff = time_module.time() - max_age
+    files, removed, freed = [], 0, 0
+    for entry in entries:
+        stat = entry.stat()
+        if stat.st_mtime < cutoff:
+            removed, freed = removed + 1, freed + stat.st_size
+            os.remove(entry.path)
+        elif not entry.name.endswith(".tmp"):
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total, removed, freed = total - size, removed + 1, freed + size
+    return removed, freed
+
+@app.cli.command('prune-exports')
+@click.option('--max-age-hours', type=int, default=EXPORT_MAX_AGE // 3600, show_default=True)
+@click.option('--max-mb', type=int, default=EXPORT_CACHE_MAX_BYTES // (1024 * 1024), show_default=True)
+def prune_exports_command(max_age_hours, max_mb):
+    """Evict cached export artifacts and drop loose files and bulk exports older than the age limit."""
+    max_age = max_age_hours * 3600
+    removed, freed = prune_export_cache(max_mb * 1024 * 1024, max_age)
+    cutoff = time_module.time() - max_age
+    # files written by older versions straight into the export directory
+    for entry in (os.scandir(EXPORT_DIR) if os.path.isdir(EXPORT_DIR) else ()):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            removed, freed = removed + 1, freed + entry.stat().st_size
+            os.remove(entry.path)
+    expired = 0
+    for job in ExportJob.query.filter(ExportJob.status.in_(['done', 'failed']),
+                                      ExportJob.created_at < datetime.fromtimestamp(cutoff, IST).replace(tzinfo=None)):
+        directory = bulk_export_dir(job.id)
+        if os.path.isdir(directory):
+            freed += sum(e.stat().st_size for e in os.scandir(directory) if e.is_file())
+            shutil.rmtree(directory)
+        job.status, expired = 'expired', expired + 1
+    db.session.commit()
+    click.echo(f"Removed {removed} export files and {expired} bulk exports, {freed / 1024 / 1024:.1f} MB freed.")
+
 @app.route('/api/export-csv', methods=['GET'])
 @jwt_required()
+@read_only
 def export_csv():
+    """Released reservations of a user as a CSV attachment (?gzip=1 for a .csv.gz), served from the artifact cache or streamed."""
     username = request.args.get("username")
     date_param = request.args.get("date")  # YYYY-MM-DD optional
+    compress = request.args.get("gzip", "").lower() in ("1", "true", "yes")
 
     if not username:
         return jsonify({"message": "username is required"}), 400
@@ -873,37 +3029,26 @@ def export_csv():
     download_date = date_param or datetime.now(IST).strftime("%Y-%m-%d")
     now = datetime.now(IST)
     hh_mm = now.strftime("%H-%M")
-    filename = f"{safe_name}-{download_date}-{hh_mm}.csv"
-
-    export_dir = os.path.join(BASE_DIR, "exports")
-    os.makedirs(export_dir, exist_ok=True)
-    filepath = os.path.join(export_dir, filename)
-
-    # Get only Released reservations
-    rows = Reservation.query.filter_by(
-        user_id=user.id, status="Released"
-    ).order_by(Reservation.start_time.asc()).all()
-
-    # write CSV
-    with open(filepath, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["Reservation ID", "Lot Name", "Spot ID", "Vehicle Number", "Start Time", "End Time", "Status", "Total Cost"])
-        for r in rows:
-            writer.writerow([
-                r.id,
-                r.lot.prime_location_name if r.lot else "",
-                r.spot_id,
-                r.vehicle_number or "",
-                r.start_time.isoformat() if r.start_time else "",
-                r.end_time.isoformat() if r.end_time else "",
-                r.status,
-                r.total_cost or 0
-            ])
-
-    return send_file(filepath, as_attachment=True, download_name=filename)
+    filename = f"{safe_name}-{download_date}-{hh_mm}.csv" + (".gz" if compress else "")
+
+    mimetype = "application/gzip" if compress else "text/csv"
+    path = export_artifact_path(user.id, "Released", compress, export_watermark(user.id, "Released"))
+    if cached_export(path):
+        response = send_file(path, mimetype=mimetype, as_attachment=True, download_name=filename)
+        response.headers["X-Export-Cache"] = "hit"
+        return response
+
+    # stream to the client and save the artifact for the next identical request at the same time
+    body = stream_with_context(write_export_artifact(path, iter_csv(export_rows(user.id, status="Released"), compress=compress)))
+    return Response(body, mimetype=mimetype, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Accel-Buffering": "no",
+        "X-Export-Cache": "miss"
+    })
 
 # Async CSV export: Celery task that creates CSV and emails to user
 @celery.task(name='tasks.generate_csv_and_email')
+@read_only
 def task_generate_csv_and_email(user_id):
     with app.app_context():
         user = db.session.get(User, user_id)
@@ -914,44 +3059,22 @@ def task_generate_csv_and_email(user_id):
         now = datetime.now(IST)
         filename = f"{safe_name}-{now.strftime('%Y-%m-%d')}-{now.strftime('%H-%M')}.csv"
 
-        export_dir = os.path.join(BASE_DIR, "exports")
-        os.makedirs(export_dir, exist_ok=True)
-        filepath = os.path.join(export_dir, filename)
-
-        rows = Reservation.query.filter_by(
-            user_id=user_id
-        ).order_by(Reservation.start_time.asc()).all()
-
-        with open(filepath, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(["Reservation ID", "Lot Name", "Spot ID", "Vehicle Number", "Start Time", "End Time", "Status", "Total Cost"])
-            for r in rows:
-                writer.writerow([
-                    r.id,
-                    r.lot.prime_location_name if r.lot else "",
-                    r.spot_id,
-                    r.vehicle_number or "",
-                    r.start_time.isoformat() if r.start_time else "",
-                    r.end_time.isoformat() if r.end_time else "",
-                    r.status,
-                    r.total_cost or 0
-                ])
-
-        # email attachment logic stays same…
-        try:
-            msg = Message(
-                subject="Your Parking History Export",
-                recipients=[user.username]
-            )
-            msg.html = f"<p>Hi {user.name or user.username},</p><p>Your parking history export is attached.</p>"
-            with open(filepath, "rb") as fh:
-                msg.attach(filename, "text/csv", fh.read())
-            mail.send(msg)
-        except Exception as e:
-            app.logger.exception("Failed to send CSV email: %s", e)
-            return {"error": str(e)}
+        filepath = export_artifact_path(user_id, None, False, export_watermark(user_id))
+        if not cached_export(filepath):
+            for _ in write_export_artifact(filepath, iter_csv(export_rows(user_id))):
+                pass
+
+        # the export was read in a plain transaction; only queueing the mail takes the write lock
+        db.session.commit()
+        # the outbox keeps its own copy, so pruning the export cache cannot break a pending delivery
+        with open(filepath, "rb") as fh, writing():
+            queue_mail([outbox_mail(
+                user.username, "Your Parking History Export",
+                f"<p>Hi {user.name or user.username},</p><p>Your parking history export is attached.</p>",
+                kind='csv_export', attachment=(filename, "text/csv", fh.read())
+            )])
 
-        return {"status": "done", "filepath": filepath}
+        return {"status": "queued", "filepath": filepath}
 
 @app.route('/api/user/export/<string:username>', methods=['POST'])
 def export_user_history(username):
@@ -963,173 +3086,853 @@ def export_user_history(username):
     return jsonify({"message": "Export started", "task_id": task.id}), 202
 
 # -----------------------
-# Celery tasks for daily reminders and monthly report
+# Admin bulk export (date range split into partitions, written in parallel, plus a manifest)
 # -----------------------
-@celery.task(name='tasks.send_daily_reminder')
-def send_daily_reminder(user_id=None):
-    with app.app_context():
-        today = datetime.now(IST).date()
+BULK_EXPORT_COLUMNS = ["id", "user_id", "username", "lot_id", "lot_name", "spot_id", "vehicle_number",
+                       "start_time", "end_time", "status", "total_cost"]
+BULK_EXPORT_FORMATS = ("csv.gz", "parquet")
+BULK_EXPORT_ID_CHUNK = int(os.getenv('BULK_EXPORT_ID_CHUNK', 100000))
+BULK_EXPORT_BATCH_SIZE = int(os.getenv('BULK_EXPORT_BATCH_SIZE', 5000))
+
+def parquet_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+def bulk_export_dir(job_id):
+    return os.path.join(EXPORT_DIR, "bulk", f"job-{job_id}")
+
+def _month_windows(start, end):
+    cursor = start
+    while cursor < end:
+        following = (cursor.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        yield cursor, min(following, end)
+        cursor = following
+
+def plan_export_partitions(start, end, partition_by, chunk_size=BULK_EXPORT_ID_CHUNK):
+    """Partition bounds for reservations starting in [start, end): one per calendar month or per id chunk."""
+    def id_bounds(lo, hi):
+        return db.session.query(func.min(Reservation.id), func.max(Reservation.id), func.count(Reservation.id)).filter(
+            Reservation.start_time >= lo, Reservation.start_time < hi).one()
+
+    plans = []
+    if partition_by == 'month':
+        for lo, hi in _month_windows(start, end):
+            id_lo, id_hi, count = id_bounds(lo, hi)
+            if count:
+                plans.append({'label': lo.strftime('%Y-%m'), 'id_lo': id_lo, 'id_hi': id_hi,
+                              'start_lo': lo, 'start_hi': hi, 'expected_rows': count})
+    else:
+        id_lo, id_hi, count = id_bounds(start, end)
+        for lo in range(id_lo, id_hi + 1, chunk_size) if count else ():
+            hi = min(lo + chunk_size - 1, id_hi)
+            expected = db.session.query(func.count(Reservation.id)).filter(
+                Reservation.id.between(lo, hi), Reservation.start_time >= start, Reservation.start_time < end).scalar()
+            if expected:
+                plans.append({'label': f'ids-{lo}-{hi}', 'id_lo': lo, 'id_hi': hi,
+                              'start_lo': start, 'start_hi': end, 'expected_rows': expected})
+    return plans
+
+def _partition_batches(part, batch_size=BULK_EXPORT_BATCH_SIZE):
+    """Keyset pages over the partition in id order; no cursor stays open between pages."""
+    q = db.session.query(
+        Reservation.id, Reservation.user_id, User.username, Reservation.lot_id, ParkingLot.prime_location_name,
+        Reservation.spot_id, Reservation.vehicle_number, Reservation.start_time, Reservation.end_time,
+        Reservation.status, Reservation.total_cost
+    ).outerjoin(User, User.id == Reservation.user_id).outerjoin(ParkingLot, ParkingLot.id == Reservation.lot_id).filter(
+        Reservation.id.between(part.id_lo, part.id_hi),
+        Reservation.start_time >= part.start_lo, Reservation.start_time < part.start_hi
+    )
+    last_id = part.id_lo - 1
+    while True:
+        batch = q.filter(Reservation.id > last_id).order_by(Reservation.id).limit(batch_size).all()
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1][0]
+
+def _file_entry(path, sha256=None):
+    if sha256 is None:
+        digest = hashlib.sha256()
+        with open(path, "rb") as fh:
+            for block in iter(lambda: fh.read(1024 * 1024), b""):
+                digest.update(block)
+        sha256 = digest.hexdigest()
+    return {"name": os.path.basename(path), "bytes": os.path.getsize(path), "sha256": sha256}
+
+@celery.task(name='tasks.bulk_export_partition')
+def task_bulk_export_partition(partition_id):
+    """Write one partition as gzip CSV (and Parquet when requested), recording progress as pages are written.
+
+    Pages are read in plain transactions; only the short progress writes take the write lock.
+    """
+    with writing():
+        part = db.session.get(ExportPartition, partition_id)
+        if not part:
+            return {"error": "partition not found"}
+        job_id, formats = part.job_id, part.job.formats.split(',')
+        part.status, part.started_at, part.rows = 'running', datetime.now(IST), 0
+        part.job.status = 'running'
+        db.session.commit()
 
-        # If testing specific user
-        if user_id:
-            user = User.query.get(user_id)
-            if not user:
-                # user not found → send to fallback email
-                msg = Message(
-                    subject="Daily Parking Reminder (Fallback)",
-                    recipients=[MAIL_RECIVER]
-                )
-                msg.html = f"""
-                <p>Requested user_id {user_id} not found.</p>
-                <p>Sending this reminder to fallback email instead.</p>
-                """
-                mail.send(msg)
-                return {"sent": 1, "fallback": True}
+    directory = bulk_export_dir(job_id)
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, f"part-{part.seq:04d}-{part.label}")
+    parquet = None
+    try:
+        if 'parquet' in formats:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            schema = pa.schema([
+                ("id", pa.int64()), ("user_id", pa.int64()), ("username", pa.string()), ("lot_id", pa.int64()),
+                ("lot_name", pa.string()), ("spot_id", pa.int64()), ("vehicle_number", pa.string()),
+                ("start_time", pa.timestamp("us")), ("end_time", pa.timestamp("us")), ("status", pa.string()),
+                ("total_cost", pa.float64())
+            ])
+            parquet = pq.ParquetWriter(stem + ".parquet", schema, compression="zstd")
+
+        def rows():
+            for batch in _partition_batches(part):
+                if parquet:
+                    parquet.write_table(pa.Table.from_pylist(
+                        [dict(zip(BULK_EXPORT_COLUMNS, row)) for row in batch], schema=schema))
+                for row in batch:
+                    yield [
+                        *row[:7],
+                        row[7].isoformat() if row[7] else "",
+                        row[8].isoformat() if row[8] else "",
+                        row[9],
+                        "" if row[10] is None else row[10]
+                    ]
+                db.session.commit()  # end the page's read transaction before writing progress
+                with writing():
+                    part.rows += len(batch)
+                    db.session.commit()  # progress for the status endpoint
+
+        digest = hashlib.sha256()
+        with open(stem + ".csv.gz", "wb") as fh:
+            for chunk in iter_csv(rows(), compress=True, header=BULK_EXPORT_COLUMNS):
+                fh.write(chunk)
+                digest.update(chunk)
+        files = [_file_entry(stem + ".csv.gz", digest.hexdigest())]
+        if parquet:
+            parquet.close()
+            parquet = None
+            files.append(_file_entry(stem + ".parquet"))
 
-            # Skip admin user in specific test
-            if user.role == "admin":
-                return {"sent": 0, "skipped": "admin"}
+        db.session.commit()
+        with writing():
+            part.files = json.dumps(files)
+            part.status, part.finished_at = 'done', datetime.now(IST)
+            db.session.commit()
+        return {"partition_id": partition_id, "rows": part.rows, "files": files}
+    except Exception as e:
+        db.session.rollback()
+        if parquet:
+            parquet.close()
+        with writing():
+            part = db.session.get(ExportPartition, partition_id)
+            part.status, part.error, part.finished_at = 'failed', str(e), datetime.now(IST)
+            part.job.status, part.job.error = 'failed', f"partition {part.seq} ({part.label}): {e}"
+            db.session.commit()
+        raise
+
+@celery.task(name='tasks.bulk_export_finalize')
+@write_transaction
+def task_bulk_export_finalize(results, job_id):
+    """Chord callback: write manifest.json (row counts and checksums per partition) and close the job."""
+    job = db.session.get(ExportJob, job_id)
+    if not job:
+        return {"error": "job not found"}
+    partitions = [{
+        "seq": p.seq,
+        "label": p.label,
+        "id_range": [p.id_lo, p.id_hi],
+        "start_range": [p.start_lo.isoformat(), p.start_hi.isoformat()],
+        "rows": p.rows,
+        "files": json.loads(p.files or "[]")
+    } for p in job.partitions]
+    job.status, job.finished_at = 'done', datetime.now(IST)
+    manifest = {
+        "job_id": job.id,
+        "range": [job.range_start.isoformat(), job.range_end.isoformat()],
+        "partition_by": job.partition_by,
+        "formats": job.formats.split(','),
+        "columns": BULK_EXPORT_COLUMNS,
+        "total_rows": sum(p["rows"] for p in partitions),
+        "partitions": partitions,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat()
+    }
+    directory = bulk_export_dir(job.id)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=2)
+    db.session.commit()
+    return {"job_id": job.id, "total_rows": manifest["total_rows"]}
+
+def export_job_payload(job):
+    parts = job.partitions
+    expected = sum(p.expected_rows for p in parts)
+    written = sum(p.rows for p in parts)
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "range": {"from": job.range_start.isoformat(), "to": job.range_end.isoformat()},
+        "partition_by": job.partition_by,
+        "formats": job.formats.split(','),
+        "requested_by": job.requested_by,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "error": job.error,
+        "progress": {"rows": written, "expected_rows": expected,
+                     "percent": round(100 * written / expected, 1) if expected else 100.0,
+                     "partitions_done": sum(p.status == 'done' for p in parts), "partitions": len(parts)},
+        "manifest": "manifest.json" if job.status == 'done' else None,
+        "partitions": [{
+            "seq": p.seq,
+            "label": p.label,
+            "status": p.status,
+            "rows": p.rows,
+            "expected_rows": p.expected_rows,
+            "files": json.loads(p.files) if p.files else [],
+            "error": p.error
+        } for p in parts]
+    }
 
-            users = [user]
+@app.route('/api/admin/exports', methods=['POST'])
+@role_required('admin')
+@write_transaction
+def admin_start_bulk_export():
+    """
+    Export all reservations starting in [from, to) as compressed CSV partitions written in parallel by Celery workers.
+    JSON body: from, to, partition_by ('month' default, or 'id' with chunk_size), formats (['csv.gz'], optionally 'parquet').
+    """
+    data = request.get_json() or {}
+    partition_by = data.get('partition_by', 'month')
+    formats = data.get('formats') or ['csv.gz']
+    chunk_size = data.get('chunk_size', BULK_EXPORT_ID_CHUNK)
+    if partition_by not in ('month', 'id'):
+        return jsonify({"message": "partition_by must be 'month' or 'id'"}), 400
+    if not isinstance(formats, list) or 'csv.gz' not in formats or any(f not in BULK_EXPORT_FORMATS for f in formats):
+        return jsonify({"message": f"formats must include 'csv.gz' and be among {', '.join(BULK_EXPORT_FORMATS)}"}), 400
+    if 'parquet' in formats and not parquet_available():
+        return jsonify({"message": "Parquet output needs pyarrow, which is not installed"}), 400
+    if not isinstance(chunk_size, int) or chunk_size < 1:
+        return jsonify({"message": "chunk_size must be a positive integer"}), 400
+    try:
+        start = _parse_when(data.get('from'), None)
+        end = _parse_when(data.get('to'), None)
+    except (ValueError, TypeError):
+        return jsonify({"message": "from/to must be YYYY-MM-DD or YYYY-MM-DDTHH:MM[:SS]"}), 400
+    if start is None or end is None or start >= end:
+        return jsonify({"message": "from and to are required and from must be before to"}), 400
+
+    job = ExportJob(requested_by=get_jwt_identity(), range_start=start, range_end=end,
+                    partition_by=partition_by, formats=','.join(formats))
+    db.session.add(job)
+    db.session.flush()
+    plans = plan_export_partitions(start, end, partition_by, chunk_size)
+    partitions = [ExportPartition(job_id=job.id, seq=seq, **plan) for seq, plan in enumerate(plans)]
+    db.session.add_all(partitions)
+    db.session.flush()
+    job_id, partition_ids = job.id, [p.id for p in partitions]
+    db.session.commit()
 
+    # queued with no transaction open, so workers never wait on this request for the write lock
+    try:
+        if partition_ids:
+            chord(group(task_bulk_export_partition.s(pid) for pid in partition_ids))(task_bulk_export_finalize.s(job_id))
         else:
-            users = User.query.all()
+            task_bulk_export_finalize.delay([], job_id)
+    except Exception as e:
+        job.status, job.error = 'failed', f"could not queue export: {e}"
+        db.session.commit()
+        return jsonify({"message": "Export queue unavailable", "job_id": job.id}), 503
+    db.session.refresh(job)
+    return jsonify(export_job_payload(job)), 202
 
-        sent = 0
+@app.route('/api/admin/exports/<int:job_id>', methods=['GET'])
+@role_required('admin')
+def admin_bulk_export_status(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if not job:
+        return jsonify({"message": "Export job not found"}), 404
+    return jsonify(export_job_payload(job)), 200
 
-        for user in users:
-            if not user:
-                continue
+@app.route('/api/admin/exports/<int:job_id>/files/<path:name>', methods=['GET'])
+@role_required('admin')
+def admin_bulk_export_file(job_id, name):
+    """Download manifest.json or a partition file of a finished export."""
+    if not db.session.get(ExportJob, job_id):
+        return jsonify({"message": "Export job not found"}), 404
+    return send_from_directory(bulk_export_dir(job_id), name, as_attachment=True)
 
-            # 🚫 Skip admins
-            if user.role == "admin":
-                continue
+# -----------------------
+# Incremental reservation feed (keyset on change_seq)
+# -----------------------
+CHANGES_PAGE_SIZE = 500
+CHANGES_MAX_PAGE_SIZE = 5000
 
-            latest = Reservation.query.filter_by(user_id=user.id) \
-                .order_by(Reservation.start_time.desc()).first()
+@app.route('/api/admin/reservations/changes', methods=['GET'])
+@role_required('admin')
+def admin_reservation_changes():
+    """
+    Reservations created or changed after ?since= (the next_cursor of the previous pull; omit it for a full sync).
+    Pages hold at most ?limit= rows in change order; keep pulling while has_more is true.
+    """
+    since = request.args.get('since')
+    if since:
+        since = _decode_cursor(since)
+        if isinstance(since, int):
+            since = [0, since]  # cursors handed out before change_xid existed
+        if not (isinstance(since, list) and len(since) == 2 and all(isinstance(v, int) for v in since)):
+            return jsonify({"message": "Invalid cursor"}), 400
+    else:
+        since = [0, 0]
+    limit = max(min(request.args.get('limit', CHANGES_PAGE_SIZE, type=int), CHANGES_MAX_PAGE_SIZE), 1)
+
+    q = db.session.query(Reservation, User.username, ParkingLot.prime_location_name).outerjoin(
+        User, User.id == Reservation.user_id).outerjoin(ParkingLot, ParkingLot.id == Reservation.lot_id)
+    if db.engine.dialect.name == 'postgresql':
+        q = q.filter(tuple_(Reservation.change_xid, Reservation.change_seq) > tuple_(*since),
+                     Reservation.change_xid < changes_horizon()).order_by(Reservation.change_xid, Reservation.change_seq)
+    else:
+        q = q.filter(Reservation.change_seq > since[1]).order_by(Reservation.change_seq)
+    rows = q.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
 
-            no_booking_today = (
-                latest is None
-                or latest.start_time is None
-                or latest.start_time.date() != today
-            )
+    return jsonify({
+        "changes": [{
+            "change_seq": r.change_seq,
+            "change": "released" if r.status == "Released" else "created",
+            "updated_at": r.updated_at.isoformat() if r.updated_at else None,
+            "reservation_id": r.id,
+            "user_id": r.user_id,
+            "username": username,
+            "lot_id": r.lot_id,
+            "lot_name": lot_name,
+            "spot_id": r.spot_id,
+            "vehicle_number": r.vehicle_number,
+            "status": r.status,
+            "start_time": r.start_time.isoformat() if r.start_time else None,
+            "end_time": r.end_time.isoformat() if r.end_time else None,
+            "total_cost": r.total_cost
+        } for r, username, lot_name in rows],
+        # an empty page hands back the same position, so the consumer can store next_cursor unconditionally
+        "next_cursor": _encode_cursor([rows[-1][0].change_xid, rows[-1][0].change_seq] if rows else since),
+        "has_more": has_more
+    }), 200
 
-            if no_booking_today:
-                try:
-                    # If email missing → fallback
-                    recipient = user.username if user.username else MAIL_RECIVER
+# -----------------------
+# Mail outbox and delivery worker
+# -----------------------
+# Producers only insert MailOutbox rows; a separate worker (flask deliver-mail, or the
+# tasks.deliver_mail task on the "mail" queue) owns the SMTP connections.
+MAIL_POOL_SIZE = int(os.getenv('MAIL_POOL_SIZE', 4))
+MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', 200))
+# messages per second on each pooled connection; 0 disables pacing
+MAIL_RATE_LIMIT = float(os.getenv('MAIL_RATE_LIMIT', 0))
+MAIL_MAX_ATTEMPTS = int(os.getenv('MAIL_MAX_ATTEMPTS', 5))
+MAIL_RETRY_BASE_SECONDS = 30
+MAIL_RETRY_MAX_SECONDS = 3600
+# a row left in 'sending' this long (worker died mid-batch) is claimed again
+MAIL_CLAIM_LEASE_SECONDS = 600
+
+def _ist_now():
+    return datetime.now(IST).replace(tzinfo=None)
+
+def outbox_mail(recipient, subject, html, kind='mail', attachment=None):
+    """Column values for one MailOutbox row; `attachment` is (filename, content_type, bytes)."""
+    values = {
+        "kind": kind,
+        "recipients": json.dumps([recipient or MAIL_RECIVER]),
+        "subject": subject,
+        "html": html,
+        "attachment_name": None,
+        "attachment_type": None,
+        "attachment": None,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": _ist_now(),
+        "created_at": _ist_now()
+    }
+    if attachment:
+        values["attachment_name"], values["attachment_type"], values["attachment"] = attachment
+    return values
+
+def queue_mail(mails):
+    """Insert outbox rows in one statement and commit; returns how many were queued."""
+    mails = list(mails)
+    if mails:
+        db.session.execute(insert(MailOutbox), mails)
+        db.session.commit()
+    return len(mails)
 
-                    html = f"""
-                    <p>Hi {user.name or user.username},</p>
-                    <p>This is a friendly reminder: we didn’t find a parking booking for you today.</p>
-                    <p>If you need parking, please visit the app and reserve a spot.</p>
-                    <p>Regards,<br/>Parking System</p>
-                    """
+def queue_mail_after_reads(mails):
+    """queue_mail() for a task that has finished reading.
 
-                    msg = Message(
-                        subject="Daily Parking Reminder",
-                        recipients=[recipient]
-                    )
-                    msg.html = html
-                    mail.send(msg)
+    Ends the read transaction first, so the SQLite write lock covers the insert only, not the
+    planning or aggregation query before it.
+    """
+    mails = list(mails)
+    db.session.commit()
+    with writing():
+        return queue_mail(mails)
+
+def claim_outbox_batch(limit):
+    """Atomically move up to `limit` due rows to 'sending' and return them, oldest first."""
+    now = _ist_now()
+    due = db.session.query(MailOutbox.id).filter(or_(
+        (MailOutbox.status == 'pending') & (MailOutbox.next_attempt_at <= now),
+        (MailOutbox.status == 'sending') & (MailOutbox.claimed_at < now - timedelta(seconds=MAIL_CLAIM_LEASE_SECONDS))
+    )).order_by(MailOutbox.id).limit(limit).with_for_update(skip_locked=True).scalar_subquery()
+    rows = db.session.execute(
+        update(MailOutbox).where(MailOutbox.id.in_(due))
+        .values(status='sending', claimed_at=now, attempts=MailOutbox.attempts + 1)
+        .returning(MailOutbox.id, MailOutbox.recipients, MailOutbox.subject, MailOutbox.html,
+                   MailOutbox.attachment_name, MailOutbox.attachment_type, MailOutbox.attachment,
+                   MailOutbox.attempts)
+    ).all()
+    db.session.commit()
+    return sorted(rows, key=lambda r: r.id)
+
+def _outbox_message(row):
+    msg = Message(subject=row.subject, recipients=json.loads(row.recipients))
+    msg.html = row.html
+    if row.attachment_name:
+        msg.attach(row.attachment_name, row.attachment_type, row.attachment)
+    return msg
+
+def _retry_delay(attempts):
+    return min(MAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1), MAIL_RETRY_MAX_SECONDS)
+
+class MailDeliveryWorker:
+    """Delivers the outbox over a small pool of persistent SMTP connections.
+
+    Each pool thread keeps its own Flask-Mail connection open across batches and reopens it
+    only after the server drops it. A refused recipient fails that row for good; other errors
+    are retried with exponential backoff until MAIL_MAX_ATTEMPTS.
+    """
+
+    def __init__(self, pool_size=MAIL_POOL_SIZE, batch_size=MAIL_BATCH_SIZE, rate_limit=MAIL_RATE_LIMIT):
+        self.pool_size = max(1, pool_size)
+        self.batch_size = batch_size
+        self.interval = 1.0 / rate_limit if rate_limit > 0 else 0
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(self.pool_size, thread_name_prefix='smtp')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = mail.connect()
+            conn.__enter__()
+            self._local.conn, self._local.next_at = conn, time_module.monotonic()
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            with self._lock:
+                self._connections.remove(conn)
+            try:
+                conn.__exit__(None, None, None)
+            except (smtplib.SMTPException, OSError):
+                pass
+
+    def _send_slice(self, rows):
+        """Send rows on this thread's connection; returns [(id, error or None, permanent)]."""
+        results = []
+        with app.app_context():
+            for row in rows:
+                if self.interval:
+                    delay = getattr(self._local, 'next_at', 0) - time_module.monotonic()
+                    if delay > 0:
+                        time_module.sleep(delay)
+                    self._local.next_at = max(getattr(self._local, 'next_at', 0), time_module.monotonic()) + self.interval
+                for retry in (False, True):
+                    try:
+                        self._connection().send(_outbox_message(row))
+                        results.append((row.id, None, False))
+                    except smtplib.SMTPRecipientsRefused as e:
+                        # 4xx refusals (greylisting, mailbox busy) are worth retrying, 5xx are not
+                        results.append((row.id, str(e), all(code >= 500 for code, _ in e.recipients.values())))
+                    except smtplib.SMTPResponseException as e:
+                        results.append((row.id, str(e), 500 <= e.smtp_code < 600))
+                    except (smtplib.SMTPException, OSError) as e:
+                        # stale pooled connection: reopen once and retry this message before counting a failure
+                        self._drop_connection()
+                        if not retry:
+                            continue
+                        results.append((row.id, str(e), False))
+                    except Exception as e:
+                        results.append((row.id, str(e), False))
+                    break
+        return results
+
+    def run_once(self):
+        """Claim one batch, send it across the pool and record each row's outcome."""
+        started = time_module.monotonic()
+        rows = claim_outbox_batch(self.batch_size)
+        if not rows:
+            return {"claimed": 0, "sent": 0, "retrying": 0, "failed": 0, "seconds": 0.0}
+        attempts = {r.id: r.attempts for r in rows}
+        slices = [rows[i::self.pool_size] for i in range(self.pool_size)]
+        results = [res for part in self._executor.map(self._send_slice, [s for s in slices if s]) for res in part]
+
+        now = _ist_now()
+        sent = [{"b_id": i, "b_error": None} for i, err, _ in results if err is None]
+        failed = [{"b_id": i, "b_error": err[:500]} for i, err, permanent in results
+                  if err is not None and (permanent or attempts[i] >= MAIL_MAX_ATTEMPTS)]
+        retrying = [{"b_id": i, "b_error": err[:500], "b_next": now + timedelta(seconds=_retry_delay(attempts[i]))}
+                    for i, err, permanent in results
+                    if err is not None and not permanent and attempts[i] < MAIL_MAX_ATTEMPTS]
+        table = MailOutbox.__table__
+        if sent:
+            db.session.execute(update(table).where(table.c.id == bindparam('b_id'))
+                               .values(status='sent', sent_at=now, last_error=bindparam('b_error')), sent)
+        if failed:
+            db.session.execute(update(table).where(table.c.id == bindparam('b_id'))
+                               .values(status='failed', last_error=bindparam('b_error')), failed)
+        if retrying:
+            db.session.execute(update(table).where(table.c.id == bindparam('b_id'))
+                               .values(status='pending', last_error=bindparam('b_error'),
+                                       next_attempt_at=bindparam('b_next')), retrying)
+        db.session.commit()
 
-                    sent += 1
-                except Exception:
-                    app.logger.exception("Failed to send daily reminder to %s", user.username)
+        seconds = time_module.monotonic() - started
+        summary = {"claimed": len(rows), "sent": len(sent), "retrying": len(retrying), "failed": len(failed),
+                   "seconds": round(seconds, 3), "per_second": round(len(sent) / seconds, 1) if seconds > 0 else None}
+        app.logger.info("Mail batch: %s", summary)
+        return summary
+
+    def drain(self, max_batches=None):
+        """Run batches until nothing is due (or max_batches); returns the combined counts."""
+        total = {"batches": 0, "claimed": 0, "sent": 0, "retrying": 0, "failed": 0}
+        started = time_module.monotonic()
+        while max_batches is None or total["batches"] < max_batches:
+            summary = self.run_once()
+            if not summary["claimed"]:
+                break
+            total["batches"] += 1
+            for key in ("claimed", "sent", "retrying", "failed"):
+                total[key] += summary[key]
+        total["seconds"] = round(time_module.monotonic() - started, 3)
+        total["per_second"] = round(total["sent"] / total["seconds"], 1) if total["seconds"] > 0 else None
+        return total
+
+    def close(self):
+        for conn in list(self._connections):
+            try:
+                conn.__exit__(None, None, None)
+            except (smtplib.SMTPException, OSError):
+                pass
+        self._connections.clear()
+        self._executor.shutdown(wait=True)
+
+_mail_worker = None
+
+@celery.task(name='tasks.deliver_mail')
+@write_transaction
+def deliver_mail(max_batches=50):
+    """Drain due outbox rows; the worker (and its SMTP pool) lives as long as the Celery process."""
+    global _mail_worker
+    with app.app_context():
+        if _mail_worker is None:
+            _mail_worker = MailDeliveryWorker()
+        return _mail_worker.drain(max_batches)
 
-        return {"sent": sent}
+def outbox_counts():
+    return dict(db.session.query(MailOutbox.status, func.count(MailOutbox.id)).group_by(MailOutbox.status).all())
 
-@celery.task(name='tasks.send_monthly_report')
-def send_monthly_report(user_id=None):
+def deliver_outbox_inline():
+    """Used by the --inline CLI paths: drain the outbox from this process and print the result."""
+    worker = MailDeliveryWorker()
+    try:
+        click.echo(json.dumps(worker.drain(), indent=2))
+    finally:
+        worker.close()
+
+@app.cli.command('deliver-mail')
+@click.option('--once', is_flag=True, help='Deliver what is due now and exit.')
+@click.option('--pool-size', type=int, default=MAIL_POOL_SIZE, show_default=True)
+@click.option('--batch-size', type=int, default=MAIL_BATCH_SIZE, show_default=True)
+@click.option('--idle-sleep', type=float, default=2.0, show_default=True)
+def deliver_mail_command(once, pool_size, batch_size, idle_sleep):
+    """Run the outbox delivery worker.
+
+    To try it against a local SMTP stand-in, run `python -m aiosmtpd -n -l localhost:8025` and set
+    MAIL_SERVER=localhost MAIL_PORT=8025 MAIL_USE_TLS=False.
+    """
+    worker = MailDeliveryWorker(pool_size, batch_size)
+    try:
+        while True:
+            total = worker.drain()
+            if total["claimed"]:
+                click.echo(json.dumps(total))
+            if once:
+                click.echo(json.dumps(outbox_counts()))
+                return
+            time_module.sleep(idle_sleep)
+    finally:
+        worker.close()
+
+@app.route('/api/admin/mail/outbox', methods=['GET'])
+@role_required('admin')
+def admin_mail_outbox():
+    """Outbox counts by status plus the most recent permanent failures."""
+    failures = MailOutbox.query.filter_by(status='failed').order_by(MailOutbox.id.desc()).limit(20).all()
+    return jsonify({
+        "counts": outbox_counts(),
+        "recent_failures": [{
+            "id": m.id,
+            "kind": m.kind,
+            "recipients": json.loads(m.recipients),
+            "attempts": m.attempts,
+            "error": m.last_error
+        } for m in failures]
+    }), 200
+
+# -----------------------
+# Celery tasks for daily reminders and monthly report
+# -----------------------
+REMINDER_CHUNK_SIZE = int(os.getenv('REMINDER_CHUNK_SIZE', 500))
+
+def users_without_booking(day, user_ids=None):
+    """(id, name, username) of non-admin users with no reservation starting on `day`, as one query."""
+    start = datetime.combine(day, time.min)
+    booked = db.session.query(Reservation.id).filter(
+        Reservation.user_id == User.id,
+        Reservation.start_time >= start,
+        Reservation.start_time < start + timedelta(days=1)
+    ).exists()
+    q = db.session.query(User.id, User.name, User.username).filter(User.role != 'admin', ~booked)
+    if user_ids is not None:
+        q = q.filter(User.id.in_(user_ids))
+    return q.order_by(User.id)
+
+def daily_reminder_mail(name, username):
+    # If email missing → fallback (outbox_mail)
+    return outbox_mail(username, "Daily Parking Reminder", f"""
+    <p>Hi {name or username},</p>
+    <p>This is a friendly reminder: we didn’t find a parking booking for you today.</p>
+    <p>If you need parking, please visit the app and reserve a spot.</p>
+    <p>Regards,<br/>Parking System</p>
+    """, kind='daily_reminder')
+
+@celery.task(name='tasks.send_daily_reminder_chunk')
+def send_daily_reminder_chunk(user_ids, day=None):
+    """Queue reminders for one chunk of users; users who booked since planning are skipped."""
     with app.app_context():
-        now = datetime.now(IST)
-        start_date = now - timedelta(days=30)
-        end_date = now
+        day = datetime.strptime(day, "%Y-%m-%d").date() if day else datetime.now(IST).date()
+        started = time_module.monotonic()
+        queued = queue_mail_after_reads(daily_reminder_mail(u.name, u.username)
+                                        for u in users_without_booking(day, user_ids))
+        return {
+            "first_user_id": user_ids[0] if user_ids else None,
+            "queued": queued,
+            "seconds": round(time_module.monotonic() - started, 3)
+        }
+
+def summarize_mail_chunks(results, seconds):
+    return {
+        "chunks": len(results),
+        "queued": sum(r["queued"] for r in results),
+        "seconds": round(seconds, 3)
+    }
+
+@celery.task(name='tasks.daily_reminder_report')
+def daily_reminder_report(results, started_at):
+    """Chord callback: log the run and start delivery right away instead of waiting for the beat."""
+    summary = summarize_mail_chunks(results, time_module.time() - started_at)
+    app.logger.info("Daily reminders: %d queued in %d chunks (%.1fs)",
+                    summary["queued"], summary["chunks"], summary["seconds"])
+    deliver_mail.delay()
+    return summary
+
+def plan_daily_reminders(day, chunk_size=REMINDER_CHUNK_SIZE):
+    ids = [row.id for row in users_without_booking(day)]
+    return [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+
+def queue_daily_reminders(day, chunks):
+    """Fan chunks out to workers; the chord callback logs the run and kicks the mail worker."""
+    if chunks:
+        chord(group(send_daily_reminder_chunk.s(ids, day.isoformat()) for ids in chunks))(
+            daily_reminder_report.s(time_module.time()))
+    return {"queued": sum(len(ids) for ids in chunks), "chunks": len(chunks)}
+
+@celery.task(name='tasks.send_daily_reminder')
+def send_daily_reminder(user_id=None):
+    with app.app_context():
+        today = datetime.now(IST).date()
 
         # If testing specific user
         if user_id:
             user = User.query.get(user_id)
             if not user:
-                msg = Message(
-                    subject="Parking Report (Fallback)",
-                    recipients=[MAIL_RECIVER]
-                )
-                msg.html = f"""
+                # user not found → send to fallback email
+                queue_mail_after_reads([outbox_mail(MAIL_RECIVER, "Daily Parking Reminder (Fallback)", f"""
                 <p>Requested user_id {user_id} not found.</p>
-                <p>Sending the monthly report to the fallback email instead.</p>
-                """
-                mail.send(msg)
-                return {"sent": 1, "fallback": True}
+                <p>Sending this reminder to fallback email instead.</p>
+                """, kind='daily_reminder')])
+                return {"queued": 1, "fallback": True}
 
-            # Skip admin during specific test
+            # Skip admin user in specific test
             if user.role == "admin":
-                return {"sent": 0, "skipped": "admin"}
-
-            users = [user]
-
-        else:
-            users = User.query.all()
+                return {"queued": 0, "skipped": "admin"}
+
+            return {"queued": send_daily_reminder_chunk([user.id], today.isoformat())["queued"]}
+
+        return queue_daily_reminders(today, plan_daily_reminders(today))
+
+@app.cli.command('send-daily-reminders')
+@click.option('--inline', is_flag=True, help='Queue and deliver from this process instead of using workers.')
+@click.option('--chunk-size', type=int, default=REMINDER_CHUNK_SIZE, show_default=True)
+def send_daily_reminders_command(inline, chunk_size):
+    """Send today's booking reminders (see deliver-mail for a local SMTP stand-in)."""
+    today = datetime.now(IST).date()
+    chunks = plan_daily_reminders(today, chunk_size)
+    if not inline:
+        queued = queue_daily_reminders(today, chunks)
+        click.echo(f"Queued {queued['queued']} reminders in {queued['chunks']} chunks.")
+        return
+    started = time_module.time()
+    results = [send_daily_reminder_chunk(ids, today.isoformat()) for ids in chunks]
+    click.echo(json.dumps(summarize_mail_chunks(results, time_module.time() - started), indent=2))
+    deliver_outbox_inline()
+
+MONTHLY_REPORT_CHUNK_SIZE = int(os.getenv('MONTHLY_REPORT_CHUNK_SIZE', 500))
+
+def monthly_report_rows(start, end, user_ids):
+    """(id, name, username, bookings, spent, most_used_lot) for the given non-admin users, as one query.
+
+    The most used lot is picked per user with ROW_NUMBER() over per-lot booking counts; ties go to
+    the alphabetically first lot name.
+    """
+    lot_name = func.coalesce(func.nullif(ParkingLot.prime_location_name, ''), 'Unknown')
+    in_window = (Reservation.start_time >= start, Reservation.start_time <= end,
+                 Reservation.user_id.in_(user_ids))
+    totals = db.session.query(
+        Reservation.user_id.label('user_id'),
+        func.count(Reservation.id).label('bookings'),
+        func.sum(Reservation.total_cost).label('spent')
+    ).filter(*in_window).group_by(Reservation.user_id).subquery()
+    per_lot = db.session.query(
+        Reservation.user_id.label('user_id'),
+        lot_name.label('lot_name'),
+        func.row_number().over(
+            partition_by=Reservation.user_id,
+            order_by=(func.count(Reservation.id).desc(), lot_name)
+        ).label('rank')
+    ).outerjoin(ParkingLot, ParkingLot.id == Reservation.lot_id) \
+        .filter(*in_window).group_by(Reservation.user_id, lot_name).subquery()
+    return db.session.query(
+        User.id, User.name, User.username,
+        func.coalesce(totals.c.bookings, 0),
+        func.coalesce(totals.c.spent, 0),
+        func.coalesce(per_lot.c.lot_name, 'None')
+    ).outerjoin(totals, totals.c.user_id == User.id) \
+        .outerjoin(per_lot, (per_lot.c.user_id == User.id) & (per_lot.c.rank == 1)) \
+        .filter(User.id.in_(user_ids), User.role != 'admin') \
+        .order_by(User.id).all()
+
+def monthly_report_mail(name, username, start, end, bookings, spent, most_used):
+    return outbox_mail(username, "Your Parking Report (Last 30 Days)", f"""
+    <h3>Parking Report (Last 30 Days)</h3>
+    <p>Hi {name or username},</p>
+    <p>Period: {start.strftime('%d %b %Y')} to {end.strftime('%d %b %Y')}</p>
+    <table border="0" cellpadding="6" cellspacing="0">
+      <tr><td><b>Total bookings</b></td><td>{bookings}</td></tr>
+      <tr><td><b>Most used parking lot</b></td><td>{most_used}</td></tr>
+      <tr><td><b>Total amount spent</b></td><td>₹{spent}</td></tr>
+    </table>
+    <p>Thanks for using the Parking System!</p>
+    """, kind='monthly_report')
+
+@celery.task(name='tasks.send_monthly_report_chunk')
+@read_only
+def send_monthly_report_chunk(user_ids, start, end):
+    """Aggregate one chunk of monthly reports and queue them in the outbox."""
+    with app.app_context():
+        started = time_module.monotonic()
+        start, end = datetime.fromisoformat(start), datetime.fromisoformat(end)
+        queued = queue_mail_after_reads(
+            monthly_report_mail(name, username, start, end, bookings, spent, most_used)
+            for _, name, username, bookings, spent, most_used in monthly_report_rows(start, end, user_ids)
+        )
+        return {
+            "first_user_id": user_ids[0] if user_ids else None,
+            "queued": queued,
+            "seconds": round(time_module.monotonic() - started, 3)
+        }
+
+@celery.task(name='tasks.monthly_report_summary')
+def monthly_report_summary(results, started_at):
+    summary = summarize_mail_chunks(results, time_module.time() - started_at)
+    app.logger.info("Monthly reports: %d queued in %d chunks (%.1fs)",
+                    summary["queued"], summary["chunks"], summary["seconds"])
+    deliver_mail.delay()
+    return summary
+
+def plan_monthly_reports(chunk_size=MONTHLY_REPORT_CHUNK_SIZE):
+    ids = [user_id for (user_id,) in db.session.query(User.id).filter(User.role != 'admin').order_by(User.id)]
+    return [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+
+def monthly_report_window():
+    end = datetime.now(IST).replace(tzinfo=None)
+    return end - timedelta(days=30), end
+
+def queue_monthly_reports(chunks, start, end):
+    """Fan chunks out to workers; the chord callback logs the run and kicks the mail worker."""
+    if chunks:
+        chord(group(send_monthly_report_chunk.s(ids, start.isoformat(), end.isoformat()) for ids in chunks))(
+            monthly_report_summary.s(time_module.time()))
+    return {"queued": sum(len(ids) for ids in chunks), "chunks": len(chunks)}
 
-        sent = 0
+@celery.task(name='tasks.send_monthly_report')
+@read_only
+def send_monthly_report(user_id=None):
+    with app.app_context():
+        start_date, end_date = monthly_report_window()
 
-        for user in users:
+        # If testing specific user
+        if user_id:
+            user = User.query.get(user_id)
             if not user:
-                continue
+                queue_mail_after_reads([outbox_mail(MAIL_RECIVER, "Parking Report (Fallback)", f"""
+                <p>Requested user_id {user_id} not found.</p>
+                <p>Sending the monthly report to the fallback email instead.</p>
+                """, kind='monthly_report')])
+                return {"queued": 1, "fallback": True}
 
-            # 🚫 Skip admin users
+            # Skip admin during specific test
             if user.role == "admin":
-                continue
-
-            try:
-                reservations = Reservation.query.filter(
-                    Reservation.user_id == user.id,
-                    Reservation.start_time >= start_date,
-                    Reservation.start_time <= end_date
-                ).all()
-
-                total_spent = sum(r.total_cost or 0 for r in reservations)
-                total_bookings = len(reservations)
-
-                lot_count = {}
-                for r in reservations:
-                    name = (
-                        r.lot.prime_location_name
-                        if r.lot and r.lot.prime_location_name
-                        else "Unknown"
-                    )
-                    lot_count[name] = lot_count.get(name, 0) + 1
-
-                most_used = max(lot_count, key=lot_count.get) if lot_count else "None"
-
-                recipient = user.username if user.username else MAIL_RECIVER
-
-                html = f"""
-                <h3>Parking Report (Last 30 Days)</h3>
-                <p>Hi {user.name or user.username},</p>
-                <p>Period: {start_date.strftime('%d %b %Y')} to {end_date.strftime('%d %b %Y')}</p>
-                <table border="0" cellpadding="6" cellspacing="0">
-                  <tr><td><b>Total bookings</b></td><td>{total_bookings}</td></tr>
-                  <tr><td><b>Most used parking lot</b></td><td>{most_used}</td></tr>
-                  <tr><td><b>Total amount spent</b></td><td>₹{total_spent}</td></tr>
-                </table>
-                <p>Thanks for using the Parking System!</p>
-                """
-
-                msg = Message(
-                    subject="Your Parking Report (Last 30 Days)",
-                    recipients=[recipient]
-                )
-                msg.html = html
-                mail.send(msg)
-
-                sent += 1
-
-            except Exception:
-                app.logger.exception(
-                    "Failed to send monthly report to %s", user.username
-                )
-
-        return {"sent": sent}
+                return {"queued": 0, "skipped": "admin"}
+
+            result = send_monthly_report_chunk([user.id], start_date.isoformat(), end_date.isoformat())
+            return {"queued": result["queued"]}
+
+        return queue_monthly_reports(plan_monthly_reports(), start_date, end_date)
+
+@app.cli.command('send-monthly-reports')
+@click.option('--inline', is_flag=True, help='Queue and deliver from this process instead of using workers.')
+@click.option('--chunk-size', type=int, default=MONTHLY_REPORT_CHUNK_SIZE, show_default=True)
+def send_monthly_reports_command(inline, chunk_size):
+    """Send the last-30-days report to every user (see deliver-mail for a local SMTP stand-in)."""
+    start, end = monthly_report_window()
+    chunks = plan_monthly_reports(chunk_size)
+    if not inline:
+        queued = queue_monthly_reports(chunks, start, end)
+        click.echo(f"Queued {queued['queued']} reports in {queued['chunks']} chunks.")
+        return
+    started = time_module.time()
+    results = [send_monthly_report_chunk(ids, start.isoformat(), end.isoformat()) for ids in chunks]
+    click.echo(json.dumps(summarize_mail_chunks(results, time_module.time() - started), indent=2))
+    deliver_outbox_inline()
 
 # -----------------------
 # Dummy Payment Portal
@@ -1170,10 +3973,148 @@ def confirm_payment():
         "amount": reservation.total_cost
     })
 
+# -----------------------
+# Query plan checks
+# -----------------------
+# Tables that grow with usage: a full scan of one of these on the request path is a regression.
+PLAN_CHECK_TABLES = {'reservation', 'parking_spot', 'user', 'mail_outbox', 'user_weekly_stats',
+                     'lot_hourly_rollup', 'lot_daily_rollup'}
+# (probe, table) pairs that read the whole table by design
+PLAN_CHECK_ALLOWED_SCANS = {
+    ('GET /api/admin/users', 'user'),  # lists every user
+    ('GET /api/admin/summary', 'lot_daily_rollup'),  # all-time duration histogram: lots x days rows, not sessions
+    ('GET /api/admin/mail/outbox', 'mail_outbox'),  # counts by status read the status index only
+}
+# ...and those that do only where there is no FTS index (PostgreSQL), as search falls back to substring ILIKE
+PLAN_CHECK_ALLOWED_SCANS_WITHOUT_FTS = {('GET /api/admin/search', 'user'), ('GET /api/admin/search', 'reservation')}
+
+def _plan_probes(user, lot_id):
+    """(name, callable) pairs covering the hot read paths.
+
+    Endpoints go through the test client; cached or side-effecting paths (lot lists, CSV export)
+    call the query-building code directly so the check never writes.
+    """
+    client = app.test_client()
+    admin = {'Authorization': 'Bearer ' + create_access_token(identity='plan-check', additional_claims={'role': 'admin'})}
+    own = {'Authorization': 'Bearer ' + create_access_token(identity=user.username, additional_claims={'role': user.role})}
+    today = datetime.now(IST).date()
+    start, end = monthly_report_window()
+
+    def get(path, headers=None):
+        return lambda: client.get(path, headers=headers)
+
+    return [
+        ("GET /api/user/reservations/<username>", get(f"/api/user/reservations/{user.username}")),
+        ("GET /api/user/details/<username>", get(f"/api/user/details/{user.username}")),
+        ("GET /api/user/summary", get("/api/user/summary", own)),
+        ("GET /api/user/history", get("/api/user/history", own)),
+        ("GET /api/admin/search", get(f"/api/admin/search?q={(user.name or user.username)[:3]}", admin)),
+        ("GET /api/admin/vehicles/lookup", get("/api/admin/vehicles/lookup?q=TN", admin)),
+        ("GET /api/admin/vehicles/lookup (fragment)", get("/api/admin/vehicles/lookup?q=AB12", admin)),
+        ("GET /api/admin/summary", get("/api/admin/summary", admin)),
+        ("GET /api/admin/summary/hourly", get(f"/api/admin/summary/hourly?lot_id={lot_id}", admin)),
+        ("GET /api/admin/reservations/changes", get("/api/admin/reservations/changes", admin)),
+        ("GET /api/admin/mail/outbox", get("/api/admin/mail/outbox", admin)),
+        ("GET /api/admin/users", get("/api/admin/users", admin)),
+        ("admin lot list", lambda: admin_parking_lots_snapshot(None, '', 1, 20)),
+        ("admin lot detail", lambda: admin_parking_lots_snapshot(lot_id, 'R', None, 20)),
+        ("user lot list", user_parking_lots_snapshot),
+        ("free spot pool reload", lambda: free_spot_pool.reload_lot(lot_id)),
+        ("CSV export", lambda: (export_watermark(user.id), next(iter(export_rows(user.id, status="Released")), None))),
+        ("daily reminder chunk", lambda: users_without_booking(today, [user.id]).all()),
+        ("monthly report chunk", lambda: monthly_report_rows(start, end, [user.id])),
+    ]
+
+def _full_scans(statement, params):
+    """Tables in PLAN_CHECK_TABLES that the plan reads in full (partial-index scans excepted)."""
+    # replay the driver-level statement and parameters exactly as captured
+    cursor = db.session.connection().connection.cursor()
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            cursor.execute("EXPLAIN " + statement, params)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+            return {t for t in re.findall(r'Seq Scan on "?(\w+)"?', plan) if t in PLAN_CHECK_TABLES}
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, params or ())
+        details = [row[-1] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+    partial = {index.name for table in db.metadata.sorted_tables for index in table.indexes
+               if index.dialect_options['sqlite'].get('where') is not None}
+    scans = set()
+    for detail in details:
+        match = re.match(r'SCAN (\w+?)(?:_\d+)?(?: USING (?:COVERING )?INDEX (\w+))?$', detail)
+        if match and match.group(1) in PLAN_CHECK_TABLES and match.group(2) not in partial:
+            scans.add(match.group(1))
+    return scans
+
+def check_query_plans(user, lot_id):
+    """Run every probe, EXPLAIN each SELECT it issued and return [(probe, table, sql)] full scans."""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            captured.append((statement, parameters))
+
+    allowed = PLAN_CHECK_ALLOWED_SCANS if search_index_enabled() else \
+        PLAN_CHECK_ALLOWED_SCANS | PLAN_CHECK_ALLOWED_SCANS_WITHOUT_FTS
+    problems = []
+    for name, probe in _plan_probes(user, lot_id):
+        captured.clear()
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            probe()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+        for statement, params in list(captured):
+            for table in sorted(_full_scans(statement, params)):
+                if (name, table) not in allowed:
+                    problems.append((name, table, " ".join(statement.split())))
+    return problems
+
+@app.cli.command('check-query-plans')
+@click.option('--username', help='User whose pages are probed (default: the user with the most reservations).')
+def check_query_plans_command(username):
+    """EXPLAIN the queries behind the hot endpoints and fail on full scans of large tables.
+
+    Meant for a database with production-like volume (e.g. a restored copy), after `flask init-db`;
+    check_query_plans.py runs the same probes against a seeded scratch database for CI.
+    """
+    if username:
+        user = User.query.filter_by(username=username).first()
+    else:
+        top = db.session.query(Reservation.user_id).group_by(Reservation.user_id) \
+            .order_by(func.count(Reservation.id).desc()).limit(1).scalar()
+        user = db.session.get(User, top) if top else User.query.filter(User.role != 'admin').first()
+    lot_id = db.session.query(func.min(ParkingLot.id)).scalar()
+    if user is None or lot_id is None:
+        raise click.ClickException("Need at least one user and one parking lot to probe.")
+
+    problems = check_query_plans(user, lot_id)
+    for name, table, statement in problems:
+        click.echo(f"FULL SCAN of {table} in {name}:\n    {statement[:300]}")
+    if problems:
+        raise click.ClickException(f"{len(problems)} query plan(s) scan a large table.")
+    click.echo(f"OK: no full scans of {', '.join(sorted(PLAN_CHECK_TABLES))}.")
+
+# -----------------------
+# Startup
+# -----------------------
+# Importing the module (gunicorn workers, Celery processes) only checks the schema version; run
+# `flask init-db` to migrate. AUTO_INIT_DB=True migrates here instead, under schema_upgrade_lock().
+with app.app_context():
+    if os.getenv('AUTO_INIT_DB', 'False') == 'True':
+        bootstrap_database()
+    elif current_schema_version() < SCHEMA_VERSION:
+        app.logger.warning("Database schema is behind (version %d of %d); run `flask init-db`.",
+                           current_schema_version(), SCHEMA_VERSION)
+    db.session.remove()
+
 # -----------------------
 # Run
 # -----------------------
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        # the single-process dev server can migrate itself
+        bootstrap_database()
+        free_spot_pool.rebuild()
     app.run(debug=os.getenv('FLASK_DEBUG', 'True') == 'True', host='0.0.0.0', port=int(os.getenv('PORT', 5000)))
@@ -0,0 +1,209 @@
+# ------------------------------
+# bench_admin_reads.py — statements, latency and memory of the admin lot list and summary
+# ------------------------------
+"""
+Seeds a scratch SQLite database per scenario and requests each endpoint once from a fresh process,
+counting the SQL statements it issued, its wall time and how far it raised peak RSS.
+
+    lots     50 lots x 200 spots, half of them reserved  ->  GET /api/admin/parking-lots (+ ?lot_id=, ?page=)
+    summary  1M released reservations over a year        ->  GET /api/admin/summary
+    listing  the 'lots' data, hammered for --seconds     ->  GET /api/user/parking-lots, requests per second
+
+    cd backend
+    python bench_admin_reads.py                          # this tree
+    python bench_admin_reads.py --baseline 8a087f0^      # ... and the same probes on an older revision
+    python bench_admin_reads.py --scenarios listing --baseline 130beb0^   # per-request schema bootstrap
+
+--baseline exports backend/ at that revision with `git archive` and runs the identical seed and probes
+against it, so before/after numbers come from one machine. Revisions that predate a query parameter
+simply ignore it. The payload digest is taken over the summary fields every revision returns, so equal
+digests mean equal results.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+PROBES = {
+    "lots": ["/api/admin/parking-lots", "/api/admin/parking-lots?lot_id={lot_id}",
+             "/api/admin/parking-lots?page=1&per_page=10"],
+    "summary": ["/api/admin/summary"],
+    "listing": ["/api/user/parking-lots"],
+}
+# scenarios timed as a steady stream of requests rather than a single cold one
+THROUGHPUT = {"listing"}
+SUMMARY_FIELDS = ("occupancy", "revenue_per_lot", "daily_revenue", "duration_distribution")
+
+
+def seed(scenario, now, lots, spots, reservations, users):
+    """Plain table inserts on the columns every revision has, then whatever derived state it keeps."""
+    import app as target
+
+    db = target.db
+    rnd = random.Random(7)
+    with target.app.app_context():
+        if hasattr(target, "bootstrap_database"):
+            target.bootstrap_database()
+        else:
+            db.create_all()
+        db.session.execute(target.User.__table__.insert(), [
+            {"username": f"bench{i}@x.com", "password_hash": "x", "name": f"Bench {i}", "role": "user"}
+            for i in range(users)
+        ])
+        db.session.execute(target.ParkingLot.__table__.insert(), [
+            {"prime_location_name": f"Bench Lot {i}", "price": 20.0 + i % 5, "address": "-", "pin_code": "000000",
+             "number_of_spots": spots, "is_deleted": False}
+            for i in range(lots)
+        ])
+        lot_ids = [lot_id for (lot_id,) in db.session.query(target.ParkingLot.id)]
+        db.session.execute(target.ParkingSpot.__table__.insert(), [
+            {"lot_id": lot_id, "status": "R" if scenario != "summary" and n % 2 else "A"}
+            for lot_id in lot_ids for n in range(spots)
+        ])
+
+        rows = []
+        if scenario != "summary":
+            for i, (spot_id, lot_id) in enumerate(db.session.query(target.ParkingSpot.id, target.ParkingSpot.lot_id)
+                                                  .filter(target.ParkingSpot.status == "R")):
+                rows.append({"user_id": i % users + 1, "lot_id": lot_id, "spot_id": spot_id, "status": "Reserved",
+                             "start_time": now - timedelta(hours=rnd.uniform(0, 12)), "vehicle_number": "TN01AB1234"})
+        else:
+            spot_ids = {}
+            for spot_id, lot_id in db.session.query(target.ParkingSpot.id, target.ParkingSpot.lot_id):
+                spot_ids.setdefault(lot_id, []).append(spot_id)
+            for _ in range(reservations):
+                lot_id = rnd.choice(lot_ids)
+                hours = rnd.choice((rnd.uniform(0.1, 1), rnd.uniform(1, 12)))
+                end = now - timedelta(days=rnd.uniform(0, 365))
+                rows.append({"user_id": rnd.randrange(users) + 1, "lot_id": lot_id,
+                             "spot_id": rnd.choice(spot_ids[lot_id]), "status": "Released",
+                             "start_time": end - timedelta(hours=hours), "end_time": end,
+                             "total_cost": round(hours * 20.0, 2), "vehicle_number": "TN01AB1234"})
+        for i in range(0, len(rows), 20000):
+            db.session.execute(target.Reservation.__table__.insert(), rows[i:i + 20000])
+        db.session.commit()
+
+        for name in ("recompute_lot_counters", "backfill_rollups", "backfill_user_stats"):
+            if hasattr(target, name):
+                getattr(target, name)()
+        db.session.commit()
+        print(json.dumps({"lot_id": lot_ids[0]}))
+
+
+def measure(path, seconds):
+    import app as target
+    from sqlalchemy import event
+    from flask_jwt_extended import create_access_token
+
+    with target.app.app_context():
+        token = create_access_token(identity="bench", additional_claims={"role": "admin"})
+        statements = []
+        event.listen(target.db.engine, "before_cursor_execute", lambda *args: statements.append(1))
+    client = target.app.test_client()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    r = client.get(path, headers={"Authorization": "Bearer " + token})
+    elapsed = time.perf_counter() - started
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    body = r.get_json(silent=True)
+    if isinstance(body, dict) and "occupancy" in body:
+        # compare values, not float noise from summing in a different order
+        common = json.loads(json.dumps({k: body.get(k) for k in SUMMARY_FIELDS}),
+                            parse_float=lambda v: round(float(v), 2))
+        digest = hashlib.sha1(json.dumps(common, sort_keys=True).encode()).hexdigest()[:12]
+    else:
+        digest = "-"
+    result = {"status": r.status_code, "statements": len(statements), "ms": elapsed * 1000,
+              "rss_mib": (rss_peak - rss_before) / 1024, "digest": digest}
+    if seconds:
+        # the first request above warmed the caches; now count what every following request costs
+        del statements[:]
+        done, started = 0, time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            assert client.get(path).status_code == r.status_code
+            done += 1
+        elapsed = time.perf_counter() - started
+        result.update(req_s=done / elapsed, statements_per_req=len(statements) / done)
+    print(json.dumps(result))
+
+
+def export_revision(rev, into):
+    here = os.path.dirname(os.path.abspath(__file__))
+    archive = subprocess.run(["git", "archive", rev, "backend"], cwd=os.path.dirname(here),
+                             capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(into)
+    return os.path.join(into, "backend")
+
+
+def run_side(label, app_dir, args, now, tmp):
+    me = [sys.executable, os.path.abspath(__file__), "--app-dir", app_dir]
+    results = []
+    for scenario in args.scenarios:
+        db_path = os.path.join(tmp, f"{label}-{scenario}.db")
+        env = dict(os.environ, DATABASE_URL="sqlite:///" + db_path, DATABASE_REPLICA_URL="",
+                   CACHE_TYPE="SimpleCache", EXPORT_DIR=os.path.join(tmp, "exports"))
+        seeded = subprocess.run(me + ["--seed", scenario, "--now", now, "--lots", str(args.lots),
+                                      "--spots", str(args.spots), "--reservations", str(args.reservations),
+                                      "--users", str(args.users)],
+                                env=env, cwd=app_dir, capture_output=True, text=True, check=True)
+        lot_id = json.loads(seeded.stdout.strip().splitlines()[-1])["lot_id"]
+        for probe in PROBES[scenario]:
+            path = probe.format(lot_id=lot_id)
+            seconds = args.seconds if scenario in THROUGHPUT else 0
+            measured = subprocess.run(me + ["--measure", path, "--seconds", str(seconds)], env=env, cwd=app_dir,
+                                      capture_output=True, text=True, check=True)
+            results.append((path, json.loads(measured.stdout.strip().splitlines()[-1])))
+    return results
+
+
+def report(label, results):
+    print(label)
+    for path, m in results:
+        print(f"  {path:<45} {m['status']}  {m['statements']:>6} statements  {m['ms']:>9.1f} ms  "
+              f"+{m['rss_mib']:.0f} MiB peak RSS  {m['digest']}")
+        if "req_s" in m:
+            print(f"  {'':<45}      {m['statements_per_req']:>6.1f} statements/request  {m['req_s']:>7.0f} req/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", help="Git revision to measure as well, e.g. 8a087f0^ or 8d2586c^.")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(PROBES), default=["lots", "summary"])
+    parser.add_argument("--lots", type=int, default=50)
+    parser.add_argument("--spots", type=int, default=200)
+    parser.add_argument("--reservations", type=int, default=1_000_000, help="Released reservations for 'summary'.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=5.0, help="How long to hammer each 'listing' probe.")
+    parser.add_argument("--app-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--seed", choices=sorted(PROBES), help=argparse.SUPPRESS)
+    parser.add_argument("--now", help=argparse.SUPPRESS)
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.seed or args.measure:
+        sys.path.insert(0, args.app_dir)
+        if args.seed:
+            seed(args.seed, datetime.fromisoformat(args.now), args.lots, args.spots, args.reservations, args.users)
+        else:
+            measure(args.measure, args.seconds)
+        sys.exit(0)
+
+    # one clock for every side, so both seed the same days
+    now = datetime.now().replace(microsecond=0).isoformat()
+    with tempfile.TemporaryDirectory() as tmp:
+        sides = [("this tree", os.path.dirname(os.path.abspath(__file__)))]
+        if args.baseline:
+            sides.insert(0, (args.baseline, export_revision(args.baseline, os.path.join(tmp, "baseline"))))
+        for label, app_dir in sides:
+            report(label, run_side(label.replace("^", "_").replace(" ", "_"), app_dir, args, now, tmp))
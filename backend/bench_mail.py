@@ -0,0 +1,108 @@
+# ------------------------------
+# bench_mail.py — outbox delivery throughput against a local SMTP sink, per pool size
+# ------------------------------
+"""
+Starts a throwaway SMTP server on localhost that accepts and discards every message (the same role
+as `python -m aiosmtpd -n`, without the dependency), queues --messages outbox rows in a scratch
+SQLite database and drains them with MailDeliveryWorker at each --pool-sizes value.
+
+    cd backend
+    python bench_mail.py --messages 2000 --pool-sizes 1 4 8 --latency-ms 20
+
+--latency-ms delays every reply to DATA, standing in for a relay that takes time to accept a
+message; with 0 the sink answers at once and the numbers mostly measure this process. Each run
+must leave every row 'sent' and the sink must have received exactly that many messages.
+"""
+import argparse
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: greet, accept any envelope, swallow DATA, count messages."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line[:4].upper()
+            if verb == b"EHLO":
+                self.reply("250-sink")
+                self.reply("250 8BITMIME")
+            elif verb == b"DATA":
+                self.reply("354 end with <CRLF>.<CRLF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                time.sleep(self.server.latency)
+                with self.server.lock:
+                    self.server.received += 1
+                self.reply("250 queued")
+            elif verb == b"QUIT":
+                self.reply("221 bye")
+                return
+            else:  # HELO, MAIL, RCPT, RSET, NOOP
+                self.reply("250 ok")
+
+
+class SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency):
+        super().__init__(("127.0.0.1", 0), SinkHandler)
+        self.latency, self.received, self.lock = latency, 0, threading.Lock()
+
+
+def run(args, sink):
+    from app import app, db, bootstrap_database, queue_mail, outbox_mail, outbox_counts, MailDeliveryWorker, MailOutbox
+
+    html = "<p>" + "Your parking report. " * 100 + "</p>"  # about 2 KiB, like the monthly report
+    print(f"{args.messages} messages, {args.latency_ms:g} ms per message at the sink")
+    with app.app_context():
+        bootstrap_database()
+        for pool_size in args.pool_sizes:
+            db.session.query(MailOutbox).delete()
+            db.session.commit()
+            queue_mail(outbox_mail(f"user{i}@x.com", f"Report {i}", html) for i in range(args.messages))
+            received = sink.received
+
+            worker = MailDeliveryWorker(pool_size=pool_size, batch_size=args.batch_size)
+            try:
+                total = worker.drain()
+            finally:
+                worker.close()
+            counts, delivered = outbox_counts(), sink.received - received
+            assert counts == {"sent": args.messages} and delivered == args.messages, (counts, delivered)
+            print(f"  pool {pool_size:>3}  {total['seconds']:>7.2f} s  {total['per_second']:>8.1f} messages/s  "
+                  f"{total['batches']} batches")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    sink = SinkServer(args.latency_ms / 1000)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "DATABASE_URL": "sqlite:///" + os.path.join(tmp, "mail.db"), "DATABASE_REPLICA_URL": "",
+            "MAIL_SERVER": "127.0.0.1", "MAIL_PORT": str(sink.server_address[1]), "MAIL_USE_TLS": "False",
+            "MAIL_USERNAME": "", "MAIL_PASSWORD": "", "MAIL_DEFAULT_SENDER": "bench@x.com",
+        })
+        os.environ.setdefault("CACHE_TYPE", "SimpleCache")
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        run(args, sink)
+    sink.shutdown()
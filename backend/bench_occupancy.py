@@ -0,0 +1,103 @@
+# ------------------------------
+# bench_occupancy.py — occupancy_series() over millions of intervals, and the interval cache feeding it
+# ------------------------------
+"""
+Two timings for the admin occupancy analytics:
+
+    series    --intervals synthetic reservations over a year, as the sorted start/end arrays
+              ReservationIntervals.snapshot() hands over, then occupancy_series() per step
+    snapshot  --db-rows released reservations in a scratch SQLite database, then the cold load
+              and a warm refresh of reservation_intervals.snapshot()
+
+    cd backend
+    python bench_occupancy.py --intervals 5000000 --db-rows 500000
+
+Each series is checked against its own totals before it is reported: a step's time-weighted
+averages must add up to the parked seconds that fall inside the window.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+YEAR = 365 * 86400
+
+
+def timed(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - started)
+    return statistics.median(runs), result
+
+
+def bench_series(args):
+    import numpy as np
+    from app import occupancy_series, OCCUPANCY_STEPS
+
+    rng = np.random.default_rng(7)
+    started = time.perf_counter()
+    start = rng.integers(0, YEAR, args.intervals)
+    # mostly short stays with a long tail, like the checkout data
+    end = start + np.minimum(rng.exponential(3 * 3600, args.intervals).astype(np.int64) + 60, 7 * 86400)
+    starts, ends = np.sort(start), np.sort(end)
+    print(f"{args.intervals:,} intervals generated and sorted in {time.perf_counter() - started:.2f}s")
+
+    parked = np.clip(end, 0, YEAR) - np.clip(start, 0, YEAR)
+    for name, step in OCCUPANCY_STEPS.items():
+        seconds, (grid, at_start, average, peak) = timed(
+            lambda: occupancy_series(starts, ends, 0, YEAR, step), args.repeat)
+        assert np.isclose((average * step).sum(), parked.sum(), rtol=1e-9)
+        assert (peak >= at_start).all()
+        print(f"  step={name:<6} {grid.size:>7,} points  {seconds * 1000:>9.1f} ms  peak {int(peak.max())}")
+
+
+def bench_snapshot(args):
+    import numpy as np
+    from app import app, db, insert, bootstrap_database, to_epoch, Reservation, reservation_intervals
+
+    rnd = np.random.default_rng(11)
+    now = datetime.now().replace(microsecond=0)
+    with app.app_context():
+        bootstrap_database()
+        started = time.perf_counter()
+        for offset in range(0, args.db_rows, 50000):
+            count = min(50000, args.db_rows - offset)
+            ago = rnd.uniform(0, 365, count)
+            hours = rnd.uniform(0.1, 12, count)
+            db.session.execute(insert(Reservation), [
+                {"user_id": 1, "lot_id": 1 + i % 50, "spot_id": 1, "status": "Released",
+                 "start_time": now - timedelta(days=d, hours=h), "end_time": now - timedelta(days=d),
+                 "total_cost": round(h * 20, 2), "vehicle_number": "TN01AB1234"}
+                for i, (d, h) in enumerate(zip(ago.tolist(), hours.tolist()))
+            ])
+        db.session.commit()
+        print(f"{args.db_rows:,} reservations seeded in {time.perf_counter() - started:.1f}s")
+
+        moment = to_epoch(now)
+        reservation_intervals.clear()
+        cold, (starts, _) = timed(lambda: reservation_intervals.snapshot(None, moment), 1)
+        warm, _ = timed(lambda: reservation_intervals.snapshot(None, moment), args.repeat)
+        assert starts.size == args.db_rows
+        print(f"  snapshot cold {cold * 1000:>9.1f} ms  warm {warm * 1000:>7.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--intervals", type=int, default=3_000_000)
+    parser.add_argument("--db-rows", type=int, default=200_000, help="0 skips the snapshot timing.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per timing; the median is reported.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmp, "occupancy.db")
+        os.environ["DATABASE_REPLICA_URL"] = ""
+        os.environ.setdefault("CACHE_TYPE", "SimpleCache")
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        bench_series(args)
+        if args.db_rows:
+            bench_snapshot(args)
@@ -0,0 +1,59 @@
+# ------------------------------
+# bench_pricing.py — a year of sessions repriced by the scalar tariff and by the NumPy batch path
+# ------------------------------
+"""
+Generates a year of released sessions across a set of lots, then prices every one of them twice:
+once with compute_total_cost() in a Python loop, the way checkout bills a single reservation, and
+once with compute_total_costs(), the way /api/admin/pricing/simulate reprices history. The two
+must agree to the rupee before the timings are printed.
+
+    cd backend
+    python bench_pricing.py --sessions 2000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+
+def run(args):
+    import numpy as np
+    from app import compute_total_cost, compute_total_costs
+
+    rng = np.random.default_rng(3)
+    short = rng.exponential(2.5, args.sessions)
+    long = rng.uniform(24, 24 * 14, args.sessions)
+    hours = np.where(rng.random(args.sessions) < args.long_share, long, short)
+    prices = rng.choice(np.round(rng.uniform(10, 120, args.lots), 2), args.sessions)
+    print(f"{args.sessions:,} sessions over {args.lots} lots, {args.long_share:.0%} of them past 24 h")
+
+    started = time.perf_counter()
+    scalar = [compute_total_cost(h, p) for h, p in zip(hours.tolist(), prices.tolist())]
+    scalar_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = compute_total_costs(hours, prices)
+    batch_s = time.perf_counter() - started
+
+    mismatched = int((batch != np.array(scalar, dtype=np.float64)).sum())
+    print(f"  scalar loop {scalar_s * 1000:>9.1f} ms")
+    print(f"  batch       {batch_s * 1000:>9.1f} ms  ({scalar_s / batch_s:.0f}x)")
+    print(f"  revenue {batch.sum():,.0f}  mismatched sessions {mismatched}")
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=2_000_000)
+    parser.add_argument("--lots", type=int, default=50)
+    parser.add_argument("--long-share", type=float, default=0.05, help="Fraction of stays longer than a day.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmp, "pricing.db")
+        os.environ["DATABASE_REPLICA_URL"] = ""
+        os.environ.setdefault("CACHE_TYPE", "SimpleCache")
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        code = run(args)
+    sys.exit(code)
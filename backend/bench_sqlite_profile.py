@@ -0,0 +1,146 @@
+# ------------------------------
+# bench_sqlite_profile.py — mixed read/write load against both SQLite profiles
+# ------------------------------
+"""
+Runs the same workload against a scratch database under SQLITE_PROFILE=stock and SQLITE_PROFILE=wal.
+Several processes with several threads each stand in for Flask threads plus Celery workers.
+Writers allocate and release spots; readers hit the user reservation list and the admin summary.
+
+    cd backend
+    python bench_sqlite_profile.py --processes 3 --threads 4 --seconds 15
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+def seed(lots, spots, users):
+    from app import app, db, insert, User, ParkingLot, ParkingSpot, recompute_lot_counters, bootstrap_database
+
+    with app.app_context():
+        bootstrap_database()
+        db.session.execute(insert(User), [
+            {"username": f"bench{i}@x.com", "password_hash": "x", "name": f"Bench {i}", "role": "user"}
+            for i in range(users)
+        ])
+        db.session.execute(insert(ParkingLot), [
+            {"prime_location_name": f"Bench Lot {i}", "price": 20.0, "address": "-", "pin_code": "000000",
+             "number_of_spots": spots}
+            for i in range(lots)
+        ])
+        lot_ids = [lot_id for (lot_id,) in db.session.query(ParkingLot.id)]
+        db.session.execute(insert(ParkingSpot), [{"lot_id": lot_id, "status": "A"} for lot_id in lot_ids for _ in range(spots)])
+        recompute_lot_counters()
+        db.session.commit()
+        print(json.dumps({"lot_ids": lot_ids}))
+
+
+def worker(threads, seconds, write_share, users, lot_ids):
+    from app import app
+
+    app.testing = True  # let errors surface as exceptions instead of HTML 500 pages
+    deadline = time.monotonic() + seconds
+    lock = threading.Lock()
+    stats = {"reads": 0, "writes": 0, "locked": 0, "other_errors": 0, "read_ms": [], "write_ms": []}
+
+    def run():
+        client = app.test_client()
+        rnd = random.Random()
+        while time.monotonic() < deadline:
+            user = f"bench{rnd.randrange(users)}@x.com"
+            write = rnd.random() < write_share
+            started = time.perf_counter()
+            error = None
+            try:
+                if write:
+                    r = client.post("/api/user/allocate",
+                                    json={"user": user, "lot_id": rnd.choice(lot_ids), "vehicle_no": "TN01AB1234"})
+                    if r.status_code == 200:
+                        r = client.post(f"/api/user/reservations/terminate/{r.get_json()['reservation_id']}")
+                    if r.status_code >= 500:
+                        error = r.get_json().get("message", "")
+                else:
+                    r = client.get(rnd.choice([f"/api/user/reservations/{user}", "/api/admin/summary"]))
+                    if r.status_code >= 500:
+                        error = r.get_data(as_text=True)
+            except Exception as e:
+                error = str(e)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                if error is None:
+                    stats["writes" if write else "reads"] += 1
+                    stats["write_ms" if write else "read_ms"].append(elapsed)
+                elif "locked" in error.lower() or "busy" in error.lower():
+                    stats["locked"] += 1
+                else:
+                    stats["other_errors"] += 1
+
+    pool = [threading.Thread(target=run) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    print(json.dumps(stats))
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return round(values[min(int(len(values) * pct / 100), len(values) - 1)], 1) if values else None
+
+
+def compare(args):
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in args.profiles.split(","):
+            env = dict(os.environ, DATABASE_URL="sqlite:///" + os.path.join(tmp, f"{profile}.db"),
+                       SQLITE_PROFILE=profile, CACHE_TYPE="SimpleCache")
+            me = [sys.executable, os.path.abspath(__file__)]
+            seeded = subprocess.run(me + ["--seed", "--lots", str(args.lots), "--spots", str(args.spots),
+                                          "--users", str(args.users)],
+                                    env=env, cwd=here, capture_output=True, text=True, check=True)
+            lot_ids = json.loads(seeded.stdout.strip().splitlines()[-1])["lot_ids"]
+            procs = [subprocess.Popen(me + ["--worker", "--threads", str(args.threads), "--seconds", str(args.seconds),
+                                            "--write-share", str(args.write_share), "--users", str(args.users),
+                                            "--lot-ids", ",".join(map(str, lot_ids))],
+                                      env=env, cwd=here, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+                     for _ in range(args.processes)]
+            results = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in procs]
+
+            total = {key: sum(r[key] for r in results) for key in ("reads", "writes", "locked", "other_errors")}
+            read_ms = [v for r in results for v in r["read_ms"]]
+            write_ms = [v for r in results for v in r["write_ms"]]
+            attempts = sum(total.values())
+            print(f"{profile:>5}: {total['reads'] / args.seconds:7.1f} reads/s  {total['writes'] / args.seconds:6.1f} writes/s  "
+                  f"locked {total['locked']} ({100.0 * total['locked'] / max(attempts, 1):.1f}%)  "
+                  f"other errors {total['other_errors']}  "
+                  f"p50/p99 ms read {_percentile(read_ms, 50)}/{_percentile(read_ms, 99)} "
+                  f"write {_percentile(write_ms, 50)}/{_percentile(write_ms, 99)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default="stock,wal")
+    parser.add_argument("--processes", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--write-share", type=float, default=0.3)
+    parser.add_argument("--lots", type=int, default=20)
+    parser.add_argument("--spots", type=int, default=100)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--seed", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--lot-ids", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.lots, args.spots, args.users)
+    elif args.worker:
+        worker(args.threads, args.seconds, args.write_share, args.users, [int(i) for i in args.lot_ids.split(",")])
+    else:
+        compare(args)
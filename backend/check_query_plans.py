@@ -0,0 +1,122 @@
+# ------------------------------
+# check_query_plans.py — the check-query-plans gate against a seeded scratch database
+# ------------------------------
+"""
+Builds the schema in a temporary SQLite file, fills it with enough users, lots, reservations and
+outbox rows for the planner to prefer indexes where they exist, then runs the same probes as
+`flask check-query-plans` and exits with status 1 if any hot query scans a large table.
+
+    cd backend
+    python check_query_plans.py
+
+Needs no existing data, so CI can run it after every change. Pass --database-url to check the
+PostgreSQL plans against an empty scratch database instead; its tables are dropped first.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+
+def seed(users, lots, spots, reservations):
+    from app import (db, insert, User, ParkingLot, ParkingSpot, Reservation, MailOutbox, normalize_plate,
+                     recompute_lot_counters, backfill_rollups, backfill_user_stats, search_index_enabled,
+                     rebuild_search_index)
+
+    rnd = random.Random(42)
+    now = datetime.now().replace(microsecond=0)
+    db.session.execute(insert(User), [
+        {"username": f"plan{i}@x.com", "password_hash": "x", "name": f"Plan User {i}", "address": "-",
+         "pin_code": f"600{i % 1000:03d}", "role": "user"}
+        for i in range(users)
+    ])
+    db.session.execute(insert(ParkingLot), [
+        {"prime_location_name": f"Plan Lot {i}", "price": 20.0 + i, "address": "-", "pin_code": "000000",
+         "number_of_spots": spots}
+        for i in range(lots)
+    ])
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).filter(User.role == 'user')]
+    lot_ids = [lot_id for (lot_id,) in db.session.query(ParkingLot.id)]
+    db.session.execute(insert(ParkingSpot), [{"lot_id": lot_id, "status": "A"} for lot_id in lot_ids for _ in range(spots)])
+    spots_by_lot = {}
+    for spot_id, lot_id in db.session.query(ParkingSpot.id, ParkingSpot.lot_id):
+        spots_by_lot.setdefault(lot_id, []).append(spot_id)
+
+    rows, held = [], set()
+    for _ in range(reservations):
+        lot_id = rnd.choice(lot_ids)
+        spot_id = rnd.choice(spots_by_lot[lot_id])
+        start = now - timedelta(days=rnd.uniform(0, 90))
+        plate = f"TN{rnd.randrange(100):02d}AB{rnd.randrange(10000):04d}"
+        row = {"user_id": rnd.choice(user_ids), "lot_id": lot_id, "spot_id": spot_id, "start_time": start,
+               "vehicle_number": plate, "vehicle_plate": normalize_plate(plate),
+               "vehicle_plate_rev": normalize_plate(plate)[::-1]}
+        if spot_id not in held and rnd.random() < 0.02:
+            held.add(spot_id)
+            row.update(status="Reserved", end_time=None, total_cost=None)
+        else:
+            hours = rnd.uniform(0.5, 8)
+            row.update(status="Released", end_time=min(start + timedelta(hours=hours), now),
+                       total_cost=round(hours * (20.0 + lot_ids.index(lot_id)), 2))
+        rows.append(row)
+    for i in range(0, len(rows), 5000):
+        db.session.execute(insert(Reservation), rows[i:i + 5000])
+    db.session.query(ParkingSpot).filter(ParkingSpot.id.in_(held)).update({"status": "R"}, synchronize_session=False)
+    db.session.execute(insert(MailOutbox), [
+        {"recipients": f'["plan{i}@x.com"]', "subject": "Plan check", "status": "sent" if i % 10 else "pending",
+         "next_attempt_at": now, "created_at": now}
+        for i in range(users)
+    ])
+    recompute_lot_counters()
+    db.session.commit()
+
+    backfill_rollups()
+    backfill_user_stats()
+    if search_index_enabled():
+        rebuild_search_index()
+    db.session.execute(db.text("ANALYZE"))
+    db.session.commit()
+
+
+def run(args):
+    from app import app, db, func, Reservation, User, upgrade_schema, check_query_plans, PLAN_CHECK_TABLES
+
+    with app.app_context():
+        db.drop_all()
+        upgrade_schema()
+        seed(args.users, args.lots, args.spots, args.reservations)
+        top = db.session.query(Reservation.user_id).group_by(Reservation.user_id) \
+            .order_by(func.count(Reservation.id).desc()).limit(1).scalar()
+        lot_id = db.session.query(func.min(Reservation.lot_id)).scalar()
+        problems = check_query_plans(db.session.get(User, top), lot_id)
+        dialect = db.engine.dialect.name
+
+    print(f"{args.users} users, {args.lots} lots x {args.spots} spots, {args.reservations} reservations on {dialect}")
+    for name, table, statement in problems:
+        print(f"FULL SCAN of {table} in {name}:\n    {statement[:300]}")
+    if problems:
+        print(f"FAILED: {len(problems)} query plan(s) scan a large table.")
+        return 1
+    print(f"OK: no full scans of {', '.join(sorted(PLAN_CHECK_TABLES))}.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--lots", type=int, default=300)
+    parser.add_argument("--spots", type=int, default=20)
+    parser.add_argument("--reservations", type=int, default=30000)
+    parser.add_argument("--database-url", help="Scratch database to use instead of a temporary SQLite file.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = args.database_url or "sqlite:///" + os.path.join(tmp, "plans.db")
+        os.environ["DATABASE_REPLICA_URL"] = ""
+        os.environ["AUTO_INIT_DB"] = "False"
+        os.environ.setdefault("CACHE_TYPE", "SimpleCache")
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        code = run(args)
+    sys.exit(code)
@@ -0,0 +1,16 @@
+# ------------------------------
+# gunicorn.conf.py — production server settings (gunicorn -c gunicorn.conf.py app:app)
+# ------------------------------
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('WEB_WORKERS', 2))
+
+# Threaded workers: each open /api/user/parking-lots/stream holds a thread until the client leaves,
+# and app.py stops accepting streams at SSE_MAX_STREAMS per worker, so the extra request threads
+# always stay free for ordinary API calls.
+worker_class = 'gthread'
+threads = int(os.getenv('SSE_MAX_STREAMS', 50)) + int(os.getenv('WEB_REQUEST_THREADS', 16))
+
+# streams send a keepalive every SSE_KEEPALIVE_SEC, well inside this
+keepalive = 75
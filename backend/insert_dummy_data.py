@@ -1,4 +1,7 @@
-from backend.app import app, db, User, ParkingLot, ParkingSpot, Reservation
+from backend.app import (
+    app, db, User, ParkingLot, ParkingSpot, Reservation, compute_total_cost,
+    recompute_lot_counters, backfill_rollups, backfill_user_stats, upgrade_schema
+)
 from datetime import datetime, timedelta
 import pytz
 import random
@@ -11,7 +14,7 @@ def insert_dummy_data():
     print("Resetting database...")
 
     db.drop_all()
-    db.create_all()
+    upgrade_schema()
 
     # ---------------- USERS (10 USERS) ----------------
     print("Creating Users...")
@@ -169,13 +172,7 @@ def insert_dummy_data():
         # Calculate cost
         if not is_active:
             total_hours = (end_time - start_time).total_seconds() / 3600
-            if total_hours > 24:
-                days = int(total_hours // 24)
-                remaining = total_hours % 24
-                daily_rate = 18 * float(lot.price)
-                total_cost = round(days * daily_rate + remaining * float(lot.price))
-            else:
-                total_cost = round(max(total_hours, 0.25) * float(lot.price))
+            total_cost = compute_total_cost(total_hours, lot.price)
         else:
             total_cost = None
 
@@ -201,6 +198,12 @@ def insert_dummy_data():
     db.session.commit()
     print("✔ 100 Dummy Reservations Added Correctly With No Overlaps")
 
+    # reservations were written directly, so rebuild the counters and stats derived from them
+    recompute_lot_counters()
+    db.session.commit()
+    backfill_rollups()
+    backfill_user_stats()
+
     print("🎉 Dummy Data Inserted Successfully!")
 
 # ------------------- MAIN -------------------
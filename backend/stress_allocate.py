@@ -0,0 +1,162 @@
+# ------------------------------
+# stress_allocate.py — concurrent /api/user/allocate against one scratch database
+# ------------------------------
+"""
+Several processes with several threads each allocate and release spots as fast as they can, then
+checks that no spot is held by two active reservations and that the spot statuses and lot counters
+agree with the reservations. Separate processes matter: each keeps its own free-spot pool, so
+only they exercise the database-side guard in claim_spot().
+
+    cd backend
+    python stress_allocate.py --processes 3 --threads 8 --seconds 15
+
+Exits with status 1 if a spot was double-allocated or the counters drifted. Pass --database-url to
+run against a scratch PostgreSQL database instead of a temporary SQLite file.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+def seed(lots, spots, users):
+    from app import app, db, insert, User, ParkingLot, ParkingSpot, recompute_lot_counters, bootstrap_database
+
+    with app.app_context():
+        bootstrap_database()
+        db.session.execute(insert(User), [
+            {"username": f"stress{i}@x.com", "password_hash": "x", "name": f"Stress {i}", "role": "user"}
+            for i in range(users)
+        ])
+        db.session.execute(insert(ParkingLot), [
+            {"prime_location_name": f"Stress Lot {i}", "price": 20.0, "address": "-", "pin_code": "000000",
+             "number_of_spots": spots}
+            for i in range(lots)
+        ])
+        lot_ids = [lot_id for (lot_id,) in db.session.query(ParkingLot.id)]
+        db.session.execute(insert(ParkingSpot), [{"lot_id": lot_id, "status": "A"} for lot_id in lot_ids for _ in range(spots)])
+        recompute_lot_counters()
+        db.session.commit()
+        print(json.dumps({"lot_ids": lot_ids}))
+
+
+def worker(threads, seconds, release_share, users, lot_ids):
+    from app import app
+
+    app.testing = True
+    deadline = time.monotonic() + seconds
+    lock = threading.Lock()
+    stats = {"allocated": 0, "released": 0, "full": 0, "errors": {}}
+
+    def run():
+        client = app.test_client()
+        rnd = random.Random()
+        held = []
+        while time.monotonic() < deadline:
+            if held and rnd.random() < release_share:
+                r = client.post(f"/api/user/reservations/terminate/{held.pop(rnd.randrange(len(held)))}")
+                outcome = "released" if r.status_code == 200 else None
+            else:
+                r = client.post("/api/user/allocate", json={"user": f"stress{rnd.randrange(users)}@x.com",
+                                                            "lot_id": rnd.choice(lot_ids), "vehicle_no": "TN01AB1234"})
+                if r.status_code == 200:
+                    held.append(r.get_json()["reservation_id"])
+                    outcome = "allocated"
+                else:
+                    outcome = "full" if r.status_code == 400 else None
+            with lock:
+                if outcome:
+                    stats[outcome] += 1
+                else:
+                    message = (r.get_json() or {}).get("message", str(r.status_code))[:80]
+                    stats["errors"][message] = stats["errors"].get(message, 0) + 1
+
+    pool = [threading.Thread(target=run) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    print(json.dumps(stats))
+
+
+def check():
+    from app import app, db, func, Reservation, ParkingSpot, ParkingLot, active_reservation
+
+    with app.app_context():
+        duplicates = db.session.query(Reservation.spot_id, func.count(Reservation.id)).filter(
+            active_reservation()).group_by(Reservation.spot_id).having(func.count(Reservation.id) > 1).all()
+        print(json.dumps({
+            "duplicate_spots": [[spot_id, n] for spot_id, n in duplicates],
+            "active_reservations": db.session.query(func.count(Reservation.id)).filter(active_reservation()).scalar(),
+            "reserved_spots": db.session.query(func.count(ParkingSpot.id)).filter(ParkingSpot.status == 'R').scalar(),
+            "lot_counters": db.session.query(func.coalesce(func.sum(ParkingLot.reserved_spots), 0)).scalar()
+        }))
+
+
+def run(args):
+    here = os.path.dirname(os.path.abspath(__file__))
+    me = [sys.executable, os.path.abspath(__file__)]
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=args.database_url or "sqlite:///" + os.path.join(tmp, "stress.db"),
+                   CACHE_TYPE="SimpleCache")
+        seeded = subprocess.run(me + ["--seed", "--lots", str(args.lots), "--spots", str(args.spots),
+                                      "--users", str(args.users)],
+                                env=env, cwd=here, capture_output=True, text=True, check=True)
+        lot_ids = json.loads(seeded.stdout.strip().splitlines()[-1])["lot_ids"]
+        procs = [subprocess.Popen(me + ["--worker", "--threads", str(args.threads), "--seconds", str(args.seconds),
+                                        "--release-share", str(args.release_share), "--users", str(args.users),
+                                        "--lot-ids", ",".join(map(str, lot_ids))],
+                                  env=env, cwd=here, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+                 for _ in range(args.processes)]
+        results = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in procs]
+        checked = subprocess.run(me + ["--check"], env=env, cwd=here, capture_output=True, text=True, check=True)
+        state = json.loads(checked.stdout.strip().splitlines()[-1])
+
+    total = {key: sum(r[key] for r in results) for key in ("allocated", "released", "full")}
+    errors = {}
+    for r in results:
+        for message, n in r["errors"].items():
+            errors[message] = errors.get(message, 0) + n
+    print(f"{args.processes} processes x {args.threads} threads, {args.lots} lots x {args.spots} spots, {args.seconds:g}s")
+    print(f"  {total['allocated'] / args.seconds:.1f} allocations/s  {total['released'] / args.seconds:.1f} releases/s  "
+          f"lot full {total['full']}  errors {errors or 0}")
+    print(f"  active reservations {state['active_reservations']}  spots marked R {state['reserved_spots']}  "
+          f"lot counters {state['lot_counters']}  double-allocated spots {len(state['duplicate_spots'])}")
+
+    ok = not state["duplicate_spots"] and \
+        state["active_reservations"] == state["reserved_spots"] == state["lot_counters"]
+    print("OK" if ok else f"FAILED: {state['duplicate_spots'][:10]}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--release-share", type=float, default=0.3,
+                        help="Chance that a thread releases one of its reservations instead of allocating.")
+    parser.add_argument("--lots", type=int, default=3)
+    parser.add_argument("--spots", type=int, default=50,
+                        help="Spots per lot; keep it small so lots fill up and threads fight over the last spots.")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--database-url", help="Scratch database to use instead of a temporary SQLite file.")
+    parser.add_argument("--seed", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--check", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--lot-ids", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.lots, args.spots, args.users)
+    elif args.worker:
+        worker(args.threads, args.seconds, args.release_share, args.users, [int(i) for i in args.lot_ids.split(",")])
+    elif args.check:
+        check()
+    else:
+        sys.exit(run(args))
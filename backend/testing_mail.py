@@ -6,6 +6,7 @@ from app import (
     send_daily_reminder,
     send_monthly_report,
     task_generate_csv_and_email,
+    MailDeliveryWorker,
     app
 )
 from app import db, User
@@ -113,6 +114,16 @@ def test_export_csv_for_user(email):
         print("CSV export result:", result)
 
 
+def deliver_queued_mail():
+    # the tasks above only fill the mail outbox; send it the way the delivery worker would
+    with app.app_context():
+        worker = MailDeliveryWorker()
+        try:
+            print("Delivery result:", worker.drain())
+        finally:
+            worker.close()
+
+
 # ---------------------------------------
 # MAIN ENTRY POINT
 # ---------------------------------------
@@ -137,4 +148,7 @@ if __name__ == "__main__":
     #test_monthly_report_all() 
     #print("\n5️⃣ CSV Export (ALL users)") 
     #test_export_csv_all()
+
+    print("\n📬 Delivering queued mail")
+    deliver_queued_mail()
     print("\n------ DONE ------\n")
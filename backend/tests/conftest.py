@@ -0,0 +1,88 @@
+# ------------------------------
+# conftest.py — one scratch WAL SQLite database for the suite, reset before every test
+# ------------------------------
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.py reads its configuration at import time, so point it at the scratch database first
+_scratch = tempfile.mkdtemp(prefix="parking-tests-")
+os.environ.update({
+    "DATABASE_URL": "sqlite:///" + os.path.join(_scratch, "test.db"),
+    "DATABASE_REPLICA_URL": "",
+    "SQLITE_PROFILE": "wal",
+    "AUTO_INIT_DB": "False",
+    "CACHE_TYPE": "SimpleCache",
+    "EXPORT_DIR": os.path.join(_scratch, "exports"),
+    "ADMIN_USERNAME": "admin@test.com",
+    "ADMIN_PASSWORD": "admin-pw",
+    "JWT_SECRET_KEY": "test-only-jwt-secret-key-of-32-bytes",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as parking  # noqa: E402
+
+parking.app.testing = True
+parking.celery.conf.task_always_eager = True
+
+
+@pytest.fixture(autouse=True)
+def fresh_db():
+    """Empty schema at the current version, the admin user and a cold pool and cache."""
+    with parking.app.app_context():
+        parking.db.drop_all()
+        parking.upgrade_schema()
+        parking.ensure_admin()
+        parking.free_spot_pool.rebuild()
+        parking.cache.clear()
+    yield
+
+
+@pytest.fixture
+def client():
+    return parking.app.test_client()
+
+
+@pytest.fixture
+def admin_headers():
+    with parking.app.app_context():
+        token = parking.create_access_token(identity="admin@test.com", additional_claims={"role": "admin"})
+    return {"Authorization": "Bearer " + token}
+
+
+@pytest.fixture
+def make_users():
+    def make(count, prefix="user"):
+        with parking.app.app_context():
+            parking.db.session.execute(parking.insert(parking.User), [
+                {"username": f"{prefix}{i}@test.com", "password_hash": "x", "name": f"User {i}", "role": "user"}
+                for i in range(count)
+            ])
+            parking.db.session.commit()
+        return [f"{prefix}{i}@test.com" for i in range(count)]
+    return make
+
+
+@pytest.fixture
+def make_lot(client, admin_headers):
+    def make(spots, name="Test Lot", price=20):
+        r = client.post("/api/admin/parking-lots", headers=admin_headers, json={
+            "prime_location_name": name, "price": price, "address": "-", "pin_code": "600001",
+            "number_of_spots": spots})
+        assert r.status_code == 201, r.get_json()
+        with parking.app.app_context():
+            return parking.db.session.query(parking.func.max(parking.ParkingLot.id)).scalar()
+    return make
+
+
+def lot_state(lot_id):
+    """(number_of_spots, available_spots, reserved_spots) as stored, and the same counts recounted from parking_spot."""
+    with parking.app.app_context():
+        lot = parking.db.session.get(parking.ParkingLot, lot_id)
+        spots = parking.db.session.query(parking.ParkingSpot.status, parking.func.count()).filter(
+            parking.ParkingSpot.lot_id == lot_id).group_by(parking.ParkingSpot.status).all()
+        counts = dict(spots)
+        return ((lot.number_of_spots, lot.available_spots, lot.reserved_spots),
+                (sum(counts.values()), counts.get("A", 0), counts.get("R", 0)))
@@ -0,0 +1,94 @@
+import threading
+
+from conftest import lot_state, parking
+
+
+def allocate_concurrently(users, lot_id, client_factory):
+    barrier = threading.Barrier(len(users))
+    results = []
+
+    def run(username):
+        client = client_factory()
+        barrier.wait()
+        r = client.post("/api/user/allocate", json={"user": username, "lot_id": lot_id, "vehicle_no": "TN01AB1234"})
+        results.append((r.status_code, r.get_json()))
+
+    threads = [threading.Thread(target=run, args=(u,)) for u in users]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def active_reservations(lot_id):
+    with parking.app.app_context():
+        return parking.db.session.query(parking.Reservation.spot_id).filter(
+            parking.Reservation.lot_id == lot_id, parking.active_reservation()).all()
+
+
+def test_concurrent_allocate_on_single_spot_lot(make_users, make_lot):
+    users = make_users(12)
+    lot_id = make_lot(1)
+
+    results = allocate_concurrently(users, lot_id, parking.app.test_client)
+
+    assert sorted(status for status, _ in results) == [200] + [400] * 11
+    assert len(active_reservations(lot_id)) == 1
+    stored, recounted = lot_state(lot_id)
+    assert stored == recounted == (1, 0, 1)
+
+
+def test_stale_pool_entries_cannot_double_book(make_users, make_lot, monkeypatch):
+    """Every thread is handed the same spot, as process-local pools in separate workers would be."""
+    users = make_users(8)
+    lot_id = make_lot(1)
+    with parking.app.app_context():
+        spot_id = parking.db.session.query(parking.ParkingSpot.id).filter_by(lot_id=lot_id).scalar()
+    handed_out = threading.local()
+
+    def stale_take(lot):
+        if getattr(handed_out, "done", False):
+            return None
+        handed_out.done = True
+        return spot_id
+    monkeypatch.setattr(parking.free_spot_pool, "take", stale_take)
+
+    results = allocate_concurrently(users, lot_id, parking.app.test_client)
+
+    assert sorted(status for status, _ in results) == [200] + [400] * 7
+    assert active_reservations(lot_id) == [(spot_id,)]
+
+
+def test_counters_follow_allocate_release_and_resize(client, admin_headers, make_users, make_lot):
+    users = make_users(3)
+    lot_id = make_lot(3)
+
+    reservation_ids = []
+    for username in users[:2]:
+        r = client.post("/api/user/allocate", json={"user": username, "lot_id": lot_id, "vehicle_no": "TN01AB1234"})
+        assert r.status_code == 200
+        reservation_ids.append(r.get_json()["reservation_id"])
+    stored, recounted = lot_state(lot_id)
+    assert stored == recounted == (3, 1, 2)
+
+    assert client.post(f"/api/user/reservations/terminate/{reservation_ids[0]}").status_code == 200
+    stored, recounted = lot_state(lot_id)
+    assert stored == recounted == (3, 2, 1)
+
+    assert client.put(f"/api/admin/parking-lots/{lot_id}", headers=admin_headers, json={"number_of_spots": 6}).status_code == 200
+    stored, recounted = lot_state(lot_id)
+    assert stored == recounted == (6, 5, 1)
+
+    assert client.put(f"/api/admin/parking-lots/{lot_id}", headers=admin_headers, json={"number_of_spots": 2}).status_code == 200
+    stored, recounted = lot_state(lot_id)
+    assert stored == recounted == (2, 1, 1)
+
+    # only free spots can go: one is still reserved
+    r = client.put(f"/api/admin/parking-lots/{lot_id}", headers=admin_headers, json={"number_of_spots": 0})
+    assert r.status_code == 400
+    stored, recounted = lot_state(lot_id)
+    assert stored == recounted == (2, 1, 1)
+
+    with parking.app.app_context():
+        assert parking.free_spot_pool.check() == {}
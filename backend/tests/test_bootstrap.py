@@ -0,0 +1,46 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start(db_path, auto_init=None):
+    """Import app.py in a fresh process, as a gunicorn worker or Celery process would."""
+    env = dict(os.environ, DATABASE_URL="sqlite:///" + db_path)
+    env.pop("AUTO_INIT_DB")
+    if auto_init:
+        env["AUTO_INIT_DB"] = auto_init
+    return subprocess.Popen([sys.executable, "-c", "import app"], cwd=BACKEND, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def tables(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_import_leaves_schema_to_init_db(tmp_path):
+    db_path = str(tmp_path / "fresh.db")
+    proc = start(db_path)
+    _, err = proc.communicate(timeout=120)
+    assert proc.returncode == 0, err
+    assert "run `flask init-db`" in err
+    assert not tables(db_path) & {"user", "parking_lot", "schema_version"}
+
+
+def test_concurrent_bootstraps_migrate_once(tmp_path):
+    db_path = str(tmp_path / "fresh.db")
+    procs = [start(db_path, "True") for _ in range(4)]
+    for proc in procs:
+        _, err = proc.communicate(timeout=300)
+        assert proc.returncode == 0, err
+
+    import app as parking
+    with sqlite3.connect(db_path) as conn:
+        versions = [v for (v,) in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+        admins = conn.execute("SELECT COUNT(*) FROM user WHERE role = 'admin'").fetchone()[0]
+    # schema_version.version is the primary key, so a second run of any migration would have failed above
+    assert versions[-1] == parking.SCHEMA_VERSION
+    assert admins == 1
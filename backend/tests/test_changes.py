@@ -0,0 +1,53 @@
+from conftest import parking
+
+
+def pull(client, headers, since=None, limit=2):
+    """Every page from since until has_more is false; returns (changes, cursors handed out)."""
+    changes, cursors = [], []
+    while True:
+        params = {"limit": limit, **({"since": since} if since else {})}
+        r = client.get("/api/admin/reservations/changes", headers=headers, query_string=params)
+        assert r.status_code == 200
+        body = r.get_json()
+        changes += body["changes"]
+        cursors.append(body["next_cursor"])
+        since = body["next_cursor"]
+        if not body["has_more"]:
+            return changes, cursors
+
+
+def test_change_feed_cursor_is_monotonic(client, admin_headers, make_users, make_lot):
+    users = make_users(5)
+    lot_id = make_lot(5)
+    reservation_ids = [
+        client.post("/api/user/allocate", json={"user": u, "lot_id": lot_id, "vehicle_no": "TN01AB1234"})
+        .get_json()["reservation_id"] for u in users
+    ]
+    for reservation_id in reservation_ids[:2]:
+        client.post(f"/api/user/reservations/terminate/{reservation_id}")
+
+    changes, cursors = pull(client, admin_headers)
+    seqs = [c["change_seq"] for c in changes]
+    assert seqs == sorted(seqs) and len(set(seqs)) == len(seqs)
+    # each reservation shows up once, in its latest state
+    assert sorted(c["reservation_id"] for c in changes) == sorted(reservation_ids)
+    assert {c["reservation_id"] for c in changes if c["change"] == "released"} == set(reservation_ids[:2])
+    decoded = [parking._decode_cursor(c) for c in cursors]
+    assert decoded == sorted(decoded)
+
+    # nothing new: the same position comes back
+    tail, _ = pull(client, admin_headers, since=cursors[-1])
+    assert tail == []
+    assert parking._decode_cursor(pull(client, admin_headers, since=cursors[-1])[1][-1]) == decoded[-1]
+
+    # a later change lands strictly after the stored cursor
+    client.post(f"/api/user/reservations/terminate/{reservation_ids[2]}")
+    tail, more = pull(client, admin_headers, since=cursors[-1])
+    assert [c["reservation_id"] for c in tail] == [reservation_ids[2]]
+    assert tail[0]["change_seq"] > seqs[-1]
+    assert parking._decode_cursor(more[-1]) > decoded[-1]
+
+
+def test_change_feed_rejects_bad_cursor(client, admin_headers):
+    r = client.get("/api/admin/reservations/changes", headers=admin_headers, query_string={"since": "nope"})
+    assert r.status_code == 400
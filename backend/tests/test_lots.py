@@ -0,0 +1,52 @@
+import pytest
+
+from conftest import lot_state, parking
+
+
+@pytest.mark.parametrize("payload, message", [
+    ({"price": "abc"}, "price must be a number"),
+    ({"price": 0}, "price must be positive"),
+    ({"price": -5}, "price must be positive"),
+    ({"price": True}, "price must be a number"),
+    ({"number_of_spots": "many"}, "number_of_spots must be an integer"),
+    ({"number_of_spots": 2.5}, "number_of_spots must be an integer"),
+    ({"number_of_spots": -1}, "number_of_spots cannot be negative"),
+    ({"number_of_spots": None}, "number_of_spots must be an integer"),
+])
+def test_update_rejects_bad_numbers(client, admin_headers, make_lot, payload, message):
+    lot_id = make_lot(3)
+    r = client.put(f"/api/admin/parking-lots/{lot_id}", headers=admin_headers, json=payload)
+    assert (r.status_code, r.get_json()["message"]) == (400, message)
+    stored, recounted = lot_state(lot_id)
+    assert stored == recounted == (3, 3, 0)
+
+
+def test_update_accepts_numeric_strings(client, admin_headers, make_lot):
+    lot_id = make_lot(3)
+    r = client.put(f"/api/admin/parking-lots/{lot_id}", headers=admin_headers, json={"price": "35.5", "number_of_spots": "4"})
+    assert r.status_code == 200
+    with parking.app.app_context():
+        assert parking.db.session.get(parking.ParkingLot, lot_id).price == 35.5
+    assert lot_state(lot_id)[0] == (4, 4, 0)
+
+
+def test_create_rejects_non_positive_price(client, admin_headers):
+    r = client.post("/api/admin/parking-lots", headers=admin_headers, json={
+        "prime_location_name": "Free", "price": 0, "address": "-", "pin_code": "1", "number_of_spots": 2})
+    assert r.status_code == 400
+
+
+def test_disabled_lot_cannot_be_resized(client, admin_headers, make_lot):
+    lot_id = make_lot(3)
+    assert client.delete(f"/api/admin/parking-lots/{lot_id}", headers=admin_headers).status_code == 200
+
+    r = client.put(f"/api/admin/parking-lots/{lot_id}", headers=admin_headers, json={"number_of_spots": 5})
+    assert r.status_code == 409
+    # other fields of a disabled lot can still be edited
+    assert client.put(f"/api/admin/parking-lots/{lot_id}", headers=admin_headers, json={"price": 30}).status_code == 200
+
+    assert client.post(f"/api/admin/parking-lots/{lot_id}/restore", headers=admin_headers).status_code == 200
+    stored, recounted = lot_state(lot_id)
+    assert stored == recounted == (3, 3, 0)
+    with parking.app.app_context():
+        assert parking.free_spot_pool.available(lot_id) == 3
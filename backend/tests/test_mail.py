@@ -0,0 +1,94 @@
+import smtplib
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import event
+
+from conftest import parking
+
+
+@pytest.fixture
+def statements():
+    """SQL the primary engine runs, in order (BEGIN / BEGIN IMMEDIATE included)."""
+    seen = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        seen.append(" ".join(statement.split()).upper())
+    with parking.app.app_context():
+        engine = parking.db.engine
+    event.listen(engine, "before_cursor_execute", capture)
+    yield seen
+    event.remove(engine, "before_cursor_execute", capture)
+
+
+def transactions(statements):
+    """Statements grouped by the BEGIN that opened them: [(begin, [statement, ...]), ...]."""
+    grouped = []
+    for statement in statements:
+        if statement.startswith("BEGIN"):
+            grouped.append((statement, []))
+        elif grouped:
+            grouped[-1][1].append(statement)
+    return grouped
+
+
+@pytest.mark.parametrize("send", [
+    lambda ids, day, start, end: parking.send_daily_reminder_chunk(ids, day),
+    lambda ids, day, start, end: parking.send_monthly_report_chunk(ids, start, end),
+])
+def test_mail_chunks_take_the_write_lock_for_the_insert_only(make_users, statements, send):
+    make_users(3)
+    with parking.app.app_context():
+        ids = [i for (i,) in parking.db.session.query(parking.User.id).filter(parking.User.role == "user")]
+    start, end = parking.monthly_report_window()
+    statements.clear()
+
+    assert send(ids, parking.datetime.now(parking.IST).date().isoformat(), start.isoformat(), end.isoformat())["queued"] == 3
+
+    locked = [(begin, body) for begin, body in transactions(statements) if begin == "BEGIN IMMEDIATE"]
+    assert len(locked) == 1
+    assert [s.split(" (")[0] for s in locked[0][1]] == ["INSERT INTO MAIL_OUTBOX"]
+
+
+class FailingConnection:
+    """Stands in for a Flask-Mail connection whose every send raises `error`."""
+
+    def __init__(self, error):
+        self.error = error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def send(self, message):
+        raise self.error
+
+
+@pytest.mark.parametrize("error, status", [
+    (smtplib.SMTPServerDisconnected("Connection unexpectedly closed"), "pending"),
+    (smtplib.SMTPResponseException(451, b"Try again later"), "pending"),
+    (smtplib.SMTPRecipientsRefused({"someone@test.com": (550, b"No such user")}), "failed"),
+])
+def test_failed_send_is_retried_with_backoff_or_failed_for_good(monkeypatch, error, status):
+    monkeypatch.setattr(parking.mail, "connect", lambda: FailingConnection(error))
+    with parking.app.app_context():
+        parking.queue_mail([parking.outbox_mail("someone@test.com", "Hello", "<p>hi</p>")])
+        before = parking._ist_now()
+        worker = parking.MailDeliveryWorker(pool_size=2)
+        try:
+            summary = worker.run_once()
+        finally:
+            worker.close()
+        row = parking.MailOutbox.query.one()
+
+    assert summary["claimed"] == 1 and summary["sent"] == 0
+    assert (row.status, row.attempts) == (status, 1)
+    assert row.last_error
+    if status == "pending":
+        # first retry waits MAIL_RETRY_BASE_SECONDS, so the row is not due again straight away
+        delay = row.next_attempt_at - before
+        assert timedelta(seconds=parking.MAIL_RETRY_BASE_SECONDS) <= delay < timedelta(seconds=parking.MAIL_RETRY_BASE_SECONDS + 5)
+        with parking.app.app_context():
+            assert parking.claim_outbox_batch(10) == []
@@ -0,0 +1,50 @@
+import random
+
+import numpy as np
+import pytest
+
+from conftest import parking
+
+
+def naive_series(intervals, t0, t1, step):
+    """Second-by-second reference: an interval [start, end) occupies a spot at every second in it."""
+    def occupied(t):
+        return sum(1 for start, end in intervals if start <= t < end)
+
+    at_start, average, peak = [], [], []
+    for t in range(t0, t1, step):
+        seconds = [occupied(u) for u in range(t, min(t + step, t1))]
+        at_start.append(seconds[0])
+        average.append(sum(seconds) / len(seconds))
+        peak.append(max(seconds))
+    return at_start, average, peak
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_occupancy_series_matches_naive_loop(seed):
+    rnd = random.Random(seed)
+    step = rnd.choice((1, 5, 7, 10))
+    t0 = rnd.randrange(0, 30)
+    t1 = t0 + rnd.randrange(1, 120)  # often not a whole number of steps, so the last bucket is short
+    edges = list(range(t0, t1 + step, step))
+    intervals = []
+    for _ in range(rnd.randrange(0, 40)):
+        # bias endpoints onto bucket edges and the window bounds, where off-by-ones live
+        start = rnd.choice(edges) if rnd.random() < 0.4 else rnd.randrange(t0 - 20, t1 + 20)
+        end = start + rnd.choice((0, step, rnd.randrange(0, 60)))
+        intervals.append((start, end))
+    starts = np.sort(np.array([s for s, _ in intervals], dtype=np.int64))
+    ends = np.sort(np.array([e for _, e in intervals], dtype=np.int64))
+
+    grid, at_start, average, peak = parking.occupancy_series(starts, ends, t0, t1, step)
+    expected = naive_series(intervals, t0, t1, step)
+
+    assert grid.tolist() == list(range(t0, t1, step))
+    assert at_start.tolist() == expected[0]
+    assert np.allclose(average, expected[1])
+    assert peak.tolist() == expected[2]
+
+
+def test_occupancy_series_empty_window():
+    grid, at_start, average, peak = parking.occupancy_series(np.array([1]), np.array([5]), 10, 10, 60)
+    assert grid.size == at_start.size == average.size == peak.size == 0
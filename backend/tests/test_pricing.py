@@ -0,0 +1,35 @@
+import random
+
+import numpy as np
+import pytest
+
+from conftest import parking
+
+# stays where the tariff changes shape: the 15-minute minimum, the 24 h switch to day rates and whole days
+BOUNDARIES = [0.0, 0.1, 0.25, 0.5, 1.5, 23.99, 24.0, 24.0 + 1e-9, 24.25, 47.5, 48.0, 72.0, 24 * 30 + 0.75]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_batch_tariff_matches_scalar(seed):
+    rnd = random.Random(seed)
+    hours = BOUNDARIES + [rnd.choice((rnd.uniform(0, 2), rnd.uniform(0, 30), rnd.uniform(24, 24 * 45)))
+                          for _ in range(2000)]
+    # whole and half prices make exact .5 costs, where Python's and NumPy's rounding must both go to even
+    prices = [rnd.choice((5.0, 25.0, 10.5, round(rnd.uniform(1, 200), 2))) for _ in hours]
+    multiplier = rnd.choice((parking.DAY_RATE_MULTIPLIER, 12, 20.5))
+
+    expected = [parking.compute_total_cost(h, p, multiplier) for h, p in zip(hours, prices)]
+    assert parking.compute_total_costs(hours, prices, multiplier).tolist() == expected
+
+
+def test_batch_tariff_broadcasts_one_price():
+    hours = np.array([0.1, 2.5, 24.0, 30.0])
+    expected = [parking.compute_total_cost(h, 40.0) for h in hours.tolist()]
+    assert parking.compute_total_costs(hours, 40.0).tolist() == expected
+
+
+def test_full_day_costs_the_day_rate():
+    price = 30.0
+    assert parking.compute_total_cost(48.0, price) == 2 * parking.DAY_RATE_MULTIPLIER * price
+    assert parking.compute_total_cost(49.5, price) == round(2 * parking.DAY_RATE_MULTIPLIER * price + 1.5 * price)
+    assert parking.compute_total_cost(0.1, price) == round(parking.MIN_BILLED_HOURS * price)
@@ -0,0 +1,15 @@
+import check_query_plans as plan_check
+
+from conftest import parking
+
+
+def test_hot_queries_use_indexes():
+    """The check-query-plans probes against a seeded database: no full scan of a large table."""
+    with parking.app.app_context():
+        # lots far outnumber a page, so the admin lot list reads a small slice of parking_spot
+        plan_check.seed(users=1000, lots=300, spots=20, reservations=10000)
+        top = parking.db.session.query(parking.Reservation.user_id).group_by(parking.Reservation.user_id) \
+            .order_by(parking.func.count(parking.Reservation.id).desc()).limit(1).scalar()
+        lot_id = parking.db.session.query(parking.func.min(parking.Reservation.lot_id)).scalar()
+        problems = parking.check_query_plans(parking.db.session.get(parking.User, top), lot_id)
+    assert problems == []
@@ -0,0 +1,42 @@
+import pytest
+
+from conftest import parking
+
+
+@pytest.fixture
+def plates(client, make_users, make_lot):
+    """TN07AB4946 parked now, KA01AB4999 and MH12XY0001 released."""
+    users = make_users(3)
+    lot_id = make_lot(3)
+    ids = {}
+    for user, plate in zip(users, ("KA01AB4999", "MH12XY0001", "TN07AB4946")):
+        r = client.post("/api/user/allocate", json={"user": user, "lot_id": lot_id, "vehicle_no": plate})
+        ids[plate] = r.get_json()["reservation_id"]
+    for plate in ("KA01AB4999", "MH12XY0001"):
+        client.post(f"/api/user/reservations/terminate/{ids[plate]}")
+    return ids
+
+
+def lookup(client, headers, q):
+    r = client.get("/api/admin/vehicles/lookup", headers=headers, query_string={"q": q})
+    assert r.status_code == 200
+    return [(row["vehicle_number"], row["match"], row["active"]) for row in r.get_json()["results"]]
+
+
+def test_prefix_and_suffix_use_the_plate_indexes(client, admin_headers, plates):
+    assert lookup(client, admin_headers, "tn 07") == [("TN07AB4946", "prefix", True)]
+    assert lookup(client, admin_headers, "0001") == [("MH12XY0001", "suffix", False)]
+
+
+def test_middle_fragment_matches_active_first(client, admin_headers, plates):
+    assert lookup(client, admin_headers, "ab-49") == [("TN07AB4946", "contains", True),
+                                                      ("KA01AB4999", "contains", False)]
+    # two characters stay on the indexes: no substring search
+    assert lookup(client, admin_headers, "AB") == []
+
+
+def test_middle_fragment_history_is_limited_to_recent_rows(client, admin_headers, plates, monkeypatch):
+    monkeypatch.setattr(parking, "VEHICLE_LOOKUP_SCAN_ROWS", 1)
+    # only the newest reservation (the active TN07AB4946) is inside the window, and active rows always are
+    assert lookup(client, admin_headers, "AB49") == [("TN07AB4946", "contains", True)]
+    assert lookup(client, admin_headers, "12XY") == []